@@ -0,0 +1,296 @@
+# ========================================
+# 模拟链路压测（使用本地 LLM 替身）
+# ========================================
+# 启动 llm_stub 和一个指向它的服务进程，并发发起 N 个 /api/simulate-series 模拟，测量：
+#   - 吞吐：每秒完成的模拟数
+#   - 首 token 时间：从发出请求到收到第一个 reasoning / content 事件（p50 / p99）
+#   - 总耗时、单个流内相邻事件的最大间隔
+#   - 事件循环卡顿：压测期间定时请求 /api/health 的响应时间（p50 / p99 / 最大）
+# 不消耗 DeepSeek 额度；也可以用 --server 压测已在运行的服务（此时由该服务自己的 DEEPSEEK_BASE_URL 决定上游）。
+#
+# 用法：python bench_llm.py --concurrency 16 --total 64 --ttft 0.5 --tps 200 [--error-rate 0.05] [--json]
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+
+from llm_stub import StubConfig, serve, load_recordings
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C']
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return round(values[idx], 4)
+
+
+def _summary(values):
+    return {
+        'p50': _percentile(values, 50),
+        'p99': _percentile(values, 99),
+        'max': round(max(values), 4) if values else None,
+    }
+
+
+def start_server(python, upstream, args, timeout=60.0):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'PORT': str(port),
+        'DEEPSEEK_BASE_URL': upstream,
+        'DEEPSEEK_API_KEY': env.get('DEEPSEEK_API_KEY') or 'bench-dummy-key',
+        'SIM_MAX_CONCURRENT': str(args.max_concurrent or args.concurrency),
+        'SIM_ARCHIVE': '0',
+    })
+    if not args.cache:
+        env['SIM_CACHE_SIZE'] = '0'
+        env.pop('SIM_CACHE_DIR', None)
+    log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+    proc = subprocess.Popen([python, 'server.py'], cwd=SCRIPT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f'http://127.0.0.1:{port}'
+    started = time.time()
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f'服务进程提前退出，返回码 {proc.returncode}')
+        if time.time() - started > timeout:
+            proc.kill()
+            raise RuntimeError('等待 /api/ready 超时')
+        try:
+            with urllib.request.urlopen(f'{base}/api/ready', timeout=1.0) as resp:
+                if resp.status == 200:
+                    return proc, base
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.05)
+
+
+def fetch_players(base):
+    with urllib.request.urlopen(f'{base}/api/players', timeout=30) as resp:
+        players = json.loads(resp.read())['players']
+    if len(players) < 10:
+        raise RuntimeError('球员数据不足 10 人，无法组成两支阵容')
+    return players
+
+
+def random_lineups(players, rng):
+    picked = rng.sample(players, 10)
+    return dict(zip(POSITIONS, picked[:5])), dict(zip(POSITIONS, picked[5:]))
+
+
+def run_simulation(base, team1, team2, timeout):
+    """发起一次模拟并读完 SSE，返回测量结果"""
+    body = json.dumps({'team1': team1, 'team2': team2, 'playerNames': {'1': 'A组', '2': 'B组'}}).encode('utf-8')
+    request = urllib.request.Request(f'{base}/api/simulate-series', data=body,
+                                     headers={'Content-Type': 'application/json'}, method='POST')
+    sample = {'ok': False, 'fallback': False, 'events': 0, 'queued': False}
+    started = time.perf_counter()
+    last_event = None
+    max_gap = 0.0
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            for raw in resp:
+                line = raw.decode('utf-8').strip()
+                if not line.startswith('data: '):
+                    continue
+                payload = line[6:]
+                now = time.perf_counter()
+                if payload == '[DONE]':
+                    break
+                event = json.loads(payload)
+                kind = event.get('type')
+                if kind == 'prompt':
+                    continue
+                sample['events'] += 1
+                if last_event is not None:
+                    max_gap = max(max_gap, now - last_event)
+                last_event = now
+                if kind == 'queue':
+                    sample['queued'] = True
+                elif kind in ('reasoning', 'content') and 'firstToken' not in sample:
+                    sample['firstToken'] = now - started
+                elif kind == 'result':
+                    sample['ok'] = event.get('data') is not None
+                    sample['fallback'] = bool(event.get('fallback'))
+                elif kind == 'error':
+                    sample['error'] = event.get('error')
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        sample['error'] = str(e)
+    sample['duration'] = time.perf_counter() - started
+    sample['maxGap'] = max_gap
+    return sample
+
+
+class StallProbe:
+    """定时请求 /api/health，响应时间反映服务事件循环的卡顿"""
+
+    def __init__(self, base, interval):
+        self.base = base
+        self.interval = interval
+        self.latencies = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f'{self.base}/api/health', timeout=10) as resp:
+                    resp.read()
+                self.latencies.append(time.perf_counter() - started)
+            except (urllib.error.URLError, OSError):
+                self.latencies.append(time.perf_counter() - started)
+            self._stop.wait(self.interval)
+
+
+def run_load(base, players, args):
+    rng = random.Random(args.seed)
+    jobs = [random_lineups(players, rng) for _ in range(args.total)]
+    samples = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not jobs:
+                    return
+                team1, team2 = jobs.pop()
+            sample = run_simulation(base, team1, team2, args.timeout)
+            with lock:
+                samples.append(sample)
+                done = len(samples)
+            if not args.json:
+                status = '完成' if sample['ok'] else f"失败: {sample.get('error')}"
+                if sample['fallback']:
+                    status = '本地兜底'
+                first = sample.get('firstToken')
+                print(f"[{done}/{args.total}] {status}，首 token "
+                      f"{f'{first:.3f}s' if first is not None else '-'}，总耗时 {sample['duration']:.3f}s", flush=True)
+
+    probe = StallProbe(base, args.probe_interval)
+    probe.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    probe.stop()
+
+    completed = [s for s in samples if s['ok']]
+    return {
+        'concurrency': args.concurrency,
+        'total': args.total,
+        'completed': len(completed),
+        'fallbacks': sum(1 for s in samples if s['fallback']),
+        'errors': sum(1 for s in samples if not s['ok']),
+        'queued': sum(1 for s in samples if s['queued']),
+        'elapsedSeconds': round(elapsed, 3),
+        'throughputPerSecond': round(len(completed) / elapsed, 3) if elapsed else None,
+        'firstTokenSeconds': _summary([s['firstToken'] for s in samples if 'firstToken' in s]),
+        'durationSeconds': _summary([s['duration'] for s in completed]),
+        'maxEventGapSeconds': _summary([s['maxGap'] for s in completed]),
+        'hubStallSeconds': _summary(probe.latencies),
+        'probes': len(probe.latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='使用本地 LLM 替身压测模拟链路')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时进行的模拟数')
+    parser.add_argument('--total', type=int, default=32, help='模拟总数')
+    parser.add_argument('--server', help='压测已在运行的服务（例如 http://127.0.0.1:7860），不再自动启动')
+    parser.add_argument('--max-concurrent', type=int, help='服务端 SIM_MAX_CONCURRENT（默认等于 --concurrency）')
+    parser.add_argument('--cache', action='store_true', help='保留服务端结果缓存（默认关闭，避免回放掩盖上游耗时）')
+    parser.add_argument('--timeout', type=float, default=600.0, help='单次模拟超时（秒）')
+    parser.add_argument('--probe-interval', type=float, default=0.05, help='卡顿探测间隔（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='阵容随机种子')
+    parser.add_argument('--server-log', help='把服务进程输出写到该文件')
+    parser.add_argument('--python', default=sys.executable, help='启动服务使用的 Python 解释器')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    stub = parser.add_argument_group('LLM 替身')
+    stub.add_argument('--ttft', type=float, default=0.5, help='首个 token 前的延迟（秒）')
+    stub.add_argument('--tps', type=float, default=200.0, help='每个流每秒输出的 token 数')
+    stub.add_argument('--reasoning-tokens', type=int, default=400, help='合成响应的思考长度（字符）')
+    stub.add_argument('--error-rate', type=float, default=0.0, help='直接返回 HTTP 错误的比例')
+    stub.add_argument('--error-status', type=int, default=500, help='注入错误的状态码')
+    stub.add_argument('--abort-rate', type=float, default=0.0, help='流中途断开的比例')
+    stub.add_argument('--malformed-rate', type=float, default=0.0, help='输出损坏 JSON 的比例')
+    stub.add_argument('--replay', help='回放录制的响应：JSONL 文件或模拟归档 simulations.db')
+    args = parser.parse_args()
+
+    httpd = proc = None
+    try:
+        if args.server:
+            base = args.server.rstrip('/')
+        else:
+            config = StubConfig(ttft=args.ttft, tps=args.tps, reasoning_tokens=args.reasoning_tokens,
+                                error_rate=args.error_rate, error_status=args.error_status,
+                                abort_rate=args.abort_rate, malformed_rate=args.malformed_rate,
+                                recordings=load_recordings(args.replay) if args.replay else None, seed=args.seed)
+            httpd = serve(config, port=0)
+            threading.Thread(target=httpd.serve_forever, daemon=True).start()
+            proc, base = start_server(args.python, f'http://127.0.0.1:{httpd.server_address[1]}', args)
+
+        result = run_load(base, fetch_players(base), args)
+        try:
+            with urllib.request.urlopen(f'{base}/api/metrics', timeout=10) as resp:
+                result['serverMetrics'] = json.loads(resp.read()).get('summary')
+        except (urllib.error.URLError, OSError, ValueError):
+            result['serverMetrics'] = None
+        if httpd is not None:
+            result['stub'] = dict(httpd.config.counters)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if httpd is not None:
+            httpd.shutdown()
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    print('=' * 50)
+    print(f"并发 {result['concurrency']}，完成 {result['completed']}/{result['total']}"
+          f"（本地兜底 {result['fallbacks']}，失败 {result['errors']}，排队过 {result['queued']}）")
+    print(f"总耗时 {result['elapsedSeconds']:.3f}s，吞吐 {result['throughputPerSecond']} 次/秒")
+    for key, label in [('firstTokenSeconds', '首 token'), ('durationSeconds', '单次模拟'),
+                       ('maxEventGapSeconds', '事件最大间隔'), ('hubStallSeconds', '事件循环卡顿')]:
+        s = result[key]
+        if s['p50'] is None:
+            print(f"{label}: 无数据")
+        else:
+            print(f"{label}: p50 {s['p50']:.3f}s, p99 {s['p99']:.3f}s, 最大 {s['max']:.3f}s")
+    if result.get('stub'):
+        print(f"LLM 替身: {result['stub']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# ========================================
+# 冷启动基准测试
+# ========================================
+# 反复以全新进程启动服务，测量：
+#   - import 耗时：`import server`（不启动监听）所需时间
+#   - 首个连接耗时：从启动进程到 TCP 端口第一次接受连接
+#   - 就绪耗时：从启动进程到 /api/ready 返回 200
+#
+# 用法：python bench_startup.py --runs 5 [--json]
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+import urllib.error
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_IMPORT_SNIPPET = (
+    "import time, sys; t = time.perf_counter(); import server; "
+    "sys.stderr.write('IMPORT_SECONDS=%f\\n' % (time.perf_counter() - t))"
+)
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _bench_env(port):
+    env = dict(os.environ)
+    env['PORT'] = str(port)
+    env['WARMUP_LLM_CLIENT'] = env.get('WARMUP_LLM_CLIENT', '0')
+    env.setdefault('DEEPSEEK_API_KEY', 'bench-dummy-key')
+    return env
+
+
+def measure_import(python):
+    proc = subprocess.run(
+        [python, '-c', _IMPORT_SNIPPET],
+        cwd=SCRIPT_DIR, env=_bench_env(_free_port()),
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=120
+    )
+    for line in proc.stderr.splitlines():
+        if line.startswith('IMPORT_SECONDS='):
+            return float(line.split('=', 1)[1])
+    raise RuntimeError(f'import server 失败:\n{proc.stderr[-2000:]}')
+
+
+def measure_cold_start(python, timeout=60.0):
+    """返回 (首个连接耗时, 就绪耗时)"""
+    port = _free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [python, 'server.py'], cwd=SCRIPT_DIR, env=_bench_env(port),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        accepted = None
+        while accepted is None:
+            if proc.poll() is not None:
+                raise RuntimeError(f'服务进程提前退出，返回码 {proc.returncode}')
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('等待端口超时')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+                accepted = time.perf_counter() - started
+            except OSError:
+                time.sleep(0.005)
+
+        ready = None
+        while ready is None:
+            if time.perf_counter() - started > timeout:
+                raise RuntimeError('等待 /api/ready 超时')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/ready', timeout=1.0) as resp:
+                    if resp.status == 200:
+                        ready = time.perf_counter() - started
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.005)
+        return accepted, ready
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def _summary(values):
+    return {
+        'median': round(statistics.median(values), 4),
+        'min': round(min(values), 4),
+        'max': round(max(values), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量服务冷启动耗时')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数')
+    parser.add_argument('--python', default=sys.executable, help='使用的 Python 解释器')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    imports, accepts, readies = [], [], []
+    for i in range(args.runs):
+        imports.append(measure_import(args.python))
+        accepted, ready = measure_cold_start(args.python)
+        accepts.append(accepted)
+        readies.append(ready)
+        if not args.json:
+            print(f"第 {i + 1}/{args.runs} 次: import {imports[-1]:.3f}s, 首个连接 {accepted:.3f}s, 就绪 {ready:.3f}s", flush=True)
+
+    result = {
+        'runs': args.runs,
+        'importSeconds': _summary(imports),
+        'firstConnectionSeconds': _summary(accepts),
+        'readySeconds': _summary(readies),
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print('=' * 50)
+        for key, label in [('importSeconds', 'import 耗时'), ('firstConnectionSeconds', '首个连接'), ('readySeconds', '就绪')]:
+            s = result[key]
+            print(f"{label}: 中位数 {s['median']:.3f}s (最小 {s['min']:.3f}s, 最大 {s['max']:.3f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+# ========================================
+# 上游流看门狗 - 首 token 超时对冲、chunk 间隔停滞检测
+# ========================================
+# 推理模型偶尔会长时间不返回首个 token，或者输出到一半卡住。
+# HedgedStream 用独立线程读取上游流，主循环按阈值检查：
+#   - 首个 token 超过 hedge_after 秒仍未到达：再发起一个相同的请求（对冲），
+#     哪个流先产出 token 就用哪个，其余的立即关闭
+#   - 对冲用完后首 token 仍超过 stall_timeout 秒，或开始输出后相邻 chunk 间隔超过 stall_timeout 秒：
+#     关闭流并抛出 UpstreamStall（已推送的内容无法与新请求拼接，由调用方兜底）
+# 对冲请求不占用调度器名额，最多 max_hedges 个。
+
+import time
+import queue
+import threading
+
+_STREAM_END = object()
+
+
+class UpstreamStall(TimeoutError):
+    """上游流停滞（首 token 或 chunk 间隔超过阈值）"""
+
+
+def has_token(chunk):
+    """chunk 是否带有思考或输出内容（只有 role / usage 的 chunk 不算）"""
+    if not getattr(chunk, 'choices', None):
+        return False
+    delta = chunk.choices[0].delta
+    return bool(getattr(delta, 'reasoning_content', None) or getattr(delta, 'content', None))
+
+
+class _Attempt:
+    def __init__(self, index):
+        self.index = index
+        self.response = None
+        self.closed = False
+        self.finished = False
+        self.started_at = time.time()
+
+
+class HedgedStream:
+    """可迭代的上游 chunk 流；open_stream() 每调用一次发起一个上游请求"""
+
+    def __init__(self, open_stream, hedge_after=None, max_hedges=1, stall_timeout=None,
+                 is_cancelled=None, on_hedge=None):
+        self.open_stream = open_stream
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self.stall_timeout = stall_timeout
+        self.is_cancelled = is_cancelled
+        self.on_hedge = on_hedge
+        self.attempts = []
+        self.winner = None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+    @property
+    def hedges(self):
+        return max(0, len(self.attempts) - 1)
+
+    def _can_hedge(self):
+        return bool(self.hedge_after) and self.hedges < self.max_hedges
+
+    def _start(self):
+        attempt = _Attempt(len(self.attempts))
+        self.attempts.append(attempt)
+        threading.Thread(target=self._read, args=(attempt,), daemon=True).start()
+
+    def _read(self, attempt):
+        try:
+            response = self.open_stream()
+            with self._lock:
+                attempt.response = response
+                closed = attempt.closed
+            if closed:
+                response.close()
+            else:
+                for chunk in response:
+                    if attempt.closed:
+                        # 已关闭（包括关闭失败的情况）就不再继续消费
+                        break
+                    self._queue.put((attempt, chunk))
+            # 结束标记也用于唤醒等待中的主循环（例如取消后）
+            self._queue.put((attempt, _STREAM_END))
+        except Exception as e:
+            self._queue.put((attempt, e))
+
+    def _close_attempt(self, attempt):
+        with self._lock:
+            attempt.closed = True
+            response = attempt.response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+    def close(self, keep=None):
+        """关闭所有上游流（keep 除外）"""
+        for attempt in self.attempts:
+            if attempt is not keep:
+                self._close_attempt(attempt)
+
+    def _timeout(self, now, last_chunk):
+        """到下一个需要检查的时间点（发起对冲 / 停滞阈值）的秒数，None 表示一直等"""
+        waits = []
+        if self.winner is None:
+            if self._can_hedge():
+                waits.append(self.attempts[-1].started_at + self.hedge_after - now)
+            elif self.stall_timeout:
+                waits.append(self.attempts[-1].started_at + self.stall_timeout - now)
+        elif self.stall_timeout:
+            waits.append(last_chunk + self.stall_timeout - now)
+        return max(min(waits), 0.01) if waits else None
+
+    def __iter__(self):
+        self._start()
+        pending = {}  # 胜出前各尝试收到的无内容 chunk（role 等）
+        error = None
+        last_chunk = time.time()
+        try:
+            while True:
+                if self.is_cancelled is not None and self.is_cancelled():
+                    return
+                now = time.time()
+                if self.winner is None and self._can_hedge() and now - self.attempts[-1].started_at >= self.hedge_after:
+                    waited = now - self.attempts[0].started_at
+                    self._start()
+                    if self.on_hedge is not None:
+                        self.on_hedge(self.hedges, waited)
+                    continue
+                if self.stall_timeout:
+                    if self.winner is not None and now - last_chunk >= self.stall_timeout:
+                        raise UpstreamStall(f'上游流停滞超过 {self.stall_timeout:g} 秒')
+                    if (self.winner is None and not self._can_hedge()
+                            and now - self.attempts[-1].started_at >= self.stall_timeout):
+                        raise UpstreamStall(f'首个 token 等待超过 {now - self.attempts[0].started_at:.1f} 秒')
+                try:
+                    attempt, item = self._queue.get(timeout=self._timeout(now, last_chunk))
+                except queue.Empty:
+                    continue
+                if attempt.closed:
+                    # 已被关闭的落选流剩余的数据
+                    continue
+                if self.winner is None:
+                    if item is _STREAM_END or isinstance(item, Exception):
+                        # 还没产出 token 就结束或失败；其他尝试仍在进行时继续等待
+                        attempt.finished = True
+                        if isinstance(item, Exception):
+                            error = item
+                        if all(a.finished for a in self.attempts):
+                            if error is not None:
+                                raise error
+                            return
+                        continue
+                    if not has_token(item):
+                        pending.setdefault(attempt.index, []).append(item)
+                        continue
+                    self.winner = attempt
+                    self.close(keep=attempt)
+                    yield from pending.get(attempt.index, [])
+                elif item is _STREAM_END:
+                    return
+                elif isinstance(item, Exception):
+                    raise item
+                last_chunk = time.time()
+                yield item
+        finally:
+            self.close()
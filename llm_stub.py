@@ -0,0 +1,293 @@
+# ========================================
+# 本地 LLM 替身 - OpenAI 兼容的流式 chat/completions 服务
+# ========================================
+# 压测和离线开发时代替 DeepSeek，不消耗真实额度：
+#   - 流式返回 reasoning_content（思考）和 content（输出）增量，末尾附带 usage
+#   - 回放录制的响应（JSONL 每行 {"reasoning": ..., "content": ...}，或直接读取模拟归档 simulations.db），
+#     没有录制时按系列赛输出格式合成结果
+#   - 可配置首 token 延迟、token 速率，以及注入错误（HTTP 错误、中途断开、损坏的 JSON）
+#
+# 用法：python llm_stub.py --port 8801 --ttft 1.0 --tps 60
+#       DEEPSEEK_BASE_URL=http://127.0.0.1:8801 python server.py
+
+import re
+import json
+import time
+import gzip
+import random
+import sqlite3
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REASONING_FILLER = ('先比较两队的外线投射和持球点，再看内线对位和篮板保护。'
+                    '防守端需要考虑换防能力和护框，化学反应方面要看球权分配是否合理。')
+
+
+def load_recordings(path):
+    """读取录制的响应：JSONL 文件或模拟归档数据库"""
+    if path.endswith('.db'):
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute(
+                "SELECT reasoning_gz, result_gz FROM simulations WHERE engine = 'ai' AND result_gz IS NOT NULL"
+            ).fetchall()
+        finally:
+            conn.close()
+        recordings = []
+        for reasoning, result in rows:
+            recordings.append({
+                'reasoning': gzip.decompress(reasoning).decode('utf-8') if reasoning else '',
+                'content': '```json\n' + json.dumps(json.loads(gzip.decompress(result)), ensure_ascii=False, indent=2) + '\n```'
+            })
+        return recordings
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def synthesize(messages, rng, reasoning_tokens):
+    """按系列赛输出格式合成一次响应"""
+    prompt = '\n'.join(m.get('content') or '' for m in messages if m.get('role') == 'user')
+    names = re.findall(r'赛季的([^、，,\n]+)', prompt) or ['球员']
+    champion = rng.choice((1, 2))
+    loser_wins = rng.randint(0, 3)
+    order = [champion] * 3 + [3 - champion] * loser_wins
+    rng.shuffle(order)
+    order.append(champion)
+    games = []
+    for i, winner in enumerate(order):
+        low = rng.randint(92, 112)
+        high = low + rng.randint(1, 18)
+        games.append({
+            'gameNumber': i + 1,
+            'winner': winner,
+            'score': {'team1': high if winner == 1 else low, 'team2': high if winner == 2 else low},
+            'keyFactor': '第四节关键防守'
+        })
+    side = {'spacing': '良好', 'playmaking': '良好', 'offense': '优秀', 'defense': '一般', 'chemistry': '良好',
+            'starPower': '优秀', 'strengths': '进攻火力', 'weaknesses': '替补深度'}
+    half = max(1, len(names) // 2)
+    fmvp_pool = names[:half] if champion == 1 else names[half:] or names
+    result = {
+        'teamAnalysis': {'team1': side, 'team2': dict(side), 'keyMatchups': '锋线对位', 'prediction': '七场内分出胜负'},
+        'champion': champion,
+        'finalScore': {'team1Wins': order.count(1), 'team2Wins': order.count(2)},
+        'games': games,
+        'fmvp': {'name': rng.choice(fmvp_pool), 'team': champion,
+                 'avgStats': {'points': 30.5, 'rebounds': 8.2, 'assists': 6.1}, 'reason': '攻防两端统治系列赛'},
+        'summary': '合成的系列赛结果，用于压测。'
+    }
+    repeat = reasoning_tokens // len(REASONING_FILLER) + 1
+    reasoning = (REASONING_FILLER * repeat)[:reasoning_tokens]
+    content = '```json\n' + json.dumps(result, ensure_ascii=False, indent=2) + '\n```'
+    return {'reasoning': reasoning, 'content': content}
+
+
+def corrupt(content, rng):
+    """损坏输出：截断或删掉一个结构字符"""
+    if rng.random() < 0.5:
+        return content[:rng.randint(1, max(1, len(content) // 2))]
+    positions = [i for i, ch in enumerate(content) if ch in '{}[]:,']
+    i = rng.choice(positions) if positions else 0
+    return content[:i] + content[i + 1:]
+
+
+def tokenize(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class StubConfig:
+    def __init__(self, ttft=1.0, tps=60.0, chars_per_token=2, reasoning_tokens=400, error_rate=0.0,
+                 error_status=500, abort_rate=0.0, malformed_rate=0.0, recordings=None, seed=None):
+        self.ttft = ttft
+        self.tps = tps
+        self.chars_per_token = max(1, chars_per_token)
+        self.reasoning_tokens = reasoning_tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.abort_rate = abort_rate
+        self.malformed_rate = malformed_rate
+        self.recordings = recordings or []
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self._replay = itertools.cycle(range(len(self.recordings))) if self.recordings else None
+        self.counters = {'requests': 0, 'streams': 0, 'completed': 0, 'errors': 0, 'aborted': 0, 'malformed': 0}
+
+    def count(self, name):
+        with self.rng_lock:
+            self.counters[name] += 1
+
+    def plan(self, messages):
+        """决定这次请求的响应和注入的故障"""
+        with self.rng_lock:
+            rng = random.Random(self.rng.random())
+            fault = None
+            roll = rng.random()
+            if roll < self.error_rate:
+                fault = 'error'
+            elif roll < self.error_rate + self.abort_rate:
+                fault = 'abort'
+            elif roll < self.error_rate + self.abort_rate + self.malformed_rate:
+                fault = 'malformed'
+            index = next(self._replay) if self._replay is not None else None
+        response = dict(self.recordings[index]) if index is not None else synthesize(messages, rng, self.reasoning_tokens)
+        if fault == 'malformed':
+            response['content'] = corrupt(response['content'], rng)
+        return response, fault
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server_version = 'llm-stub/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/stats', '/v1/stats'):
+            self._json(200, self.server.config.counters)
+        elif self.path.rstrip('/') in ('/models', '/v1/models'):
+            self._json(200, {'object': 'list', 'data': [{'id': 'deepseek-reasoner', 'object': 'model'}]})
+        else:
+            self._json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/chat/completions', '/v1/chat/completions'):
+            self._json(404, {'error': {'message': 'not found'}})
+            return
+        config = self.server.config
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        config.count('requests')
+        response, fault = config.plan(body.get('messages') or [])
+        if fault == 'error':
+            config.count('errors')
+            self._json(config.error_status, {'error': {'message': '注入的上游错误', 'type': 'stub_error'}})
+            return
+        if fault == 'malformed':
+            config.count('malformed')
+        model = body.get('model') or 'deepseek-reasoner'
+        prompt_tokens = sum(len(m.get('content') or '') for m in body.get('messages') or []) // config.chars_per_token
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'prompt_cache_hit_tokens': 0,
+            'prompt_cache_miss_tokens': prompt_tokens,
+            'completion_tokens': (len(response['reasoning']) + len(response['content'])) // config.chars_per_token,
+            'completion_tokens_details': {'reasoning_tokens': len(response['reasoning']) // config.chars_per_token}
+        }
+        usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+        if not body.get('stream'):
+            time.sleep(config.ttft)
+            self._json(200, {
+                'id': f'stub-{id(self)}', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {
+                    'role': 'assistant', 'content': response['content'], 'reasoning_content': response['reasoning']}}],
+                'usage': usage
+            })
+            return
+        config.count('streams')
+        include_usage = bool((body.get('stream_options') or {}).get('include_usage'))
+        try:
+            self._stream(config, model, response, usage if include_usage else None, fault == 'abort')
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（例如模拟被取消）
+            return
+
+    def _stream(self, config, model, response, usage, abort):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_id = f'stub-{id(self)}-{int(time.time() * 1000)}'
+
+        def send(payload):
+            data = f'data: {payload}\n\n'.encode('utf-8')
+            self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            send(json.dumps({
+                'id': chunk_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+            }, ensure_ascii=False))
+
+        tokens = [('reasoning_content', t) for t in tokenize(response['reasoning'], config.chars_per_token)]
+        tokens += [('content', t) for t in tokenize(response['content'], config.chars_per_token)]
+        abort_at = random.randint(1, max(1, len(tokens) - 1)) if abort else None
+        interval = 1.0 / config.tps if config.tps > 0 else 0
+        time.sleep(config.ttft)
+        chunk({'role': 'assistant', 'content': '', 'reasoning_content': None})
+        next_at = time.perf_counter()
+        for i, (field, text) in enumerate(tokens):
+            if abort_at is not None and i == abort_at:
+                config.count('aborted')
+                # 不发送结束块，直接断开连接
+                self.close_connection = True
+                return
+            chunk({field: text})
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        chunk({}, 'stop')
+        if usage is not None:
+            send(json.dumps({'id': chunk_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                             'model': model, 'choices': [], 'usage': usage}))
+        send('[DONE]')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+        config.count('completed')
+
+
+def serve(config, host='127.0.0.1', port=8801):
+    httpd = ThreadingHTTPServer((host, port), StubHandler)
+    httpd.daemon_threads = True
+    httpd.config = config
+    return httpd
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI 兼容的本地流式 LLM 替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8801)
+    parser.add_argument('--ttft', type=float, default=1.0, help='首个 token 前的延迟（秒）')
+    parser.add_argument('--tps', type=float, default=60.0, help='每个流每秒输出的 token 数（0 表示不限速）')
+    parser.add_argument('--chars-per-token', type=int, default=2, help='每个 token 的字符数')
+    parser.add_argument('--reasoning-tokens', type=int, default=400, help='合成响应的思考长度（字符）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='直接返回 HTTP 错误的比例')
+    parser.add_argument('--error-status', type=int, default=500, help='注入错误的状态码（例如 429 / 500 / 503）')
+    parser.add_argument('--abort-rate', type=float, default=0.0, help='流中途断开的比例')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='输出损坏 JSON 的比例')
+    parser.add_argument('--replay', help='回放录制的响应：JSONL 文件或模拟归档 simulations.db')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.replay) if args.replay else None
+    if args.replay:
+        print(f"[LLM替身] 载入 {len(recordings)} 条录制响应: {args.replay}", flush=True)
+    config = StubConfig(ttft=args.ttft, tps=args.tps, chars_per_token=args.chars_per_token,
+                        reasoning_tokens=args.reasoning_tokens, error_rate=args.error_rate,
+                        error_status=args.error_status, abort_rate=args.abort_rate,
+                        malformed_rate=args.malformed_rate, recordings=recordings, seed=args.seed)
+    httpd = serve(config, args.host, args.port)
+    print(f"[LLM替身] 监听 http://{args.host}:{httpd.server_address[1]}（首 token {args.ttft}s，{args.tps} token/s）", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
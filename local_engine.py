@@ -0,0 +1,240 @@
+# ========================================
+# 本地蒙特卡洛模拟引擎 - 不依赖 LLM
+# ========================================
+# 根据 players.js 中已有的数据（成本档位、全明星、MVP、FMVP、总冠军次数、
+# 位置匹配度）估算球队实力，用 NumPy 一次性向量化模拟数千轮 BO7 系列赛
+# （主场安排与提示词一致：第1、2、5、7场为 team1 主场）。
+#
+# 输出与 LLM 结果相同的 JSON 结构（champion / finalScore / games / fmvp ...），
+# 可以作为即时模式、API 失败时的兜底，以及 AI 结果旁边的先验参考。
+
+import numpy as np
+
+POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C']
+POSITION_NAMES = {'PG': '控球后卫', 'SG': '得分后卫', 'SF': '小前锋', 'PF': '大前锋', 'C': '中锋'}
+
+# 第 1-7 场是否为 team1 主场（2-2-1-1-1）
+TEAM1_HOME = np.array([True, True, False, False, True, False, True])
+
+# 成本档位对应的基础评分
+TIER_RATING = {6: 97.0, 5: 93.0, 4: 90.0, 3: 85.0, 2: 79.0, 1: 72.0}
+EMPTY_SLOT_RATING = 60.0
+
+# 阵容中按评分排序后的权重：球星影响力更大
+STAR_WEIGHTS = np.array([0.30, 0.24, 0.19, 0.15, 0.12])
+
+HOME_ADVANTAGE = 2.5     # 主场优势（评分点）
+LOGISTIC_SCALE = 6.0     # 实力差 -> 单场胜率的缩放
+SCORE_BASE = 106.0
+SCORE_SD = 9.0
+
+
+def _fit_factor(slot, positions):
+    """球员打指定位置的匹配度：本位 1.0，相邻位置 0.94，其余 0.85"""
+    if not positions or slot in positions:
+        return 1.0
+    slot_idx = POSITIONS.index(slot)
+    if any(abs(POSITIONS.index(p) - slot_idx) == 1 for p in positions if p in POSITIONS):
+        return 0.94
+    return 0.85
+
+
+def _count(player, field, default=0):
+    """读取球员的数值字段，缺失或无法解析时使用默认值（引擎不因客户端数据出错而中断）"""
+    try:
+        return int(player.get(field) or default)
+    except (TypeError, ValueError):
+        return default
+
+
+def player_rating(player):
+    """单个球员评分：成本档位为基础，荣誉作为加成"""
+    base = TIER_RATING.get(_count(player, 'cost', 1), 72.0)
+    bonus = (min(_count(player, 'allStar'), 15) * 0.25
+             + _count(player, 'mvp') * 0.9
+             + _count(player, 'fmvp') * 0.7
+             + min(_count(player, 'championships'), 8) * 0.25)
+    return base + min(bonus, 9.0)
+
+
+def team_profile(team, player_lookup=None):
+    """计算球队每个位置的有效评分和总实力"""
+    slots = []
+    for slot in POSITIONS:
+        player = dict(team.get(slot) or {})
+        if player_lookup is not None and player.get('id') is not None:
+            # 前端数据缺字段时用服务端球员数据补全
+            for key, value in (player_lookup(player['id']) or {}).items():
+                player.setdefault(key, value)
+        if player:
+            rating = player_rating(player)
+            positions = player.get('positions')
+            fit = _fit_factor(slot, positions if isinstance(positions, list) else None)
+            slots.append({'slot': slot, 'player': player, 'rating': rating, 'effective': rating * fit, 'fit': fit})
+        else:
+            slots.append({'slot': slot, 'player': None, 'rating': EMPTY_SLOT_RATING, 'effective': EMPTY_SLOT_RATING, 'fit': 1.0})
+    effective = np.sort(np.array([s['effective'] for s in slots]))[::-1]
+    strength = float(np.dot(effective, STAR_WEIGHTS))
+    return {'slots': slots, 'strength': strength, 'fit': float(np.mean([s['fit'] for s in slots]))}
+
+
+def game_win_probabilities(strength1, strength2):
+    """team1 在第 1-7 场的单场胜率"""
+    diff = strength1 - strength2 + np.where(TEAM1_HOME, HOME_ADVANTAGE, -HOME_ADVANTAGE)
+    return 1.0 / (1.0 + np.exp(-diff / LOGISTIC_SCALE))
+
+
+def simulate_series_batch(strength1, strength2, n, rng):
+    """向量化模拟 n 轮 BO7
+
+    返回 (team1 每场是否获胜 [n, 7]，实际进行的场次 [n]，team1 是否夺冠 [n])
+    """
+    p = game_win_probabilities(strength1, strength2)
+    wins1 = rng.random((n, 7)) < p
+    cum1 = np.cumsum(wins1, axis=1)
+    cum2 = np.cumsum(~wins1, axis=1)
+    finished = (cum1 == 4) | (cum2 == 4)
+    games_played = finished.argmax(axis=1) + 1
+    champion1 = cum1[np.arange(n), games_played - 1] == 4
+    return wins1, games_played, champion1
+
+
+def _grade(value, thresholds=(88.0, 83.0, 77.0)):
+    if value >= thresholds[0]:
+        return '优秀'
+    if value >= thresholds[1]:
+        return '良好'
+    if value >= thresholds[2]:
+        return '一般'
+    return '较差'
+
+
+def _team_analysis(profile):
+    slots = profile['slots']
+    by_slot = {s['slot']: s for s in slots}
+    guards = np.mean([by_slot['PG']['effective'], by_slot['SG']['effective']])
+    wings = np.mean([by_slot['SG']['effective'], by_slot['SF']['effective']])
+    bigs = np.mean([by_slot['PF']['effective'], by_slot['C']['effective']])
+    best = max(slots, key=lambda s: s['effective'])
+    worst = min(slots, key=lambda s: s['effective'])
+    best_name = best['player']['name'] if best['player'] else POSITION_NAMES[best['slot']]
+    worst_name = worst['player']['name'] if worst['player'] else '空缺'
+    return {
+        'spacing': _grade(wings),
+        'playmaking': _grade(by_slot['PG']['effective']),
+        'offense': _grade(np.mean([guards, wings])),
+        'defense': _grade(bigs),
+        'chemistry': _grade(profile['fit'] * 90.0),
+        'starPower': _grade(best['rating'], (95.0, 90.0, 84.0)),
+        'strengths': f"{best_name}领衔，{POSITION_NAMES[best['slot']]}位置优势明显",
+        'weaknesses': f"{POSITION_NAMES[worst['slot']]}位置（{worst_name}）是短板",
+    }
+
+
+def _avg_stats(slot, rating):
+    scale = max(rating - 70.0, 0.0)
+    points = 10.0 + scale * 0.75
+    rebounds = {'PG': 4.0, 'SG': 4.5, 'SF': 6.0, 'PF': 8.5, 'C': 10.5}[slot] + scale * 0.08
+    assists = {'PG': 7.5, 'SG': 4.5, 'SF': 3.5, 'PF': 2.5, 'C': 2.0}[slot] + scale * 0.06
+    return {'points': round(points, 1), 'rebounds': round(rebounds, 1), 'assists': round(assists, 1)}
+
+
+class LocalEngine:
+    """本地系列赛模拟器"""
+
+    def __init__(self, simulations=10000, player_lookup=None):
+        self.simulations = simulations
+        self.player_lookup = player_lookup
+
+    def simulate(self, team1, team2, seed=None):
+        rng = np.random.default_rng(seed)
+        prof1 = team_profile(team1, self.player_lookup)
+        prof2 = team_profile(team2, self.player_lookup)
+        s1, s2 = prof1['strength'], prof2['strength']
+        n = self.simulations
+
+        _, games_played, champion1 = simulate_series_batch(s1, s2, n, rng)
+        distribution = {}
+        for winner, label in ((True, 1), (False, 2)):
+            mask = champion1 == winner
+            for games in range(4, 8):
+                losses = games - 4
+                score = f"4-{losses}" if label == 1 else f"{losses}-4"
+                distribution[score] = round(float(np.mean(mask & (games_played == games))), 4)
+
+        # 取其中一轮作为本次展示的系列赛，并生成每场比分
+        wins1, played, champ = simulate_series_batch(s1, s2, 1, rng)
+        played = int(played[0])
+        winners = np.where(wins1[0, :played], 1, 2)
+        diff = s1 - s2 + np.where(TEAM1_HOME[:played], HOME_ADVANTAGE, -HOME_ADVANTAGE)
+        totals = rng.normal(SCORE_BASE, SCORE_SD / 2, played)
+        margins = np.abs(rng.normal(diff * 0.6, SCORE_SD, played)).round() + 1
+        signed = np.where(winners == 1, margins, -margins)
+        team1_scores = np.round(totals + signed / 2).astype(int)
+        team2_scores = team1_scores - signed.astype(int)
+
+        champion = 1 if champ[0] else 2
+        games = []
+        for g in range(played):
+            home = 1 if TEAM1_HOME[g] else 2
+            winner = int(winners[g])
+            if margins[g] <= 3:
+                factor = '关键时刻把握住机会，险胜对手'
+            elif winner == home:
+                factor = '主场作战，整体发挥更稳定'
+            else:
+                factor = '客场抢下关键一胜'
+            games.append({
+                'gameNumber': g + 1,
+                'winner': winner,
+                'score': {'team1': int(team1_scores[g]), 'team2': int(team2_scores[g])},
+                'keyFactor': factor
+            })
+        team1_wins = int((winners == 1).sum())
+        team2_wins = played - team1_wins
+
+        champ_profile = prof1 if champion == 1 else prof2
+        fmvp_slot = max((s for s in champ_profile['slots'] if s['player']), key=lambda s: s['effective'], default=None)
+        if fmvp_slot is not None:
+            fmvp = {
+                'name': fmvp_slot['player'].get('name', '未知'),
+                'team': champion,
+                'avgStats': _avg_stats(fmvp_slot['slot'], fmvp_slot['rating']),
+                'reason': '本地模拟中对夺冠贡献最大的球员（按评分与位置匹配度计算）'
+            }
+        else:
+            fmvp = {'name': '未知MVP', 'team': champion, 'avgStats': {'points': 0, 'rebounds': 0, 'assists': 0}, 'reason': '阵容不完整'}
+
+        p_team1 = float(np.mean(champion1))
+        favorite = 1 if s1 >= s2 else 2
+        return {
+            'teamAnalysis': {
+                'team1': _team_analysis(prof1),
+                'team2': _team_analysis(prof2),
+                'keyMatchups': '、'.join(
+                    f"{POSITION_NAMES[a['slot']]}{'占优' if a['effective'] >= b['effective'] else '劣势'}"
+                    for a, b in zip(prof1['slots'], prof2['slots'])
+                ) + '（以 team1 视角）',
+                'prediction': f"本地模型 {n} 次模拟中 team1 夺冠概率 {p_team1:.0%}，team{favorite} 更被看好"
+            },
+            'champion': champion,
+            'finalScore': {'team1Wins': team1_wins, 'team2Wins': team2_wins},
+            'games': games,
+            'fmvp': fmvp,
+            'summary': f"本地模拟：team{champion} 以 {max(team1_wins, team2_wins)}-{min(team1_wins, team2_wins)} 夺冠。"
+                       f"双方实力评分 {s1:.1f} vs {s2:.1f}，team1 夺冠概率 {p_team1:.0%}。",
+            'monteCarlo': self.summary(prof1, prof2, p_team1, distribution)
+        }
+
+    def summary(self, prof1, prof2, p_team1, distribution):
+        return {
+            'engine': 'local',
+            'simulations': self.simulations,
+            'team1WinProbability': round(p_team1, 4),
+            'seriesDistribution': distribution,
+            'strength': {'team1': round(prof1['strength'], 2), 'team2': round(prof2['strength'], 2)}
+        }
+
+    def prior(self, team1, team2, seed=None):
+        """只返回蒙特卡洛统计，用于附在 AI 结果旁边作参考"""
+        return self.simulate(team1, team2, seed)['monteCarlo']
@@ -0,0 +1,364 @@
+# ========================================
+# SQLite 球员数据库 - 可选的数据源（PLAYERS_STORE=sqlite 时启用）
+# ========================================
+# 启用后 SQLite 是球员管理 API 的唯一数据源，players.js 只是由它生成的产物：
+# 每条修改都在一个事务内完成，数据变化后按防抖延迟/批量阈值重新生成 players.js，
+# 并保持原有排版（球队注释区块、NBA_TEAMS、自动生成的全明星索引等原样保留）。
+#
+# 首次启动时数据库为空，会从现有 players.js（以及未落盘的 players.journal）导入。
+# 之后直接修改 players.js 不会再被读取；如需重新导入，删除数据库文件即可。
+
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+
+from player_store import (
+    PlayersDocument, PlayerIndex, _SECTION_RE,
+    format_player_line, _atomic_write
+)
+
+# 球员字段 -> 数据库列
+_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'nameEn': 'name_en',
+    'cost': 'cost',
+    'positions': 'positions',
+    'team': 'team',
+    'peakSeason': 'peak_season',
+    'championships': 'championships',
+    'allStar': 'all_star',
+    'mvp': 'mvp',
+    'fmvp': 'fmvp',
+}
+_SEQ_STEP = 1024.0
+_MIN_SEQ_GAP = 1e-6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    name_en TEXT NOT NULL,
+    cost INTEGER NOT NULL,
+    positions TEXT NOT NULL,
+    team TEXT NOT NULL,
+    peak_season TEXT NOT NULL,
+    championships INTEGER NOT NULL DEFAULT 0,
+    all_star INTEGER NOT NULL DEFAULT 0,
+    mvp INTEGER NOT NULL DEFAULT 0,
+    fmvp INTEGER NOT NULL DEFAULT 0,
+    extra TEXT,
+    seq REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_players_id ON players(id);
+CREATE INDEX IF NOT EXISTS idx_players_team ON players(team);
+CREATE INDEX IF NOT EXISTS idx_players_cost ON players(cost);
+CREATE INDEX IF NOT EXISTS idx_players_name_en ON players(name_en);
+CREATE INDEX IF NOT EXISTS idx_players_seq ON players(seq);
+
+-- PLAYERS 数组内的注释行/空行，和球员共用 seq 排序以还原排版
+CREATE TABLE IF NOT EXISTS layout (
+    seq REAL PRIMARY KEY,
+    line TEXT NOT NULL,
+    section_team TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_layout_section ON layout(section_team);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _player_to_row(player):
+    row = {}
+    for field, column in _COLUMNS.items():
+        value = player.get(field)
+        row[column] = json.dumps(value, ensure_ascii=False) if field == 'positions' else value
+    extra = {k: v for k, v in player.items() if k not in _COLUMNS}
+    row['extra'] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+
+def _row_to_player(row):
+    player = {}
+    for field, column in _COLUMNS.items():
+        value = row[column]
+        player[field] = json.loads(value) if field == 'positions' else value
+    if row['extra']:
+        player.update(json.loads(row['extra']))
+    return player
+
+
+class SqlitePlayerStore:
+    """与 PlayerStore 接口一致的 SQLite 实现"""
+
+    def __init__(self, db_path, js_path, flush_delay=2.0, flush_batch=100):
+        self.db_path = db_path
+        self.path = js_path
+        self.journal_path = os.path.splitext(js_path)[0] + '.journal'
+        self.flush_delay = flush_delay
+        self.flush_batch = flush_batch
+        self._lock = threading.RLock()
+        self._conn = None
+        self._index = None
+        self._dirty = 0  # 自上次生成 players.js 以来的修改条数
+        self._flush_timer = None
+        self.on_flush = None  # players.js 重写后的回调（例如重建静态资源）
+
+    # ---------- 初始化 ----------
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def _import_from_js(self):
+        """数据库为空时从 players.js（及未落盘的日志）导入"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            doc = PlayersDocument(f.read())
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                ops = [json.loads(line) for line in f if line.strip()]
+            doc.apply_all(ops)
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for i, entry in enumerate(doc.entries):
+                seq = (i + 1) * _SEQ_STEP
+                if isinstance(entry, dict):
+                    self._insert_row(entry, seq)
+                else:
+                    m = _SECTION_RE.match(entry)
+                    conn.execute('INSERT INTO layout (seq, line, section_team) VALUES (?, ?, ?)',
+                                 (seq, entry, m.group(1) if m else None))
+            self._set_meta('prefix', doc.prefix)
+            self._set_meta('suffix', doc.suffix)
+            self._set_meta('teams', json.dumps(doc.teams, ensure_ascii=False))
+            self._set_meta('all_star_index', json.dumps(doc.all_star_index, ensure_ascii=False))
+            self._set_meta('data_version', '1')
+            self._set_meta('generated_version', '1')  # players.js 本身就是导入来源
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if os.path.exists(self.journal_path):
+            _atomic_write(self.journal_path, '')
+        print(f"[球员] 已从 players.js 导入 SQLite: {len(doc.players)} 名球员 -> {self.db_path}", flush=True)
+
+    def load(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._connect()
+            if self._meta('prefix') is None:
+                self._import_from_js()
+            index = self._rebuild_index()
+            print(f"[球员] 使用 SQLite 数据源: {len(index.players)} 名球员, 版本 {index.version}", flush=True)
+            if self._stale():
+                # 上次退出前修改已提交但 players.js 还没重新生成（崩溃 / 重启发生在防抖窗口内）
+                print(f"[球员] players.js 落后于数据库版本 {self._meta('data_version')}，重新生成", flush=True)
+                self.flush()
+            return index
+
+    def _rebuild_index(self):
+        rows = self._conn.execute('SELECT * FROM players ORDER BY seq').fetchall()
+        players = [_row_to_player(r) for r in rows]
+        teams = json.loads(self._meta('teams', '[]'))
+        all_star_index = json.loads(self._meta('all_star_index', '{}'))
+        version = hashlib.sha1(f"sqlite:{self.db_path}:{self._meta('data_version', '0')}".encode('utf-8')).hexdigest()[:16]
+        self._index = PlayerIndex(players, teams, all_star_index, version)
+        return self._index
+
+    def get(self):
+        index = self._index
+        if index is None:
+            with self._lock:
+                return self._index or self.load()
+        return index
+
+    def invalidate(self):
+        # players.js 是生成产物，外部修改不会反向同步
+        pass
+
+    def next_id(self):
+        row = self._conn.execute('SELECT MAX(id) AS max_id FROM players').fetchone()
+        return (row['max_id'] or 0) + 1
+
+    # ---------- 排序位置 ----------
+
+    def _insert_row(self, player, seq):
+        row = _player_to_row(player)
+        row['seq'] = seq
+        columns = ', '.join(row)
+        placeholders = ', '.join(f':{c}' for c in row)
+        self._conn.execute(f'INSERT INTO players ({columns}) VALUES ({placeholders})', row)
+
+    def _gap_after_team(self, team):
+        """返回 (下限, 上限)：新球员应插入在该球队区块最后一名球员之后"""
+        conn = self._conn
+        marker = conn.execute('SELECT MIN(seq) AS seq FROM layout WHERE section_team = ?', (team,)).fetchone()['seq']
+        if marker is not None:
+            upper = conn.execute('SELECT MIN(seq) AS seq FROM layout WHERE section_team IS NOT NULL AND seq > ?',
+                                 (marker,)).fetchone()['seq']
+            last = conn.execute('SELECT MAX(seq) AS seq FROM players WHERE seq > ? AND seq < ?',
+                                (marker, upper if upper is not None else float('inf'))).fetchone()['seq']
+            after = last if last is not None else marker
+        else:
+            after = conn.execute('SELECT MAX(seq) AS seq FROM players').fetchone()['seq'] or 0.0
+        nxt = conn.execute('SELECT MIN(seq) AS seq FROM (SELECT seq FROM players WHERE seq > ? UNION ALL SELECT seq FROM layout WHERE seq > ?)',
+                           (after, after)).fetchone()['seq']
+        return after, (nxt if nxt is not None else after + _SEQ_STEP)
+
+    def _seq_after_team(self, team):
+        """单个球员插入到该球队区块末尾时使用的位置"""
+        after, upper = self._gap_after_team(team)
+        if (upper - after) / 2 < _MIN_SEQ_GAP:
+            self._renumber()
+            after, upper = self._gap_after_team(team)
+        return after + (upper - after) / 2
+
+    def _renumber(self):
+        """间隔耗尽时把所有条目重新按固定步长编号（极少发生）"""
+        conn = self._conn
+        rows = conn.execute('SELECT seq, 0 AS is_layout, row_id FROM players UNION ALL SELECT seq, 1, NULL FROM layout ORDER BY seq').fetchall()
+        conn.execute('UPDATE layout SET seq = -seq')
+        for i, row in enumerate(rows):
+            seq = (i + 1) * _SEQ_STEP
+            if row['is_layout']:
+                conn.execute('UPDATE layout SET seq = ? WHERE seq = ?', (seq, -row['seq']))
+            else:
+                conn.execute('UPDATE players SET seq = ? WHERE row_id = ?', (seq, row['row_id']))
+
+    # ---------- 写路径 ----------
+
+    def _transaction(self, work, count):
+        with self._lock:
+            self.get()
+            conn = self._conn
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work()
+                self._set_meta('data_version', str(int(self._meta('data_version', '0')) + 1))
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._dirty += count
+            self._rebuild_index()
+            if self._dirty >= self.flush_batch:
+                self.flush()
+            else:
+                self._schedule_flush()
+            return result
+
+    def add_player(self, player):
+        return self.add_players([player])[0]
+
+    def add_players(self, players):
+        """批量添加：同一球队的新球员在同一间隔内均匀分配位置，一个事务完成"""
+        if not players:
+            return []
+
+        def work():
+            first_id = self.next_id()
+            by_team = {}
+            for i, player in enumerate(players):
+                by_team.setdefault(player['team'], []).append(dict(player, id=first_id + i))
+            for team, team_players in by_team.items():
+                after, upper = self._gap_after_team(team)
+                step = (upper - after) / (len(team_players) + 1)
+                if step < _MIN_SEQ_GAP:
+                    self._renumber()
+                    after, upper = self._gap_after_team(team)
+                    step = (upper - after) / (len(team_players) + 1)
+                for k, player in enumerate(team_players, 1):
+                    self._insert_row(player, after + step * k)
+            return list(range(first_id, first_id + len(players)))
+
+        return self._transaction(work, len(players))
+
+    def update_player(self, player_id, fields):
+        def work():
+            row = self._conn.execute('SELECT * FROM players WHERE id = ? ORDER BY seq LIMIT 1', (player_id,)).fetchone()
+            if row is None:
+                return False
+            player = _row_to_player(row)
+            player.update({k: v for k, v in fields.items() if k != 'id'})
+            values = _player_to_row(player)
+            if player['team'] != row['team']:
+                # 换队后移到新球队区块的末尾，保持 players.js 按球队分区的排版
+                values['seq'] = self._seq_after_team(player['team'])
+            assignments = ', '.join(f'{c} = :{c}' for c in values)
+            values['row_id'] = row['row_id']
+            self._conn.execute(f'UPDATE players SET {assignments} WHERE row_id = :row_id', values)
+            return True
+
+        return self._transaction(work, 1)
+
+    def delete_player(self, player_id):
+        def work():
+            return self._conn.execute('DELETE FROM players WHERE id = ?', (player_id,)).rowcount > 0
+
+        return self._transaction(work, 1)
+
+    # ---------- 生成 players.js ----------
+
+    def render(self):
+        conn = self._conn
+        players = conn.execute('SELECT * FROM players ORDER BY seq').fetchall()
+        layout = conn.execute('SELECT seq, line FROM layout ORDER BY seq').fetchall()
+        lines = []
+        i = j = 0
+        while i < len(players) or j < len(layout):
+            if j >= len(layout) or (i < len(players) and players[i]['seq'] < layout[j]['seq']):
+                lines.append(format_player_line(_row_to_player(players[i])))
+                i += 1
+            else:
+                lines.append(layout[j]['line'])
+                j += 1
+        return self._meta('prefix') + '\n'.join(lines) + self._meta('suffix')
+
+    def _stale(self):
+        """players.js 是否落后于数据库（生成时的数据版本与当前不一致）"""
+        return self._meta('generated_version') != self._meta('data_version', '0')
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def flush(self):
+        """数据有变化时重新生成 players.js"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._dirty and not self._stale():
+                return False
+            started = time.time()
+            version = self._meta('data_version', '0')
+            _atomic_write(self.path, self.render())
+            self._set_meta('generated_version', version)
+            count = self._dirty
+            self._dirty = 0
+            print(f"[球员] 已从 SQLite 重新生成 players.js: {f'{count} 条修改' if count else '补上次未生成的修改'}, 耗时 {(time.time() - started) * 1000:.1f}ms", flush=True)
+            if self.on_flush is not None:
+                self.on_flush()
+            return True
@@ -0,0 +1,700 @@
+# ========================================
+# 球员数据索引 - 解析 players.js 并常驻内存
+# ========================================
+# players.js 仍然是前端直接加载的数据文件；服务端在启动时解析一次
+# PLAYERS / NBA_TEAMS / ALL_STAR_ROSTER_INDEX，建立按 id / team / nameEn
+# 的索引，之后只有文件 mtime 变化时才重新解析。
+#
+# 写操作（添加/修改/删除）先追加到 players.journal 并立即作用于内存模型，
+# 再按防抖延迟或批量阈值把 players.js 整体原子重写（临时文件 + rename）。
+# 进程崩溃时 players.js 要么是旧版本要么是新版本，未落盘的修改在下次启动时
+# 从日志重放。
+
+import io
+import os
+import re
+import csv
+import json
+import gzip
+import hashlib
+import threading
+import time
+
+
+# ========================================
+# 极简 JS 字面量解析器（只支持 players.js 用到的语法）
+# ========================================
+
+_IDENT_RE = re.compile(r'[A-Za-z_$][\w$]*')
+_NUMBER_RE = re.compile(r'-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?')
+_STRING_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '0': '\0'}
+
+
+class JSParseError(ValueError):
+    pass
+
+
+def _skip_ws(text, pos):
+    """跳过空白和注释"""
+    n = len(text)
+    while pos < n:
+        ch = text[pos]
+        if ch in ' \t\r\n':
+            pos += 1
+        elif text.startswith('//', pos):
+            end = text.find('\n', pos)
+            pos = n if end == -1 else end + 1
+        elif text.startswith('/*', pos):
+            end = text.find('*/', pos + 2)
+            if end == -1:
+                raise JSParseError(f'未闭合的注释 (位置 {pos})')
+            pos = end + 2
+        else:
+            break
+    return pos
+
+
+def _parse_string(text, pos):
+    quote = text[pos]
+    pos += 1
+    out = []
+    n = len(text)
+    while pos < n:
+        ch = text[pos]
+        if ch == quote:
+            return ''.join(out), pos + 1
+        if ch == '\\':
+            pos += 1
+            esc = text[pos]
+            if esc == 'u':
+                out.append(chr(int(text[pos + 1:pos + 5], 16)))
+                pos += 5
+                continue
+            out.append(_STRING_ESCAPES.get(esc, esc))
+        else:
+            out.append(ch)
+        pos += 1
+    raise JSParseError(f'未闭合的字符串 (位置 {pos})')
+
+
+def parse_js_value(text, pos=0):
+    """从 pos 开始解析一个 JS 字面量，返回 (值, 结束位置)"""
+    pos = _skip_ws(text, pos)
+    if pos >= len(text):
+        raise JSParseError('意外的文件结尾')
+    ch = text[pos]
+
+    if ch in '"\'':
+        return _parse_string(text, pos)
+
+    if ch == '[':
+        items = []
+        pos += 1
+        while True:
+            pos = _skip_ws(text, pos)
+            if text[pos] == ']':
+                return items, pos + 1
+            value, pos = parse_js_value(text, pos)
+            items.append(value)
+            pos = _skip_ws(text, pos)
+            if text[pos] == ',':
+                pos += 1
+            elif text[pos] != ']':
+                raise JSParseError(f'数组中缺少逗号 (位置 {pos})')
+
+    if ch == '{':
+        obj = {}
+        pos += 1
+        while True:
+            pos = _skip_ws(text, pos)
+            if text[pos] == '}':
+                return obj, pos + 1
+            if text[pos] in '"\'':
+                key, pos = _parse_string(text, pos)
+            else:
+                m = _IDENT_RE.match(text, pos)
+                if not m:
+                    raise JSParseError(f'无效的对象键 (位置 {pos})')
+                key, pos = m.group(0), m.end()
+            pos = _skip_ws(text, pos)
+            if text[pos] != ':':
+                raise JSParseError(f'对象键后缺少冒号 (位置 {pos})')
+            value, pos = parse_js_value(text, pos + 1)
+            obj[key] = value
+            pos = _skip_ws(text, pos)
+            if text[pos] == ',':
+                pos += 1
+            elif text[pos] != '}':
+                raise JSParseError(f'对象中缺少逗号 (位置 {pos})')
+
+    m = _NUMBER_RE.match(text, pos)
+    if m:
+        raw = m.group(0)
+        value = float(raw) if any(c in raw for c in '.eE') else int(raw)
+        return value, m.end()
+
+    m = _IDENT_RE.match(text, pos)
+    if m and m.group(0) in ('true', 'false', 'null'):
+        return {'true': True, 'false': False, 'null': None}[m.group(0)], m.end()
+
+    raise JSParseError(f'无法解析的字面量 (位置 {pos})')
+
+
+def _find_const(content, name):
+    """找到 `const NAME = ` 之后字面量的起始位置"""
+    m = re.search(rf'\bconst\s+{name}\s*=\s*', content)
+    return m.end() if m else -1
+
+
+def _parse_const(content, name, default):
+    start = _find_const(content, name)
+    if start == -1:
+        return default
+    value, _ = parse_js_value(content, start)
+    return value
+
+
+# ========================================
+# players.js 文档模型（保留原有排版，便于原样重新生成）
+# ========================================
+
+PLAYER_FIELDS = ['id', 'name', 'nameEn', 'cost', 'positions', 'team', 'peakSeason', 'championships', 'allStar', 'mvp', 'fmvp']
+_SECTION_RE = re.compile(r'^\s*//\s*=====\s*\S+\s+([A-Z]{2,4})\b')
+
+
+REQUIRED_FIELDS = ['name', 'nameEn', 'cost', 'positions', 'team', 'peakSeason', 'championships', 'allStar', 'mvp', 'fmvp']
+INT_FIELDS = ['cost', 'championships', 'allStar', 'mvp', 'fmvp']
+VALID_POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C']
+
+
+def validate_player(data, team_ids, partial=False):
+    """校验并规范化球员字段，返回 (player, error)；partial=True 时只校验出现的字段，team_ids 为 None 时不校验球队代码"""
+    if not isinstance(data, dict):
+        return None, '请求数据必须是对象'
+    if not partial:
+        for field in REQUIRED_FIELDS:
+            if field not in data:
+                return None, f'缺少必填字段: {field}'
+    player = {}
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            continue
+        value = data[field]
+        if field in INT_FIELDS:
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                return None, f'字段 {field} 必须是整数'
+        elif field == 'positions':
+            if isinstance(value, str):
+                value = [p for p in re.split(r'[\s,/|]+', value) if p]
+            if not isinstance(value, list) or not value or any(p not in VALID_POSITIONS for p in value):
+                return None, f'无效的位置: {value}'
+        else:
+            value = str(value).strip()
+            if not value:
+                return None, f'字段 {field} 不能为空'
+        player[field] = value
+    if 'team' in player and team_ids is not None and player['team'] not in team_ids:
+        return None, f'未知球队代码: {player["team"]}'
+    return player, None
+
+
+LINEUP_REQUIRED_FIELDS = ['name', 'nameEn']
+
+
+def validate_team(team):
+    """校验一方阵容（位置 -> 球员），返回 (team, error)
+
+    位置只能是 PG/SG/SF/PF/C，空位可以省略或为 null；球员字段按 validate_player 的规则校验并规范化，
+    id 等其他字段原样保留。
+    """
+    if not isinstance(team, dict):
+        return None, '阵容必须是对象'
+    lineup = {}
+    for position, data in team.items():
+        if position not in VALID_POSITIONS:
+            return None, f'无效的阵容位置: {position}'
+        if data is None:
+            continue
+        if not isinstance(data, dict):
+            return None, f'{position} 位置的球员数据必须是对象'
+        for field in LINEUP_REQUIRED_FIELDS:
+            if field not in data:
+                return None, f'{position} 位置的球员缺少字段: {field}'
+        player, error = validate_player(data, None, partial=True)
+        if error:
+            return None, f'{position} 位置的球员: {error}'
+        lineup[position] = {**data, **player}
+    return lineup, None
+
+
+def iter_import_rows(stream, fmt):
+    """流式读取 CSV / JSONL 导入数据，逐行产出 (行号, 数据, 错误)"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # 行号从数据第一行算起（表头为第 1 行）
+            yield reader.line_num, {k.strip(): (v or '').strip() for k, v in row.items() if k}, None
+        return
+    for line_no, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_no, json.loads(line), None
+        except json.JSONDecodeError as e:
+            yield line_no, None, f'JSON 解析失败: {e.msg}'
+
+
+def player_key(player):
+    """判断重复球员的键：同一球员同一球队同一赛季"""
+    return (player.get('nameEn'), player.get('team'), player.get('peakSeason'))
+
+
+def _format_js_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return 'null'
+    if isinstance(value, (list, dict, str)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def format_player_line(player):
+    """按 players.js 的固定字段顺序格式化一行球员数据"""
+    keys = [k for k in PLAYER_FIELDS if k in player] + [k for k in player if k not in PLAYER_FIELDS]
+    fields = ', '.join(f'{k}: {_format_js_value(player[k])}' for k in keys)
+    return f'    {{ {fields} }},'
+
+
+class PlayersDocument:
+    """PLAYERS 数组前后的原文 + 数组内按行排列的条目（注释/空行原样保留，球员为 dict）"""
+
+    def __init__(self, content):
+        start = _find_const(content, 'PLAYERS')
+        if start == -1:
+            raise JSParseError('players.js 中找不到 const PLAYERS')
+        start = _skip_ws(content, start)
+        _, end = parse_js_value(content, start)
+        self.prefix = content[:start + 1]
+        self.suffix = content[end - 1:]
+        self.teams = _parse_const(content, 'NBA_TEAMS', [])
+        self.all_star_index = _parse_const(content, 'ALL_STAR_ROSTER_INDEX', {})
+        self.entries = []
+        pending = []
+        for line in content[start + 1:end - 1].split('\n'):
+            if not pending and not line.lstrip().startswith('{'):
+                self.entries.append(line)
+                continue
+            pending.append(line)
+            text = '\n'.join(pending)
+            try:
+                player, _ = parse_js_value(text, text.index('{'))
+            except (JSParseError, IndexError):
+                continue
+            self.entries.append(player)
+            pending = []
+        if pending:
+            raise JSParseError('PLAYERS 中存在未闭合的球员对象')
+
+    @property
+    def players(self):
+        return [e for e in self.entries if isinstance(e, dict)]
+
+    def render(self):
+        lines = [format_player_line(e) if isinstance(e, dict) else e for e in self.entries]
+        return self.prefix + '\n'.join(lines) + self.suffix
+
+    def _insert_positions(self, teams):
+        """一次扫描算出每支球队的插入位置：该球队区块最后一名球员之后"""
+        teams = set(teams)
+        section = None
+        section_pos = {}
+        last_in_team = {}
+        last_player = None
+        for pos, entry in enumerate(self.entries):
+            if isinstance(entry, dict):
+                last_player = pos
+                if section in teams:
+                    last_in_team[section] = pos
+            else:
+                m = _SECTION_RE.match(entry)
+                if m:
+                    section = m.group(1)
+                    if section in teams:
+                        section_pos.setdefault(section, pos)
+        fallback = (last_player + 1) if last_player is not None else len(self.entries) - 1
+        positions = {}
+        for team in teams:
+            if team in last_in_team:
+                positions[team] = last_in_team[team] + 1
+            elif team in section_pos:
+                positions[team] = section_pos[team] + 1
+            else:
+                positions[team] = fallback
+        return positions
+
+    def _insert_players(self, players):
+        """批量插入新球员，只扫描、重建条目列表各一次"""
+        positions = self._insert_positions(p.get('team') for p in players)
+        by_pos = {}
+        for player in players:
+            by_pos.setdefault(positions[player.get('team')], []).append(player)
+        entries = []
+        for pos, entry in enumerate(self.entries):
+            entries.extend(by_pos.pop(pos, ()))
+            entries.append(entry)
+        for pos in sorted(by_pos):
+            entries.extend(by_pos[pos])
+        self.entries = entries
+
+    def apply(self, op):
+        """应用一条日志操作；所有操作都是幂等的，重放不会产生重复数据"""
+        kind = op['op']
+        player_id = op['id']
+        if kind == 'add':
+            player = {'id': player_id, **op['player']}
+            for pos, entry in enumerate(self.entries):
+                if isinstance(entry, dict) and entry['id'] == player_id:
+                    self.entries[pos] = player
+                    return
+            self._insert_players([player])
+        elif kind == 'update':
+            for pos, entry in enumerate(self.entries):
+                if isinstance(entry, dict) and entry['id'] == player_id:
+                    moved = 'team' in op['fields'] and op['fields']['team'] != entry.get('team')
+                    entry.update(op['fields'])
+                    if moved:
+                        # 换队后移到新球队区块的末尾，保持按球队分区的排版
+                        del self.entries[pos]
+                        self._insert_players([entry])
+                    return
+        elif kind == 'delete':
+            self.entries = [e for e in self.entries if not (isinstance(e, dict) and e['id'] == player_id)]
+        else:
+            raise ValueError(f'未知的日志操作: {kind}')
+
+    def apply_all(self, ops):
+        """按顺序应用多条操作；连续的新增球员合并为一次批量插入"""
+        existing = {e['id'] for e in self.entries if isinstance(e, dict)}
+        batch = []
+        for op in ops:
+            if op['op'] == 'add' and op['id'] not in existing:
+                batch.append({'id': op['id'], **op['player']})
+                existing.add(op['id'])
+                continue
+            if batch:
+                self._insert_players(batch)
+                batch = []
+            self.apply(op)
+            if op['op'] == 'add':
+                existing.add(op['id'])
+            elif op['op'] == 'delete':
+                existing.discard(op['id'])
+        if batch:
+            self._insert_players(batch)
+
+
+# ========================================
+# 内存索引
+# ========================================
+
+COUNT_FIELDS = ['championships', 'allStar', 'mvp', 'fmvp']
+
+
+def _display_sort_key(player):
+    return (-player.get('cost', 0), -player.get('allStar', 0), player.get('id', 0))
+
+
+class PlayerIndex:
+    """某一版本球员数据的只读索引，数据变化时整体替换"""
+
+    def __init__(self, players, teams, all_star_index, version):
+        self.players = players
+        self.teams = teams
+        self.all_star_index = all_star_index
+        self.version = version
+        self.by_id = {}
+        self.by_name_en = {}
+        self.duplicate_ids = []
+        for player in players:
+            if player['id'] in self.by_id:
+                self.duplicate_ids.append(player['id'])
+            else:
+                self.by_id[player['id']] = player
+            self.by_name_en.setdefault(player.get('nameEn'), []).append(player)
+        self.max_id = max(self.by_id) if self.by_id else 0
+
+        # 二级索引：值 -> 行号集合（按行号而非ID，避免重复ID互相覆盖）
+        # 全局排序与前端 getPlayersByTeam() 一致：成本 ↓，全明星 ↓，ID ↑
+        order = sorted(range(len(players)), key=lambda i: _display_sort_key(players[i]))
+        self.rank = [0] * len(players)
+        for rank, row in enumerate(order):
+            self.rank[row] = rank
+        self.by_team = {}
+        for row in order:
+            self.by_team.setdefault(players[row].get('team'), []).append(players[row])
+        self.team_rows = {}
+        self.cost_rows = {}
+        self.position_rows = {}
+        self.count_rows = {field: {} for field in COUNT_FIELDS}
+        for row, player in enumerate(players):
+            self.team_rows.setdefault(player.get('team'), set()).add(row)
+            self.cost_rows.setdefault(player.get('cost'), set()).add(row)
+            for pos in player.get('positions') or ():
+                self.position_rows.setdefault(pos, set()).add(row)
+            for field in COUNT_FIELDS:
+                self.count_rows[field].setdefault(player.get(field, 0), set()).add(row)
+
+        self._payloads = {}
+        self._payload_lock = threading.Lock()
+
+    def _rows_at_least(self, field, minimum):
+        rows = set()
+        for value, value_rows in self.count_rows[field].items():
+            if value >= minimum:
+                rows |= value_rows
+        return rows
+
+    def query(self, teams=None, costs=None, positions=None, minimums=None, sort=None):
+        """按二级索引求交集，返回排好序的球员列表
+
+        teams / costs / positions 为可选值列表（同一条件内为“或”，不同条件之间为“与”），
+        minimums 为 {championships|allStar|mvp|fmvp: 下限}，sort 为 [(字段, 是否降序)]。
+        """
+        candidates = []
+        if teams:
+            candidates.append(set().union(*(self.team_rows.get(t, ()) for t in teams)))
+        if costs:
+            candidates.append(set().union(*(self.cost_rows.get(c, ()) for c in costs)))
+        if positions:
+            candidates.append(set().union(*(self.position_rows.get(p, ()) for p in positions)))
+        for field, minimum in (minimums or {}).items():
+            candidates.append(self._rows_at_least(field, minimum))
+
+        if candidates:
+            candidates.sort(key=len)
+            rows = candidates[0].intersection(*candidates[1:])
+        else:
+            rows = range(len(self.players))
+
+        if sort:
+            # 多键排序：从最次要的键开始依次稳定排序，默认顺序作为最终兜底
+            rows = sorted(rows, key=self.rank.__getitem__)
+            for field, descending in reversed(sort):
+                rows.sort(key=lambda r: self.players[r].get(field, 0), reverse=descending)
+        else:
+            rows = sorted(rows, key=self.rank.__getitem__)
+        return [self.players[r] for r in rows]
+
+    def payload(self, key, build):
+        """按 key 缓存序列化结果 (json_bytes, gzip_bytes, etag)，同一版本只构建一次"""
+        cached = self._payloads.get(key)
+        if cached is not None:
+            return cached
+        with self._payload_lock:
+            cached = self._payloads.get(key)
+            if cached is None:
+                body = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                etag = f'{self.version}-{hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:8]}'
+                cached = (body, gzip.compress(body, compresslevel=6), etag)
+                self._payloads[key] = cached
+        return cached
+
+
+def parse_players_file(content):
+    """解析 players.js 文本，返回 PlayerIndex"""
+    doc = PlayersDocument(content)
+    version = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    return PlayerIndex(doc.players, doc.teams, doc.all_star_index, version)
+
+
+def _atomic_write(path, content):
+    """先写临时文件并 fsync，再 rename 覆盖，保证目标文件不会被截断"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PlayerStore:
+    """players.js 的内存模型 + 写前日志 + 批量原子落盘"""
+
+    def __init__(self, path, flush_delay=2.0, flush_batch=100):
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + '.journal'
+        self.flush_delay = flush_delay
+        self.flush_batch = flush_batch
+        self._lock = threading.RLock()
+        self._doc = None
+        self._index = None
+        self._stamp = None
+        self._base_version = None
+        self._pending = []  # 已写入日志、尚未落盘到 players.js 的操作
+        self._seq = 0
+        self._flush_timer = None
+        self.on_flush = None  # players.js 重写后的回调（例如重建静态资源）
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_journal(self):
+        ops = []
+        if not os.path.exists(self.journal_path):
+            return ops
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ops.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 崩溃时最后一行可能只写了一半，丢弃即可
+                    print(f"[球员] 警告: 忽略损坏的日志行: {line[:80]}", flush=True)
+        return ops
+
+    def load(self):
+        """重新解析 players.js，并重放尚未落盘的日志"""
+        with self._lock:
+            stamp = self._file_stamp()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            doc = PlayersDocument(content)
+            self._base_version = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+            self._pending = self._read_journal()
+            doc.apply_all(self._pending)
+            self._doc = doc
+            self._stamp = stamp
+            self._seq = 0
+            index = self._rebuild_index()
+            print(f"[球员] 已加载 players.js: {len(index.players)} 名球员, {len(index.teams)} 支球队, 版本 {index.version}", flush=True)
+            if self._pending:
+                print(f"[球员] 从日志重放了 {len(self._pending)} 条未落盘的修改", flush=True)
+                self._schedule_flush()
+            if index.duplicate_ids:
+                print(f"[球员] 警告: 存在重复ID {sorted(set(index.duplicate_ids))}，按首次出现建立索引", flush=True)
+            return index
+
+    def _rebuild_index(self):
+        version = self._base_version
+        if self._seq or self._pending:
+            version = hashlib.sha1(f'{self._base_version}:{self._seq}:{len(self._pending)}'.encode('utf-8')).hexdigest()[:16]
+        doc = self._doc
+        self._index = PlayerIndex(doc.players, doc.teams, doc.all_star_index, version)
+        return self._index
+
+    def get(self):
+        """返回当前索引；文件被外部修改时自动重新加载"""
+        index = self._index
+        try:
+            stamp = self._file_stamp()
+        except OSError:
+            if index is None:
+                raise
+            return index
+        if index is None or stamp != self._stamp:
+            with self._lock:
+                if self._index is None or self._file_stamp() != self._stamp:
+                    return self.load()
+                return self._index
+        return index
+
+    def invalidate(self):
+        """外部直接改写文件后调用，下次 get() 时强制重新解析"""
+        with self._lock:
+            self._stamp = None
+
+    def next_id(self):
+        return self.get().max_id + 1
+
+    # ---------- 写路径 ----------
+
+    def _commit(self, ops, flush_now=False):
+        """追加日志 -> 应用到内存 -> 安排落盘"""
+        with self._lock:
+            self.get()
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                for op in ops:
+                    f.write(json.dumps(op, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._doc.apply_all(ops)
+            self._pending.extend(ops)
+            self._seq += 1
+            self._rebuild_index()
+            if flush_now or len(self._pending) >= self.flush_batch:
+                self.flush()
+            else:
+                self._schedule_flush()
+
+    def add_player(self, player):
+        """添加球员，返回新ID"""
+        with self._lock:
+            new_id = self.next_id()
+            self._commit([{'op': 'add', 'id': new_id, 'player': player}])
+            return new_id
+
+    def add_players(self, players):
+        """批量添加球员：一次分配ID、一次写日志、一次重写 players.js，返回新ID列表"""
+        if not players:
+            return []
+        with self._lock:
+            first_id = self.next_id()
+            ops = [{'op': 'add', 'id': first_id + i, 'player': p} for i, p in enumerate(players)]
+            self._commit(ops, flush_now=True)
+            return [op['id'] for op in ops]
+
+    def update_player(self, player_id, fields):
+        """修改球员，找不到时返回 False"""
+        with self._lock:
+            if player_id not in self.get().by_id:
+                return False
+            fields = {k: v for k, v in fields.items() if k != 'id'}
+            self._commit([{'op': 'update', 'id': player_id, 'fields': fields}])
+            return True
+
+    def delete_player(self, player_id):
+        """删除球员，找不到时返回 False"""
+        with self._lock:
+            if player_id not in self.get().by_id:
+                return False
+            self._commit([{'op': 'delete', 'id': player_id}])
+            return True
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def flush(self):
+        """把内存模型原子写回 players.js 并清空日志；没有待落盘修改时直接返回"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return False
+            started = time.time()
+            content = self._doc.render()
+            _atomic_write(self.path, content)
+            # players.js 已包含全部修改后才截断日志；两步之间崩溃只会导致幂等重放
+            _atomic_write(self.journal_path, '')
+            count = len(self._pending)
+            self._pending = []
+            self._stamp = self._file_stamp()
+            self._base_version = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+            self._seq = 0
+            self._rebuild_index()
+            print(f"[球员] players.js 已落盘: {count} 条修改, 耗时 {(time.time() - started) * 1000:.1f}ms", flush=True)
+            if self.on_flush is not None:
+                self.on_flush()
+            return True
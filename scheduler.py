@@ -0,0 +1,152 @@
+# ========================================
+# 模拟调度器 - 限制同时进行的上游 LLM 流
+# ========================================
+# 每个上游请求先在这里申请一个名额：
+#   - 同时进行的上游流不超过 max_concurrent，多余的请求排队
+#   - 在线房间（PRIORITY_LIVE）优先于批量赛事（PRIORITY_BATCH），预先模拟（PRIORITY_SPECULATIVE）排在最后
+#   - 同一优先级内按来源（房间 / 赛事）公平轮转，一个大赛事不会饿死其他请求
+#   - 每个请求有截止时间，排队超时直接放弃（由调用方改用本地引擎兜底）
+# 排队期间通过 on_position 回调通知当前排位和预计等待时间。
+
+import math
+import time
+import itertools
+import threading
+
+PRIORITY_LIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_SPECULATIVE = 2  # 房间选满后的预先模拟：玩家可能不会开始，不与真实请求争抢名额
+
+
+class QueueTimeout(Exception):
+    """排队超过截止时间"""
+
+
+class QueueCancelled(Exception):
+    """排队中的请求被取消"""
+
+
+class Ticket:
+    def __init__(self, priority, owner, deadline, vtime, seq):
+        self.priority = priority
+        self.owner = owner
+        self.deadline = deadline
+        self.vtime = vtime
+        self.seq = seq
+        self.enqueued_at = time.time()
+        self.admitted_at = None
+        self.cancelled = False
+
+    def key(self):
+        return (self.priority, self.vtime, self.seq)
+
+    def expired(self):
+        return self.deadline is not None and time.time() > self.deadline
+
+
+class SimulationScheduler:
+    def __init__(self, max_concurrent=4, default_deadline=600.0, initial_estimate=90.0):
+        self.max_concurrent = max(1, max_concurrent)
+        self.default_deadline = default_deadline
+        self.avg_duration = initial_estimate  # 上游流平均耗时（指数滑动平均），用于估算等待时间
+        self.running = 0
+        self.admitted = 0
+        self.timeouts = 0
+        self._waiting = []
+        self._owner_vtime = {}
+        self._vtime = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def estimated_wait(self, position):
+        return round(math.ceil(position / self.max_concurrent) * self.avg_duration)
+
+    def expected_wait(self, priority=PRIORITY_LIVE):
+        """新请求按该优先级进来时的预计排队秒数，用于选择模拟档位"""
+        with self._cond:
+            ahead = sum(1 for t in self._waiting if t.priority <= priority)
+            if self.running + ahead < self.max_concurrent:
+                return 0
+            return self.estimated_wait(ahead + 1)
+
+    def _position(self, ticket):
+        key = ticket.key()
+        return 1 + sum(1 for t in self._waiting if t.key() < key)
+
+    def promote(self, ticket, priority):
+        """提高排队中请求的优先级（例如在线房间合并到了批量赛事发起的同一对阵）"""
+        with self._cond:
+            if ticket.admitted_at is None and priority < ticket.priority:
+                ticket.priority = priority
+                self._cond.notify_all()
+
+    def cancel(self, ticket):
+        """取消还在排队的请求，acquire 抛出 QueueCancelled"""
+        with self._cond:
+            if ticket.admitted_at is None:
+                ticket.cancelled = True
+                self._cond.notify_all()
+
+    def acquire(self, priority=PRIORITY_LIVE, owner=None, deadline=None, on_position=None, on_enqueue=None):
+        """申请一个上游名额，返回 Ticket；排队超过截止时间抛出 QueueTimeout"""
+        if deadline is None and self.default_deadline:
+            deadline = time.time() + self.default_deadline
+        with self._cond:
+            # 公平排队：每个来源的虚拟时间单独递增，不早于当前已放行的虚拟时间
+            vtime = max(self._owner_vtime.get(owner, 0), self._vtime)
+            self._owner_vtime[owner] = vtime + 1
+            ticket = Ticket(priority, owner, deadline, vtime, next(self._seq))
+            self._waiting.append(ticket)
+            if on_enqueue is not None:
+                on_enqueue(ticket)
+            last_position = None
+            try:
+                while True:
+                    if ticket.cancelled:
+                        raise QueueCancelled('排队中的请求已取消')
+                    position = self._position(ticket)
+                    if self.running < self.max_concurrent and position == 1:
+                        break
+                    if ticket.expired():
+                        self.timeouts += 1
+                        raise QueueTimeout(f'排队超过截止时间（{time.time() - ticket.enqueued_at:.1f} 秒）')
+                    if on_position is not None and position != last_position:
+                        last_position = position
+                        on_position(position, self.estimated_wait(position))
+                    timeout = None if ticket.deadline is None else max(ticket.deadline - time.time(), 0.01)
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._waiting.remove(ticket)
+            self._vtime = max(self._vtime, ticket.vtime)
+            self.running += 1
+            self.admitted += 1
+            ticket.admitted_at = time.time()
+            self._cond.notify_all()
+        if last_position is not None:
+            print(f"[调度] 请求排队 {ticket.admitted_at - ticket.enqueued_at:.1f} 秒后开始（来源 {owner}）", flush=True)
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            self.running -= 1
+            duration = time.time() - ticket.admitted_at
+            self.avg_duration = self.avg_duration * 0.8 + duration * 0.2
+            if not any(t.owner == ticket.owner for t in self._waiting):
+                # 来源已没有排队中的请求，其虚拟时间不会超过当前值，清理掉避免字典无限增长
+                self._owner_vtime.pop(ticket.owner, None)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'maxConcurrent': self.max_concurrent,
+                'running': self.running,
+                'queued': len(self._waiting),
+                'queuedLive': sum(1 for t in self._waiting if t.priority == PRIORITY_LIVE),
+                'admitted': self.admitted,
+                'timeouts': self.timeouts,
+                'avgDurationSeconds': round(self.avg_duration, 1)
+            }
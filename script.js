@@ -16,7 +16,10 @@ let onlineMode = false;
 let roomId = null;
 let myPlayerNum = null;
 let keepAliveInterval = null; // 保活定时器
+let battleStream = { battleId: null, lastSeq: 0 }; // 已收到的对战流位置，重连时只补发缺失部分
 let isReady = false;
+let roomStateCache = null; // 最近一次的完整房间状态，广播事件只带相对上一版本的增量
+let roomSyncPending = null; // 等待完整状态的事件处理（发现版本缺口后）
 
 // ========================================
 // 联机提示音：轮到我操作时提醒
@@ -155,7 +158,9 @@ function initSocket() {
             // 请求恢复房间状态
             socket.emit('rejoin_room', {
                 room_id: roomId,
-                player_num: myPlayerNum
+                player_num: myPlayerNum,
+                battle_id: battleStream.battleId,
+                last_seq: battleStream.lastSeq
             });
         }
     });
@@ -218,16 +223,17 @@ function initSocket() {
     });
     
     // 房间事件
-    socket.on('room_created', handleRoomCreated);
-    socket.on('room_joined', handleRoomJoined);
-    socket.on('player_joined', handlePlayerJoined);
+    socket.on('room_created', withRoomState(handleRoomCreated));
+    socket.on('room_joined', withRoomState(handleRoomJoined));
+    socket.on('player_joined', withRoomState(handlePlayerJoined));
+    socket.on('room_snapshot', handleRoomSnapshot);
     socket.on('player_left', handlePlayerLeft);
-    socket.on('player_ready', handlePlayerReady);
+    socket.on('player_ready', withRoomState(handlePlayerReady));
     
     // 游戏事件
-    socket.on('team_selected', handleTeamSelected);
-    socket.on('player_selected', handlePlayerSelected);
-    socket.on('turn_skipped', handleTurnSkipped);
+    socket.on('team_selected', withRoomState(handleTeamSelected));
+    socket.on('player_selected', withRoomState(handlePlayerSelected));
+    socket.on('turn_skipped', withRoomState(handleTurnSkipped));
     socket.on('battle_ready', handleBattleReady);
     
     // 对战模拟事件
@@ -240,7 +246,19 @@ function initSocket() {
     });
     
     // 游戏重新开始事件
-    socket.on('game_restarted', handleGameRestarted);
+    socket.on('game_restarted', withRoomState(handleGameRestarted));
+    
+    // 房间长时间无人操作，被服务端清理
+    socket.on('room_expired', (data) => {
+        showToast(data.message, 'warning');
+        leaveRoom();
+    });
+    
+    // 快速模式切换
+    socket.on('quick_mode_changed', withRoomState((data) => {
+        setQuickModeCheckbox(data.quick_mode);
+        showToast(data.quick_mode ? '已开启快速模式' : '已关闭快速模式', 'info');
+    }));
 }
 
 // 客户端心跳保活机制
@@ -270,6 +288,76 @@ function stopKeepAlive() {
     }
 }
 
+// 房间状态同步：带 room_state 的事件是完整状态，带 room_patch 的事件只包含相对上一版本的增量
+// 处理函数收到的 data.room_state 总是应用增量后的完整状态
+function withRoomState(handler) {
+    return (data) => {
+        if (data.room_state) {
+            roomStateCache = data.room_state;
+            handler(data);
+            flushRoomSyncPending();
+            return;
+        }
+        if (!data.room_patch) {
+            handler(data);
+            return;
+        }
+        const patch = data.room_patch;
+        if (roomStateCache && patch.base === roomStateCache.version) {
+            applyRoomPatch(roomStateCache, patch.ops);
+            roomStateCache.version = patch.version;
+        } else if (!roomStateCache || patch.base > roomStateCache.version) {
+            // 版本缺口：先请求完整状态，收到后再处理这个事件
+            requestRoomSnapshot(() => handler(Object.assign({}, data, { room_state: roomStateCache })));
+            return;
+        }
+        // patch.base 更旧说明完整状态里已经包含这些变化
+        handler(Object.assign({}, data, { room_state: roomStateCache }));
+    };
+}
+
+function applyRoomPatch(state, ops) {
+    for (const op of ops) {
+        let target = state;
+        for (const key of op.path.slice(0, -1)) {
+            if (target[key] === null || typeof target[key] !== 'object') {
+                target[key] = {};
+            }
+            target = target[key];
+        }
+        const last = op.path[op.path.length - 1];
+        if (op.delete) {
+            delete target[last];
+        } else {
+            target[last] = op.value;
+        }
+    }
+}
+
+function requestRoomSnapshot(callback) {
+    if (roomSyncPending) {
+        roomSyncPending.push(callback);
+        return;
+    }
+    roomSyncPending = [callback];
+    console.log('[同步] 房间状态版本不连续，请求完整状态');
+    if (socket && roomId) {
+        socket.emit('sync_room', { room_id: roomId });
+    }
+}
+
+function handleRoomSnapshot(data) {
+    console.log('[同步] 收到完整房间状态, 版本:', data.room_state.version);
+    roomStateCache = data.room_state;
+    flushRoomSyncPending();
+}
+
+function flushRoomSyncPending() {
+    const pending = roomSyncPending || [];
+    roomSyncPending = null;
+    pending.forEach(callback => callback());
+}
+
 // 房间事件处理
 function handleRoomCreated(data) {
     console.log('[房间] 房间已创建:', data);
@@ -421,7 +509,8 @@ function handlePlayerSelected(data) {
     // 对方选完人后，如果轮到我了，播放提示音
     maybePlayMyTurnSfxFromServerEvent(data.room_state, prevCurrentPlayer, data.player_num);
     
-    showToast(`${getPlayerName(data.player_num)} 选择了 ${data.player_data.name}`, 'success');
+    const picked = (data.room_state.game_state.teams[data.player_num] || {})[data.position];
+    showToast(`${getPlayerName(data.player_num)} 选择了 ${picked ? picked.name : '球员'}`, 'success');
 }
 
 function handleTurnSkipped(data) {
@@ -446,6 +535,8 @@ function handleBattleReady(data) {
 // 对战开始事件
 function handleBattleStarted(data) {
     console.log('[对战] 收到 battle_started 事件:', data);
+    battleStream = { battleId: data.battle_id || null, lastSeq: 0 };
+    window.battleContentStarted = false;
     
     // 禁用按钮，显示状态
     const simulateBtn = document.getElementById('simulate-btn');
@@ -479,24 +570,42 @@ function handleBattleStarted(data) {
 function handleBattleStream(data) {
     console.log('[对战] 收到 battle_stream 事件, 类型:', data.type, '数据:', data);
     
-    if (data.type === 'reasoning') {
+    if (data.seq) {
+        // 重连补发可能与实时推送重叠，已处理过的序号直接跳过
+        if (data.battleId === battleStream.battleId && data.seq <= battleStream.lastSeq) return;
+        battleStream = { battleId: data.battleId, lastSeq: data.seq };
+    }
+    
+    if (data.type === 'gap') {
+        // 断线太久，部分思考内容已不在服务端缓冲中
+        const thinkingContentEl = document.getElementById('thinking-content');
+        if (thinkingContentEl) {
+            thinkingContentEl.appendChild(document.createTextNode(`\n……（断线期间的 ${data.missed} 段内容已过期）……\n`));
+        }
+    } else if (data.type === 'queue') {
+        // 模拟请求排队中，显示排位和预计等待时间
+        updateQueueStatus(data);
+    } else if (data.type === 'tier') {
+        // 服务端繁忙或开启了快速模式，改用快速模型 / 本地引擎
+        showTierNotice(data);
+    } else if (data.type === 'reasoning') {
         // 更新思考内容
         const thinkingContentEl = document.getElementById('thinking-content');
         if (thinkingContentEl) {
             const spinner = thinkingContentEl.querySelector('.thinking-spinner');
-            if (spinner) spinner.remove();
-            
-            if (!thinkingContentEl.dataset.content) {
-                thinkingContentEl.dataset.content = '';
+            if (spinner) {
+                spinner.remove();
+                updateQueueStatus(null);
             }
-            thinkingContentEl.dataset.content += data.content;
-            thinkingContentEl.textContent = thinkingContentEl.dataset.content;
+            
+            // 追加文本节点，不再把完整思考内容保存在 dataset 里反复重写
+            thinkingContentEl.appendChild(document.createTextNode(data.content));
             thinkingContentEl.scrollTop = thinkingContentEl.scrollHeight;
         }
     } else if (data.type === 'content') {
         // 收集生成的内容
-        if (!window.battleContentBuffer) {
-            window.battleContentBuffer = '';
+        if (!window.battleContentStarted) {
+            window.battleContentStarted = true;
             
             // 第一次收到 content 时，更新思考状态并创建实时输出区域
             const statusEl = document.getElementById('thinking-status');
@@ -517,14 +626,15 @@ function handleBattleStream(data) {
             createLiveOutputBox();
         }
         
-        window.battleContentBuffer += data.content;
-        
         // 实时显示输出内容
         const liveOutputEl = document.getElementById('live-output-content');
         if (liveOutputEl) {
-            liveOutputEl.textContent = window.battleContentBuffer;
+            liveOutputEl.appendChild(document.createTextNode(data.content));
             liveOutputEl.scrollTop = liveOutputEl.scrollHeight;
         }
+    } else if (LIVE_PROGRESS_TYPES.includes(data.type)) {
+        // 赛前分析 / 单场比分 / FMVP / 总结一生成就先显示
+        showLiveProgress(data);
     } else if (data.type === 'result') {
         // 显示最终结果
         const logContent = document.getElementById('log-content');
@@ -551,8 +661,8 @@ function handleBattleStream(data) {
             simulateBtn.textContent = '开始绩效评估';
         }
         
-        // 清理缓冲
-        window.battleContentBuffer = '';
+        // 重置输出状态
+        window.battleContentStarted = false;
     } else if (data.type === 'error') {
         console.error('[对战] 错误:', data.error);
         showToast('对战模拟失败: ' + data.error, 'error');
@@ -566,6 +676,74 @@ function handleBattleStream(data) {
     }
 }
 
+// 排队状态：服务端同时进行的模拟数量有限，排队时显示排位和预计等待时间
+// 传入 null 表示排队结束，恢复为"思考中..."
+function updateQueueStatus(data) {
+    const statusEl = document.getElementById('thinking-status');
+    if (statusEl) {
+        statusEl.textContent = data ? `排队中：第 ${data.position} 位，预计等待约 ${data.estimatedWait} 秒` : '思考中...';
+    }
+}
+
+// 模拟档位：服务端繁忙或开启快速模式时不使用推理模型
+const TIER_LABELS = { fast: '快速模型', local: '本地引擎' };
+
+function showTierNotice(data) {
+    const label = TIER_LABELS[data.tier] || data.tier;
+    showToast(`${data.reason || '服务繁忙'}，本次改用${label}模拟`, 'info');
+    const statusEl = document.getElementById('thinking-status');
+    if (statusEl) {
+        statusEl.textContent = `${label}模拟中...`;
+    }
+}
+
+// 快速模式开关：在线模式下同步给房间内双方，单机模式只影响本机请求
+function isQuickMode() {
+    const checkbox = document.getElementById('quick-mode');
+    return !!(checkbox && checkbox.checked);
+}
+
+function setQuickModeCheckbox(enabled) {
+    const checkbox = document.getElementById('quick-mode');
+    if (checkbox && enabled !== undefined) {
+        checkbox.checked = !!enabled;
+    }
+}
+
+function toggleQuickMode(enabled) {
+    if (onlineMode && socket && roomId) {
+        // 以服务端广播的 quick_mode_changed 为准
+        setQuickModeCheckbox(!enabled);
+        socket.emit('set_quick_mode', { room_id: roomId, enabled });
+    }
+}
+
+// 流式结果中已完整的部分：服务端边生成边解析，逐项推送
+const LIVE_PROGRESS_TYPES = ['analysis', 'game', 'fmvp', 'summary'];
+
+function showLiveProgress(data) {
+    createLiveOutputBox();
+    const progressEl = document.getElementById('live-output-progress');
+    if (!progressEl || !data.data) return;
+    
+    let text = '';
+    if (data.type === 'analysis') {
+        text = `📊 赛前预测：${data.data.prediction || '分析完成'}`;
+    } else if (data.type === 'game') {
+        const game = data.data;
+        text = `G${game.gameNumber} ${getPlayerName(1)} ${game.score?.team1 ?? '-'} : ${game.score?.team2 ?? '-'} ${getPlayerName(2)}`;
+        if (game.keyFactor) text += `（${game.keyFactor}）`;
+    } else if (data.type === 'fmvp') {
+        text = `🏆 FMVP：${data.data.name || '-'}`;
+    } else if (data.type === 'summary') {
+        text = `📝 ${data.data}`;
+    }
+    const line = document.createElement('div');
+    line.className = 'live-progress-line';
+    line.textContent = text;
+    progressEl.appendChild(line);
+}
+
 // 创建思考框
 function createThinkingBox() {
     const logContent = document.getElementById('log-content');
@@ -611,6 +789,7 @@ function createLiveOutputBox() {
                 <span class="live-output-hint">实时输出</span>
             </div>
         </div>
+        <div class="live-output-progress" id="live-output-progress"></div>
         <div class="live-output-content" id="live-output-content"></div>
     `;
     logContent.appendChild(liveOutputBox);
@@ -1171,6 +1350,7 @@ function showWaitingRoom() {
 function updateWaitingRoom(roomState) {
     const player1 = roomState.players['1'];
     const player2 = roomState.players['2'];
+    setQuickModeCheckbox(roomState.quick_mode);
     
     // 更新玩家1信息
     document.getElementById('waiting-player1-name').textContent = player1 ? player1.name : '等待中...';
@@ -1232,6 +1412,8 @@ function leaveRoom() {
     myPlayerNum = null;
     isReady = false;
     onlineMode = false;
+    roomStateCache = null;
+    roomSyncPending = null;
     
     // 重置界面 - 显示房间选择界面
     document.getElementById('waiting-room').style.display = 'none';
@@ -1300,6 +1482,7 @@ function syncGameState(roomState) {
         console.log('[同步] 开始同步游戏状态:', roomState);
         
         const gs = roomState.game_state;
+        setQuickModeCheckbox(roomState.quick_mode);
         
         if (!gs) {
             console.error('[同步] 游戏状态为空');
@@ -1334,15 +1517,16 @@ function syncGameState(roomState) {
         
         // 更新已选队伍
         if (gs.used_teams) {
-            gameState.players[1].usedTeams = gs.used_teams['1'] || [];
-            gameState.players[2].usedTeams = gs.used_teams['2'] || [];
+            // 复制一份，本地修改不影响缓存的房间状态
+            gameState.players[1].usedTeams = [...(gs.used_teams['1'] || [])];
+            gameState.players[2].usedTeams = [...(gs.used_teams['2'] || [])];
             console.log('[同步] 已选队伍: P1=', gameState.players[1].usedTeams.length, ', P2=', gameState.players[2].usedTeams.length);
         }
         
         // 更新阵容并重建 selectedPlayerIds
         if (gs.teams) {
-            gameState.players[1].roster = gs.teams['1'] || {};
-            gameState.players[2].roster = gs.teams['2'] || {};
+            gameState.players[1].roster = { ...(gs.teams['1'] || {}) };
+            gameState.players[2].roster = { ...(gs.teams['2'] || {}) };
             
             // 重建 selectedPlayerIds（从双方阵容中收集所有已选球员的ID）
             gameState.selectedPlayerIds.clear();
@@ -2218,7 +2402,8 @@ async function simulateSeries() {
             body: JSON.stringify({
                 team1: team1Data,
                 team2: team2Data,
-                playerNames: gameState.playerNames
+                playerNames: gameState.playerNames,
+                quick: isQuickMode()
             })
         });
         
@@ -2229,17 +2414,18 @@ async function simulateSeries() {
         // 处理流式响应
         const reader = response.body.getReader();
         const decoder = new TextDecoder();
-        let reasoningText = '';
-        let contentText = '';
         let resultData = null;
         let contentStarted = false;
+        let pending = '';
         
         while (true) {
             const { done, value } = await reader.read();
             if (done) break;
             
-            const chunk = decoder.decode(value);
-            const lines = chunk.split('\n');
+            // 合并后的帧较大，可能被拆到多次读取中，不完整的最后一行留到下次再解析
+            pending += decoder.decode(value, { stream: true });
+            const lines = pending.split('\n');
+            pending = lines.pop();
             
             for (const line of lines) {
                 if (line.startsWith('data: ')) {
@@ -2249,16 +2435,22 @@ async function simulateSeries() {
                     try {
                         const parsed = JSON.parse(data);
                         
-                        if (parsed.type === 'reasoning') {
-                            reasoningText += parsed.content;
+                        if (parsed.type === 'queue') {
+                            updateQueueStatus(parsed);
+                        } else if (parsed.type === 'tier') {
+                            showTierNotice(parsed);
+                        } else if (parsed.type === 'reasoning') {
                             const thinkingContentEl = document.getElementById('thinking-content');
                             if (thinkingContentEl) {
                                 // 移除spinner
                                 const spinner = thinkingContentEl.querySelector('.thinking-spinner');
-                                if (spinner) spinner.remove();
+                                if (spinner) {
+                                    spinner.remove();
+                                    updateQueueStatus(null);
+                                }
                                 
-                                // 更新思考内容
-                                thinkingContentEl.textContent = reasoningText;
+                                // 追加思考内容
+                                thinkingContentEl.appendChild(document.createTextNode(parsed.content));
                                 
                                 // 自动滚动到底部
                                 thinkingContentEl.scrollTop = thinkingContentEl.scrollHeight;
@@ -2287,13 +2479,14 @@ async function simulateSeries() {
                                 createLiveOutputBox();
                             }
                             
-                            // 累积内容并实时显示
-                            contentText += parsed.content;
+                            // 实时显示输出内容
                             const liveOutputEl = document.getElementById('live-output-content');
                             if (liveOutputEl) {
-                                liveOutputEl.textContent = contentText;
+                                liveOutputEl.appendChild(document.createTextNode(parsed.content));
                                 liveOutputEl.scrollTop = liveOutputEl.scrollHeight;
                             }
+                        } else if (LIVE_PROGRESS_TYPES.includes(parsed.type)) {
+                            showLiveProgress(parsed);
                         } else if (parsed.type === 'result') {
                             resultData = parsed.data;
                         } else if (parsed.type === 'error') {
@@ -2337,6 +2530,14 @@ async function simulateSeries() {
 
 // 显示系列赛结果
 function displaySeriesResult(result, logContent) {
+    // 降级到快速模型 / 本地引擎时在结果上方标明
+    if (result.tierReason && TIER_LABELS[result.tier]) {
+        const tierEntry = document.createElement('div');
+        tierEntry.className = 'log-entry tier-notice';
+        tierEntry.textContent = `⚡ 本次结果由${TIER_LABELS[result.tier]}生成（${result.tierReason}），分析深度可能不如推理模型`;
+        logContent.appendChild(tierEntry);
+    }
+    
     // 显示球队分析
     if (result.teamAnalysis) {
         const analysisEntry = document.createElement('div');
@@ -5,6 +5,9 @@
 
 # ⚠️ 必须在最开始进行 eventlet monkey patching
 # 这样才能让所有的阻塞操作（包括API调用）变为非阻塞
+import time
+STARTUP_BEGAN = time.time()
+
 import eventlet
 eventlet.monkey_patch()
 
@@ -12,15 +15,27 @@ import os
 import sys
 import json
 import re
+import copy
 import uuid
-import time
 import random
+import threading
+import atexit
 from datetime import datetime
-from flask import Flask, request, jsonify, Response, send_from_directory
+from collections import OrderedDict, deque
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from openai import OpenAI
 from dotenv import load_dotenv
+from static_assets import StaticAssets
+from simulation import SYSTEM_PROMPT, Simulator, build_simple_series_prompt, matchup_key
+from sim_cache import MatchupCache
+from sim_metrics import SimulationMetrics
+from sim_archive import SimulationArchive
+from local_engine import LocalEngine
+from scheduler import SimulationScheduler, PRIORITY_LIVE, PRIORITY_SPECULATIVE
+from tiering import TierPolicy
+from tournament import Tournament, FORMATS as TOURNAMENT_FORMATS, validate_lineups
+from player_store import PlayerStore, validate_player, validate_team, iter_import_rows, player_key, PLAYER_FIELDS, COUNT_FIELDS
 
 # 确保日志立即输出（禁用缓冲）
 sys.stdout.reconfigure(line_buffering=True) if hasattr(sys.stdout, 'reconfigure') else None
@@ -31,7 +46,9 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 # 加载 .env（不覆盖已有环境变量）
 load_dotenv(os.path.join(SCRIPT_DIR, '.env'), override=False)
 
-app = Flask(__name__, static_folder='.')
+SOCKETIO_DEBUG_LOG = os.environ.get('SOCKETIO_DEBUG_LOG', '').lower() in ('1', 'true', 'yes')
+
+app = Flask(__name__, static_folder=None)
 CORS(app)
 socketio = SocketIO(
     app, 
@@ -39,15 +56,73 @@ socketio = SocketIO(
     async_mode='eventlet',
     ping_timeout=600,  # 10分钟（充足的思考时间）
     ping_interval=25,  # 25秒发送一次服务端心跳
-    logger=True,  # 启用日志以便调试
-    engineio_logger=True,
+    # 详细日志会拖慢冷启动和每条消息的处理，需要调试时设置 SOCKETIO_DEBUG_LOG=1
+    logger=SOCKETIO_DEBUG_LOG,
+    engineio_logger=SOCKETIO_DEBUG_LOG,
     max_http_buffer_size=5e6,  # 5MB缓冲区
     always_connect=False,
     max_connections=100
 )
 
+# 球员数据：启动时解析 players.js 并建立内存索引，文件变化时自动重新加载
+# 写操作先记日志，按防抖延迟/批量阈值原子重写 players.js
+# PLAYERS_STORE=sqlite 时改用 SQLite 作为数据源，players.js 由数据库生成
+PLAYERS_FILE = os.path.join(SCRIPT_DIR, 'players.js')
+PLAYERS_FLUSH_DELAY = float(os.environ.get('PLAYERS_FLUSH_DELAY', '2.0'))
+PLAYERS_FLUSH_BATCH = int(os.environ.get('PLAYERS_FLUSH_BATCH', '100'))
+if os.environ.get('PLAYERS_STORE', 'file').lower() == 'sqlite':
+    from player_db import SqlitePlayerStore
+    player_store = SqlitePlayerStore(
+        os.environ.get('PLAYERS_DB_PATH', os.path.join(SCRIPT_DIR, 'players.db')),
+        PLAYERS_FILE,
+        flush_delay=PLAYERS_FLUSH_DELAY,
+        flush_batch=PLAYERS_FLUSH_BATCH
+    )
+else:
+    player_store = PlayerStore(PLAYERS_FILE, flush_delay=PLAYERS_FLUSH_DELAY, flush_batch=PLAYERS_FLUSH_BATCH)
+player_store.load()
+atexit.register(player_store.flush)
+
 # 房间管理
 rooms = {}  # {room_id: room_state}
+# 连接索引：{sid: (room_id, player_num)}，由创建 / 加入 / 重连 / 离开 / 断开维护，
+# 各事件按当前连接直接定位所在房间和玩家编号，不再遍历房间，也不信任客户端传来的 player_num
+sid_index = {}
+# 每个房间保留最近的对战流事件（带序号），断线重连的客户端只补发缺失的部分
+STREAM_BUFFER_SIZE = int(os.environ.get('STREAM_BUFFER_SIZE', '2000'))
+# 房间过期：后台每 ROOM_SWEEP_INTERVAL 秒清理一次（0 关闭），按阶段分别设置
+# 空闲秒数 ROOM_IDLE_TTL_<阶段>（客户端没有任何事件 / 心跳）和最长存活秒数 ROOM_MAX_AGE_<阶段>，0 表示不限
+ROOM_SWEEP_INTERVAL = float(os.environ.get('ROOM_SWEEP_INTERVAL', '60'))
+ROOM_TTLS = {
+    phase: (float(os.environ.get(f'ROOM_IDLE_TTL_{phase.upper()}', idle)),
+            float(os.environ.get(f'ROOM_MAX_AGE_{phase.upper()}', max_age)))
+    for phase, idle, max_age in [
+        ('waiting', '1800', '7200'),
+        ('selection', '1800', '10800'),
+        ('battle', '1800', '10800'),
+        ('finished', '900', '10800'),
+    ]
+}
+room_stats = {'sweeps': 0, 'expired': {phase: 0 for phase in ROOM_TTLS}}
+# 预先模拟：双方选满 5 人后立即在后台开始模拟（结果只缓冲不推送），收到 start_battle 时直接接上
+SPECULATIVE_BATTLE = os.environ.get('SPECULATIVE_BATTLE', '0').lower() in ('1', 'true', 'yes')
+
+def _diff_state(old, new, path=()):
+    """两个房间状态之间的差异：[{'path': [...], 'value': 新值} 或 {'path': [...], 'delete': True}]
+    字典逐键比较，其他类型（包括列表）整体替换"""
+    if not (isinstance(old, dict) and isinstance(new, dict)):
+        return [] if old == new else [{'path': list(path), 'value': new}]
+    ops = []
+    for key, value in new.items():
+        if key not in old:
+            ops.append({'path': [*path, key], 'value': value})
+        elif old[key] != value:
+            ops.extend(_diff_state(old[key], value, (*path, key)))
+    for key in old:
+        if key not in new:
+            ops.append({'path': [*path, key], 'delete': True})
+    return ops
+
 
 class Room:
     def __init__(self, room_id, creator_sid, creator_name):
@@ -68,15 +143,97 @@ class Room:
             'drawn_players': []
         }
         self.created_at = datetime.now()
+        self.last_active = time.time()  # 最近一次收到房间内客户端的事件或心跳
         self.rematch_requests = set()  # 记录请求再来一局的玩家
+        self.quick_mode = False  # 快速模式：不使用推理模型，几十秒内出结果
+        # 对战流回放缓冲
+        self.battle_id = None
+        self.battle_key = None
+        self.battle_running = False
+        self.battle_speculative = False  # 预先模拟中：事件只缓冲，等 start_battle 接上后才推送
+        self.stream_seq = 0
+        self.stream_buffer = deque(maxlen=STREAM_BUFFER_SIZE)
+        # 状态版本：广播事件只发送相对上一版本的增量，客户端发现版本缺口时请求完整状态
+        self.version = 0
+        self._synced = copy.deepcopy(self._state())
     
-    def to_dict(self):
+    def _state(self):
         return {
-            'room_id': self.room_id,
             'players': self.players,
-            'game_state': self.game_state
+            'game_state': self.game_state,
+            'quick_mode': self.quick_mode
         }
     
+    def to_dict(self):
+        return dict(self._state(), room_id=self.room_id, version=self.version)
+    
+    def patch(self):
+        """把上一版本以来的变化记为新版本，返回 {'version': 新版本, 'base': 上一版本, 'ops': 差异}"""
+        state = self._state()
+        ops = _diff_state(self._synced, state)
+        base = self.version
+        if ops:
+            self.version += 1
+            self._synced = copy.deepcopy(state)
+        return {'version': self.version, 'base': base, 'ops': ops}
+    
+    def touch(self):
+        self.last_active = time.time()
+
+    def lifecycle_phase(self):
+        """用于过期判断的阶段：对战模拟已结束的房间算作 finished"""
+        phase = self.game_state['phase']
+        if phase == 'battle' and self.battle_id is not None and not self.battle_running:
+            return 'finished'
+        return phase
+
+    def expiry_reason(self, now):
+        """房间应当过期时返回原因，否则返回 None"""
+        phase = self.lifecycle_phase()
+        idle_ttl, max_age = ROOM_TTLS.get(phase, (0, 0))
+        idle = now - self.last_active
+        age = now - self.created_at.timestamp()
+        if idle_ttl and idle >= idle_ttl:
+            return f'{phase} 阶段空闲 {idle:.0f} 秒'
+        if max_age and age >= max_age:
+            return f'{phase} 阶段已存在 {age:.0f} 秒'
+        return None
+
+    def begin_battle(self, key=None, speculative=False):
+        """开始新一场对战，清空上一场的流缓冲"""
+        self.battle_id = uuid.uuid4().hex[:8]
+        self.battle_key = key
+        self.battle_running = True
+        self.battle_speculative = speculative
+        self.stream_seq = 0
+        # 预先模拟在接上之前不能丢事件，缓冲不设上限（只保存一场对战）
+        self.stream_buffer = deque(maxlen=None if speculative else STREAM_BUFFER_SIZE)
+        return self.battle_id
+
+    def discard_battle(self, reason='对战已放弃'):
+        """放弃当前对战（重新开始 / 阵容变化 / 房间删除）：取消上游模拟，后台模拟看到 battle_id 变化后停止推送"""
+        if self.battle_running and self.battle_key is not None:
+            simulator.cancel(f'room:{self.room_id}', reason, key=self.battle_key[0])
+        self.battle_id = None
+        self.battle_key = None
+        self.battle_running = False
+        self.battle_speculative = False
+        self.stream_seq = 0
+        self.stream_buffer = deque(maxlen=STREAM_BUFFER_SIZE)
+
+    def buffer_stream_event(self, event):
+        """给对战流事件编号并放入缓冲，返回带 seq / battleId 的事件"""
+        self.stream_seq += 1
+        event = dict(event, seq=self.stream_seq, battleId=self.battle_id)
+        self.stream_buffer.append(event)
+        return event
+
+    def stream_events_since(self, last_seq):
+        """返回 (序号大于 last_seq 的缓冲事件, 已被挤出缓冲无法补发的事件数)"""
+        events = [e for e in self.stream_buffer if e['seq'] > last_seq]
+        first = events[0]['seq'] if events else self.stream_seq + 1
+        return events, max(0, first - last_seq - 1)
+
     def reset_game_state(self):
         """重置游戏状态，用于再来一局"""
         self.game_state = {
@@ -94,6 +251,7 @@ class Room:
             'drawn_players': []
         }
         self.rematch_requests.clear()
+        self.discard_battle('房间重新开始')
         # 重置玩家准备状态
         for player_num in self.players:
             if self.players[player_num]:
@@ -101,26 +259,222 @@ class Room:
 
 # DeepSeek API 配置（不要在代码中硬编码密钥）
 DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')
-DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+# 压测 / 离线开发时可指向本地替身：DEEPSEEK_BASE_URL=http://127.0.0.1:8801（见 llm_stub.py）
+DEEPSEEK_BASE_URL = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
 
-# 初始化 OpenAI 客户端
+# OpenAI 客户端延迟到第一次模拟时才创建（openai/httpx 导入较慢，会拖慢冷启动）
 # 注意：在 eventlet 环境下，不使用自定义 http_client
 # OpenAI SDK 会自动使用 httpx，eventlet 的 monkey patch 会处理好
-client = OpenAI(
-    api_key=DEEPSEEK_API_KEY,
-    base_url=DEEPSEEK_BASE_URL,
-    timeout=300.0,
-    max_retries=3  # 自动重试3次
+_client = None
+_client_lock = threading.Lock()
+
+# 启动状态：ready 表示可以接收请求，llm_ready 表示 OpenAI 客户端已创建
+startup_state = {'ready': False, 'llm_ready': False, 'ready_at': None, 'startup_seconds': None}
+
+
+def get_client():
+    """返回 OpenAI 客户端，首次调用时才导入 openai 并创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                started = time.time()
+                from openai import OpenAI
+                _client = OpenAI(
+                    api_key=DEEPSEEK_API_KEY,
+                    base_url=DEEPSEEK_BASE_URL,
+                    timeout=300.0,
+                    max_retries=3  # 自动重试3次
+                )
+                startup_state['llm_ready'] = True
+                print(f"[启动] OpenAI 客户端已创建，耗时 {(time.time() - started) * 1000:.0f}ms", flush=True)
+    return _client
+
+
+def mark_ready():
+    """启动完成，开始接收请求"""
+    startup_state['ready'] = True
+    startup_state['ready_at'] = time.time()
+    startup_state['startup_seconds'] = round(startup_state['ready_at'] - STARTUP_BEGAN, 3)
+    print(f"[启动] 服务就绪，启动耗时 {startup_state['startup_seconds']}s", flush=True)
+
+
+def _bind_sid(sid, room_id, player_num):
+    sid_index[sid] = (room_id, player_num)
+
+
+def _room_member(room_id):
+    """当前连接在 room_id 房间中的 (房间, 玩家编号)，不在该房间中时返回 (None, None)"""
+    entry = sid_index.get(request.sid)
+    if entry is None or entry[0] != room_id or room_id not in rooms:
+        return None, None
+    room = rooms[room_id]
+    room.touch()
+    return room, entry[1]
+
+
+def _delete_room(room, reason):
+    """删除房间：取消进行中的模拟，移除房间内玩家的连接索引"""
+    room.discard_battle('房间已删除')
+    for info in room.players.values():
+        if info and sid_index.get(info['sid'], (None,))[0] == room.room_id:
+            del sid_index[info['sid']]
+    rooms.pop(room.room_id, None)
+    print(f"[房间] 房间 {room.room_id} 已删除（{reason}）", flush=True)
+
+
+def sweep_rooms(now=None):
+    """删除过期房间：通知仍在房间里的连接，取消进行中的模拟，释放房间数据。返回删除的房间数"""
+    now = time.time() if now is None else now
+    expired = 0
+    for room in list(rooms.values()):
+        reason = room.expiry_reason(now)
+        if reason is None:
+            continue
+        phase = room.lifecycle_phase()
+        socketio.emit('room_expired', {'room_id': room.room_id, 'message': '房间长时间无人操作，已自动关闭'},
+                      room=room.room_id)
+        _delete_room(room, f'过期：{reason}')
+        socketio.close_room(room.room_id)
+        room_stats['expired'][phase] = room_stats['expired'].get(phase, 0) + 1
+        expired += 1
+    room_stats['sweeps'] += 1
+    return expired
+
+
+def _room_sweeper():
+    """后台定期清理过期房间"""
+    while True:
+        eventlet.sleep(ROOM_SWEEP_INTERVAL)
+        try:
+            expired = sweep_rooms()
+            if expired:
+                print(f"[房间] 清理了 {expired} 个过期房间，剩余 {len(rooms)} 个", flush=True)
+        except Exception as e:
+            import traceback
+            print(f"[房间] 清理过期房间失败: {e}", flush=True)
+            traceback.print_exc()
+
+
+def _warm_up():
+    """服务开始监听后在后台预热重量级依赖，不阻塞第一个连接"""
+    try:
+        get_client()
+    except Exception as e:
+        print(f"[启动] 预热 OpenAI 客户端失败: {e}", flush=True)
+
+
+# 系列赛模拟：相同对阵（球员ID+赛季+提示词模板）的结果缓存后直接回放
+matchup_cache = MatchupCache(
+    max_entries=int(os.environ.get('SIM_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('SIM_CACHE_TTL', '86400')),
+    directory=os.environ.get('SIM_CACHE_DIR') or None
+)
+# 本地蒙特卡洛引擎：即时模式（mode=local）、API 失败时的兜底，以及 AI 结果的先验参考
+local_engine = LocalEngine(
+    simulations=int(os.environ.get('LOCAL_SIM_RUNS', '10000')),
+    player_lookup=lambda player_id: player_store.get().by_id.get(player_id)
+)
+# 调度器：限制同时进行的上游流（SIM_MAX_CONCURRENT），在线房间优先于批量赛事，
+# 排队超过 SIM_DEADLINE 秒后放弃上游，改用本地引擎兜底（开始输出后不受此限制，停滞由上游看门狗处理）
+SIM_DEADLINE = float(os.environ.get('SIM_DEADLINE', '600'))
+simulation_scheduler = SimulationScheduler(
+    max_concurrent=int(os.environ.get('SIM_MAX_CONCURRENT', '4')),
+    default_deadline=SIM_DEADLINE
+)
+# 分级（默认关闭）：设置 SIM_TIER_MAX_WAIT 后，推理模型预计排队超过该秒数（或设置 SIM_TIER_MAX_LATENCY 后最近平均耗时超过该秒数）时，
+# 新的在线模拟改用快速模型 SIM_FAST_MODEL（独立名额 SIM_FAST_MAX_CONCURRENT），快速模型也排满时用本地引擎；
+# 房间快速模式不受此限制；SIM_FAST_MODEL 设为空时只降级到本地引擎
+SIM_FAST_MODEL = os.environ.get('SIM_FAST_MODEL', 'deepseek-chat')
+tier_policy = TierPolicy(max_wait=float(os.environ.get('SIM_TIER_MAX_WAIT', '0')),
+                         max_latency=float(os.environ.get('SIM_TIER_MAX_LATENCY', '0')))
+fast_scheduler = None
+if SIM_FAST_MODEL:
+    fast_scheduler = SimulationScheduler(
+        max_concurrent=int(os.environ.get('SIM_FAST_MAX_CONCURRENT', '8')),
+        default_deadline=SIM_DEADLINE,
+        initial_estimate=float(os.environ.get('SIM_FAST_ESTIMATE', '20'))
+    )
+# 每次模拟的 token 用量和延迟，按房间 / 来源查询或汇总
+simulation_metrics = SimulationMetrics(max_records=int(os.environ.get('SIM_METRICS_SIZE', '1000')))
+# 归档：每次完成的模拟（阵容、房间、耗时、结果和思考文本）由后台线程写入 SQLite，SIM_ARCHIVE=0 关闭
+simulation_archive = None
+if os.environ.get('SIM_ARCHIVE', '1') != '0':
+    simulation_archive = SimulationArchive(os.environ.get('SIM_ARCHIVE_PATH', os.path.join(SCRIPT_DIR, 'simulations.db')))
+    atexit.register(simulation_archive.close)
+# 上游看门狗：首 token 超过 SIM_HEDGE_AFTER 秒发起对冲请求（最多 SIM_MAX_HEDGES 个），
+# 对冲用完后首 token 或输出中途的 chunk 间隔超过 SIM_STALL_TIMEOUT 秒放弃上游、改用本地引擎兜底；设为 0 关闭
+simulator = Simulator(get_client, cache=matchup_cache, local_engine=local_engine,
+                      scheduler=simulation_scheduler, metrics=simulation_metrics, archive=simulation_archive,
+                      hedge_after=float(os.environ.get('SIM_HEDGE_AFTER', '20')),
+                      max_hedges=int(os.environ.get('SIM_MAX_HEDGES', '1')),
+                      stall_timeout=float(os.environ.get('SIM_STALL_TIMEOUT', '60')),
+                      fast_model=SIM_FAST_MODEL or None, fast_scheduler=fast_scheduler, tier_policy=tier_policy)
+
+# 流式投递：思考 / 输出片段按大小或时间窗口合并后再发送，每种传输方式单独配置
+# （设为 0 表示逐片段发送）
+SSE_DELIVERY = (
+    int(os.environ.get('SSE_FLUSH_CHARS', '2048')),
+    float(os.environ.get('SSE_FLUSH_MS', '50')) / 1000
 )
+SOCKET_DELIVERY = (
+    int(os.environ.get('SOCKET_FLUSH_CHARS', '2048')),
+    float(os.environ.get('SOCKET_FLUSH_MS', '50')) / 1000
+)
+
+
+# 静态文件服务：预压缩 + 指纹 URL，只开放白名单内的前端资源
+static_assets = StaticAssets(SCRIPT_DIR)
+static_assets.refresh()
+player_store.on_flush = static_assets.refresh
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def negotiated_response(variants, etag, mimetype, cache_control='no-cache'):
+    """按 Accept-Encoding 选择预压缩版本，支持 ETag/If-None-Match"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        response = Response(variants[encoding], content_type=mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def serve_asset(asset, cache_control='no-cache'):
+    if asset is None:
+        return jsonify({'success': False, 'error': 'Not Found'}), 404
+    return negotiated_response(asset.variants, asset.hash, asset.content_type, cache_control)
+
 
-# 静态文件服务
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    # 保存球员后前端会立即刷新页面，先把日志中的修改落盘，保证指纹指向最新的 players.js
+    player_store.flush()
+    return serve_asset(static_assets.get('index.html'))
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_assets(filename):
+    if filename.startswith('players.'):
+        player_store.flush()
+    asset, current = static_assets.get_fingerprinted(filename)
+    # 旧指纹（页面缓存过期）返回最新内容，但不允许长缓存
+    return serve_asset(asset, IMMUTABLE_CACHE_CONTROL if current else 'no-cache')
 
 @app.route('/<path:filename>')
 def static_files(filename):
-    return send_from_directory('.', filename)
+    if filename == 'players.js':
+        player_store.flush()
+    return serve_asset(static_assets.get(filename))
 
 # 模拟整个系列赛（简化版 - 直接输出结果和统计）
 @app.route('/api/simulate-series', methods=['POST'])
@@ -128,111 +482,29 @@ def simulate_series():
     """模拟整个BO7系列赛 - 简化版，直接输出结果"""
     try:
         data = request.json
-        team1 = data.get('team1', {})
-        team2 = data.get('team2', {})
+        team1, error = validate_team(data.get('team1', {}))
+        if error is None:
+            team2, error = validate_team(data.get('team2', {}))
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
         player_names = data.get('playerNames', {'1': 'A组', '2': 'B组'})
+        mode = data.get('mode', 'ai')  # ai = DeepSeek 模拟，local = 本地即时模拟
+        quick = bool(data.get('quick'))  # 快速模式：不使用推理模型
+        owner = f'http:{request.remote_addr}'
         
         # 构建简化版系列赛提示词
         prompt = build_simple_series_prompt(team1, team2, player_names)
         
-        # 系统提示词
-        system_prompt = """你是一位顶级NBA战术分析师和数据专家，拥有深厚的篮球战术理解和历史知识。你需要模拟NBA总决赛BO7系列赛。
-
-【⚠️ 核心规则 - 严格按赛季状态模拟】
-球员名称格式为"XX赛季的XX球员"，必须严格按照该赛季该球队的真实状态模拟！
-
-🔴 **同一球员不同赛季差异巨大，必须区分：**
-- 火箭大梦(1994) vs 猛龙大梦(2001)：巅峰统治力 vs 职业末期角色球员
-- 热火詹姆斯(2013) vs 湖人詹姆斯(2023)：巅峰身体素质 vs 老年智慧型打法
-- 公牛乔丹(1996) vs 奇才乔丹(2002)：历史最佳 vs 退役复出
-- 湖人科比(2006) vs 湖人科比(2015)：得分王 vs 跟腱断裂后
-- 马刺邓肯(2003) vs 马刺邓肯(2015)：攻防一体 vs 防守蓝领
-
-📊 **模拟时必须考虑该赛季的：**
-- 球员年龄和身体状态（爆发力、速度、耐久性）
-- 在球队的角色定位（核心/二当家/角色球员）
-- 该赛季的真实数据表现（得分、效率、出场时间）
-- 伤病影响（大伤后的球员能力会明显下降）
-- 球队体系中的战术地位
-
-【🏀 球队战术体系分析维度】
-你必须从以下维度深入分析双方球队，并据此模拟比赛：
-
-1. **空间与投射**
-   - 场上球员的三分/中投威胁如何？能否拉开空间？
-   - 是否有多个投射点？还是空间拥挤？
-   - 内线球员是否有投射能力？会不会堵塞禁区？
-
-2. **组织与传球**
-   - 谁是主要组织者？组织能力如何？
-   - 传球视野和失误控制
-   - 是否有多个持球点？还是过度依赖单一组织者？
-
-3. **进攻火力**
-   - 得分手段是否多样？（突破、中投、三分、背身）
-   - 进攻效率和终结能力
-   - 关键时刻的得分能力（clutch能力）
-
-4. **防守体系**
-   - 个人防守能力：护框、外线防守、协防意识
-   - 是否有防守漏洞？错位会被针对吗？
-   - 篮板球控制能力
-
-5. **球权分配与化学反应**
-   - 核心球员是谁？球权如何分配？
-   - 多个球星是否能共存？会不会球权冲突？
-   - 球员打法是否兼容？是否互补？
-
-6. **球星成色与赛季状态**
-   - 该赛季球员处于什么阶段？（巅峰/上升期/下滑期/末期）
-   - 球员的历史地位和荣誉
-   - 季后赛/总决赛大赛经验
-   - 领袖气质和关键球能力
-   - ⚠️ 注意：同一球员不同赛季实力可能天差地别！
-
-【🎯 模拟原则】
-1. 阵容搭配合理的球队有优势（空间+组织+防守平衡）
-2. 球星扎堆但不兼容的阵容会有问题（球权冲突、空间拥挤）
-3. 有明显防守漏洞的球队会被针对
-4. 系列赛要有起伏，体现真实的竞技对抗
-5. 考虑主场优势（1、2、5、7场为team1主场）
-
-【🏆 FMVP评选标准】
-- 必须来自冠军球队
-- 综合考虑：场均数据、关键比赛表现、对胜利的贡献度
-- 不一定是数据最好的球员，而是对夺冠贡献最大的球员
-
-【重要】你必须严格按照JSON格式返回结果。"""
-        
         def generate():
             try:
                 # 首先发送完整的提示词
-                yield f"data: {json.dumps({'type': 'prompt', 'systemPrompt': system_prompt, 'userPrompt': prompt}, ensure_ascii=False)}\n\n"
+                if mode != 'local':
+                    yield f"data: {json.dumps({'type': 'prompt', 'systemPrompt': SYSTEM_PROMPT, 'userPrompt': prompt}, ensure_ascii=False)}\n\n"
                 
-                response = client.chat.completions.create(
-                    model="deepseek-reasoner",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt}
-                    ],
-                    stream=True
-                )
-                
-                reasoning_content = ""
-                final_content = ""
+                for event in simulator.stream(team1, team2, player_names, mode=mode, priority=PRIORITY_LIVE, owner=owner,
+                                              delivery=SSE_DELIVERY, quick=quick):
+                    yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
                 
-                for chunk in response:
-                    delta = chunk.choices[0].delta
-                    if delta.reasoning_content:
-                        reasoning_content += delta.reasoning_content
-                        yield f"data: {json.dumps({'type': 'reasoning', 'content': delta.reasoning_content}, ensure_ascii=False)}\n\n"
-                    elif delta.content:
-                        final_content += delta.content
-                        yield f"data: {json.dumps({'type': 'content', 'content': delta.content}, ensure_ascii=False)}\n\n"
-                
-                # 发送最终结果
-                result = extract_json(final_content)
-                yield f"data: {json.dumps({'type': 'result', 'data': result}, ensure_ascii=False)}\n\n"
                 yield "data: [DONE]\n\n"
                 
             except Exception as e:
@@ -249,319 +521,362 @@ def simulate_series():
         }), 500
 
 
-def build_simple_series_prompt(team1, team2, player_names):
-    """构建简化版系列赛的提示词 - 只要结果和统计"""
-    p1_name = player_names.get('1', 'A组')
-    p2_name = player_names.get('2', 'B组')
-    
-    team1_desc = format_team(team1, p1_name)
-    team2_desc = format_team(team2, p2_name)
-    team1_players = format_player_list(team1)
-    team2_players = format_player_list(team2)
-    
-    return f"""请模拟以下两支球队的NBA总决赛BO7系列赛：
-
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-【{p1_name}阵容】
-{team1_desc}
-
-【{p2_name}阵容】
-{team2_desc}
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-
-【比赛规则】
-- 10名球员全部打满48分钟，无换人
-- 第1、2、5、7场为{p1_name}主场，第3、4、6场为{p2_name}主场
-- 系列赛先赢4场者夺冠
-
-【输出格式 - 严格按JSON返回】
-{{
-    "teamAnalysis": {{
-        "team1": {{
-            "spacing": "空间评价(优秀/良好/一般/较差)",
-            "playmaking": "组织评价", 
-            "offense": "进攻评价",
-            "defense": "防守评价",
-            "chemistry": "化学反应评价",
-            "starPower": "球星成色评价",
-            "strengths": "主要优势",
-            "weaknesses": "主要弱点"
-        }},
-        "team2": {{同上}},
-        "keyMatchups": "关键对位分析",
-        "prediction": "赛前预测和理由"
-    }},
-    "champion": 1或2,
-    "finalScore": {{"team1Wins": 胜场数, "team2Wins": 胜场数}},
-    "games": [
-        {{
-            "gameNumber": 场次,
-            "winner": 1或2,
-            "score": {{"team1": 得分, "team2": 得分}},
-            "keyFactor": "本场胜负关键因素"
-        }}
-    ],
-    "fmvp": {{
-        "name": "总决赛MVP球员名",
-        "team": 1或2,
-        "avgStats": {{"points": 场均得分, "rebounds": 场均篮板, "assists": 场均助攻}},
-        "reason": "获选理由(50字内)"
-    }},
-    "summary": "系列赛总结(100字左右)"
-}}
-
-【{p1_name}球员】：{team1_players}
-【{p2_name}球员】：{team2_players}"""
-
-
-def format_team(team, team_name):
-    """格式化球队阵容描述 - 简洁格式，让AI客观判断球员实力"""
-    positions = {
-        'PG': '控球后卫',
-        'SG': '得分后卫', 
-        'SF': '小前锋',
-        'PF': '大前锋',
-        'C': '中锋'
+# 健康检查
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    return jsonify({"status": "ok", "message": "NBA模拟对战服务运行中"})
+
+
+# 就绪检查：与健康检查分开，启动完成前返回 503
+@app.route('/api/ready', methods=['GET'])
+def ready_check():
+    body = {
+        'ready': startup_state['ready'],
+        'llmReady': startup_state['llm_ready'],
+        'startupSeconds': startup_state['startup_seconds']
     }
-    
-    lines = []
-    
-    for pos, pos_name in positions.items():
-        player = team.get(pos)
-        if player:
-            peak_season = player.get('peakSeason', '未知')
-            # 只提供球员名字和赛季，让AI根据历史知识客观判断
-            lines.append(f"- {pos_name}: {peak_season}赛季的{player['name']} ({player['nameEn']})")
-    
-    return "\n".join(lines)
+    return jsonify(body), (200 if startup_state['ready'] else 503)
+
+
+# 调度器状态：正在进行 / 排队中的上游流
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_stats():
+    stats = simulation_scheduler.stats()
+    stats['inflight'] = simulator.inflight_count()
+    stats['coalesced'] = simulator.coalesced
+    stats['cancelled'] = simulator.cancelled
+    stats['cache'] = matchup_cache.stats()
+    stats['fastScheduler'] = fast_scheduler.stats() if fast_scheduler is not None else None
+    stats['tiering'] = tier_policy.stats()
+    return jsonify({'success': True, 'scheduler': stats})
+
+
+# 房间统计：在线房间（按阶段）、连接数和已过期清理的房间数
+@app.route('/api/rooms', methods=['GET'])
+def room_stats_view():
+    phases = {}
+    for room in list(rooms.values()):
+        phase = room.lifecycle_phase()
+        phases[phase] = phases.get(phase, 0) + 1
+    return jsonify({
+        'success': True,
+        'rooms': {
+            'live': len(rooms),
+            'byPhase': phases,
+            'connections': len(sid_index),
+            'expired': sum(room_stats['expired'].values()),
+            'expiredByPhase': dict(room_stats['expired']),
+            'sweeps': room_stats['sweeps'],
+            'sweepInterval': ROOM_SWEEP_INTERVAL,
+            'ttls': {phase: {'idle': idle, 'maxAge': max_age} for phase, (idle, max_age) in ROOM_TTLS.items()}
+        }
+    })
 
 
-def format_player_list(team):
-    """格式化球员列表 - 简洁格式"""
-    positions = ['PG', 'SG', 'SF', 'PF', 'C']
-    players = []
-    for pos in positions:
-        player = team.get(pos)
-        if player:
-            peak = player.get('peakSeason', '未知')
-            players.append(f"{peak}赛季的{player['name']}")
-    return "、".join(players)
+# 模拟耗费统计：?room=<房间号> 或 ?owner=<来源> 只看某个房间 / 来源，否则汇总全部
+@app.route('/api/metrics', methods=['GET'])
+def simulation_metrics_view():
+    owner = request.args.get('owner')
+    if request.args.get('room'):
+        owner = f"room:{request.args['room']}"
+    limit = min(request.args.get('limit', 50, type=int), 1000)
+    return jsonify({
+        'success': True,
+        'owner': owner,
+        'summary': simulation_metrics.summary(owner),
+        'records': simulation_metrics.records(owner, limit)
+    })
 
 
-def extract_json(text):
-    """从文本中提取JSON"""
-    import re
-    
-    # 尝试直接解析
+# ========================================
+# 模拟归档查询 API
+# ========================================
+
+def _archive_unavailable():
+    return jsonify({'success': False, 'error': '模拟归档未启用'}), 404
+
+
+@app.route('/api/archive/simulations', methods=['GET'])
+def archive_simulations():
+    """分页查询历史模拟：?player=<球员ID>&team=<球队代码>&room=<房间号>&from=YYYY-MM-DD&to=YYYY-MM-DD"""
+    if simulation_archive is None:
+        return _archive_unavailable()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
     try:
-        return json.loads(text)
-    except:
-        pass
-    
-    # 尝试提取JSON块
-    json_patterns = [
-        r'```json\s*([\s\S]*?)\s*```',
-        r'```\s*([\s\S]*?)\s*```',
-        r'\{[\s\S]*\}'
-    ]
-    
-    for pattern in json_patterns:
-        matches = re.findall(pattern, text)
-        for match in matches:
-            try:
-                return json.loads(match)
-            except:
-                continue
-    
-    # 返回默认结果（系列赛格式）
-    print("[extract_json] WARNING: 使用默认结果", flush=True)
-    return {
-        "teamAnalysis": {
-            "team1": {"spacing": "未知", "playmaking": "未知", "offense": "未知", "defense": "未知", "chemistry": "未知", "starPower": "未知", "strengths": "未知", "weaknesses": "未知"},
-            "team2": {"spacing": "未知", "playmaking": "未知", "offense": "未知", "defense": "未知", "chemistry": "未知", "starPower": "未知", "strengths": "未知", "weaknesses": "未知"},
-            "keyMatchups": "未知",
-            "prediction": "未知"
-        },
-        "champion": 1,
-        "finalScore": {"team1Wins": 4, "team2Wins": 0},
-        "games": [],
-        "fmvp": {"name": "未知MVP", "team": 1, "avgStats": {"points": 0, "rebounds": 0, "assists": 0}, "reason": "AI未能生成详细结果"},
-        "summary": "AI未能生成详细结果，使用默认数据"
-    }
+        total, items = simulation_archive.query(
+            player_id=request.args.get('player', type=int),
+            team=request.args.get('team'),
+            owner=f"room:{request.args['room']}" if request.args.get('room') else None,
+            since=request.args.get('from'),
+            until=request.args.get('to'),
+            offset=offset,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'日期格式应为 YYYY-MM-DD: {e}'}), 400
+    return jsonify({'success': True, 'total': total, 'offset': offset, 'limit': limit, 'simulations': items})
 
 
-# 健康检查
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({"status": "ok", "message": "NBA模拟对战服务运行中"})
+@app.route('/api/archive/simulations/<int:sim_id>', methods=['GET'])
+def archive_simulation(sim_id):
+    """单条历史模拟的完整结果，?reasoning=1 时附带思考文本"""
+    if simulation_archive is None:
+        return _archive_unavailable()
+    item = simulation_archive.get(sim_id, include_reasoning=request.args.get('reasoning') == '1')
+    if item is None:
+        return jsonify({'success': False, 'error': '记录不存在'}), 404
+    return jsonify({'success': True, 'simulation': item})
+
+
+@app.route('/api/archive/leaderboard', methods=['GET'])
+def archive_leaderboard():
+    if simulation_archive is None:
+        return _archive_unavailable()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify({'success': True, 'players': simulation_archive.leaderboard(limit), 'archive': simulation_archive.stats()})
+
+
+# ========================================
+# 批量赛事 API
+# ========================================
+
+TOURNAMENT_WORKERS = int(os.environ.get('TOURNAMENT_WORKERS', '4'))
+MAX_TOURNAMENTS = 50
+tournaments = OrderedDict()  # {tournament_id: Tournament}，只保留最近 MAX_TOURNAMENTS 个
+
+
+def tournament_event_stream(tournament):
+    try:
+        for event in tournament.events():
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        yield f"data: {json.dumps({'type': 'error', 'error': str(e)}, ensure_ascii=False)}\n\n"
+
+
+@app.route('/api/tournaments', methods=['POST'])
+def create_tournament():
+    """提交 N 套阵容和赛制，批量模拟所有对阵
+
+    默认以 SSE 推送每场进度和积分榜；stream=false 时立即返回赛事 ID，
+    之后通过 GET /api/tournaments/<id> 查询积分榜。
+    """
+    data = request.get_json(silent=True) or {}
+    fmt = data.get('format', 'round-robin')
+    if fmt not in TOURNAMENT_FORMATS:
+        return jsonify({'success': False, 'error': f"format 必须是 {', '.join(TOURNAMENT_FORMATS)} 之一"}), 400
+    lineups, error = validate_lineups(data.get('lineups'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    mode = data.get('mode', 'ai')
+    series = data.get('bestOf', 3)
+    if fmt == 'best-of':
+        if len(lineups) != 2:
+            return jsonify({'success': False, 'error': 'best-of 赛制只支持 2 套阵容'}), 400
+        if not isinstance(series, int) or series < 1 or series > 15 or series % 2 == 0:
+            return jsonify({'success': False, 'error': 'bestOf 必须是 1-15 之间的奇数'}), 400
+    workers = data.get('workers', TOURNAMENT_WORKERS)
+    if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+        return jsonify({'success': False, 'error': 'workers 必须是正整数'}), 400
+    workers = min(workers, TOURNAMENT_WORKERS)
+
+    tournament = Tournament(lineups, fmt, simulator, mode=mode, series=series, workers=workers).start()
+    tournaments[tournament.id] = tournament
+    while len(tournaments) > MAX_TOURNAMENTS:
+        tournaments.popitem(last=False)
+    print(f"[赛事] 创建 {tournament.id}: {fmt}，{len(lineups)} 套阵容，{workers} 个并发", flush=True)
+
+    if data.get('stream', True):
+        return Response(tournament_event_stream(tournament), mimetype='text/event-stream')
+    return jsonify({'success': True, 'tournament': tournament.to_dict()}), 202
+
+
+@app.route('/api/tournaments/<tournament_id>', methods=['GET'])
+def get_tournament(tournament_id):
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return jsonify({'success': False, 'error': '赛事不存在'}), 404
+    return jsonify({'success': True, 'tournament': tournament.to_dict()})
+
+
+@app.route('/api/tournaments/<tournament_id>/events', methods=['GET'])
+def tournament_events(tournament_id):
+    """订阅赛事进度（中途订阅会先回放已发生的事件）"""
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return jsonify({'success': False, 'error': '赛事不存在'}), 404
+    return Response(tournament_event_stream(tournament), mimetype='text/event-stream')
 
 
 # ========================================
 # 球员管理 API
 # ========================================
 
+def cached_json_response(body, gzip_body, etag):
+    """返回预序列化的 JSON，支持 ETag/If-None-Match 和 gzip"""
+    return negotiated_response({'identity': body, 'gzip': gzip_body}, etag, 'application/json')
+
+
 @app.route('/api/players', methods=['GET', 'POST'])
 def manage_players():
     """获取所有球员或添加新球员"""
     if request.method == 'GET':
-        # 前端直接使用已加载的 PLAYERS 数据，这个接口仅用于备用
-        return jsonify({'success': True, 'message': '请使用前端已加载的 PLAYERS 数据'})
+        # 直接从内存索引返回，支持 ?team=CHI / ?nameEn=Michael Jordan 过滤
+        index = player_store.get()
+        team = request.args.get('team')
+        name_en = request.args.get('nameEn')
+        if team:
+            key = ('team', team)
+            build = lambda: {'success': True, 'version': index.version, 'players': index.by_team.get(team, [])}
+        elif name_en:
+            key = ('nameEn', name_en)
+            build = lambda: {'success': True, 'version': index.version, 'players': index.by_name_en.get(name_en, [])}
+        else:
+            key = ('all',)
+            build = lambda: {
+                'success': True,
+                'version': index.version,
+                'players': index.players,
+                'teams': index.teams,
+                'allStarRosterIndex': index.all_star_index
+            }
+        return cached_json_response(*index.payload(key, build))
     
     elif request.method == 'POST':
-        # 添加新球员
+        # 添加新球员：写日志 + 更新内存，players.js 稍后批量原子重写
         try:
-            data = request.json
-            required_fields = ['name', 'nameEn', 'cost', 'positions', 'team', 'peakSeason', 'championships', 'allStar', 'mvp', 'fmvp']
-            
-            # 验证必填字段
-            for field in required_fields:
-                if field not in data:
-                    return jsonify({'success': False, 'error': f'缺少必填字段: {field}'})
+            index = player_store.get()
+            player, error = validate_player(request.json, {t['id'] for t in index.teams})
+            if error:
+                return jsonify({'success': False, 'error': error})
             
-            # 读取现有文件
-            players_file = os.path.join(SCRIPT_DIR, 'players.js')
-            with open(players_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 找到最大ID
-            id_pattern = r'id:\s*(\d+)'
-            existing_ids = [int(m) for m in re.findall(id_pattern, content)]
-            new_id = max(existing_ids) + 1 if existing_ids else 1
-            
-            # 构造新球员数据
-            positions_str = json.dumps(data['positions'])
-            new_player = f'''    {{ id: {new_id}, name: "{data['name']}", nameEn: "{data['nameEn']}", cost: {data['cost']}, positions: {positions_str}, team: "{data['team']}", peakSeason: "{data['peakSeason']}", championships: {data['championships']}, allStar: {data['allStar']}, mvp: {data['mvp']}, fmvp: {data['fmvp']} }},'''
-            
-            # 找到对应球队的位置并插入
-            team_markers = {
-                "CHI": "// ===== 芝加哥公牛 CHI",
-                "LAL": "// ===== 洛杉矶湖人 LAL",
-                "BOS": "// ===== 波士顿凯尔特人 BOS",
-                "OKC": "// ===== 俄克拉荷马雷霆 OKC",
-                "GSW": "// ===== 金州勇士 GSW",
-                "HOU": "// ===== 休斯顿火箭 HOU",
-                "DAL": "// ===== 达拉斯独行侠 DAL",
-                "SAS": "// ===== 圣安东尼奥马刺 SAS",
-                "DEN": "// ===== 丹佛掘金 DEN",
-                "PHI": "// ===== 费城76人 PHI",
-                "MIL": "// ===== 密尔沃基雄鹿 MIL",
-                "MIA": "// ===== 迈阿密热火 MIA",
-                "CLE": "// ===== 克利夫兰骑士 CLE",
-                "PHX": "// ===== 菲尼克斯太阳 PHX",
-                "IND": "// ===== 印第安纳步行者 IND",
-                "MIN": "// ===== 明尼苏达森林狼 MIN",
-                "NYK": "// ===== 纽约尼克斯 NYK",
-                "DET": "// ===== 底特律活塞 DET",
-                "POR": "// ===== 波特兰开拓者 POR",
-                "UTA": "// ===== 犹他爵士 UTA",
-                "TOR": "// ===== 多伦多猛龙 TOR",
-                "ATL": "// ===== 亚特兰大老鹰 ATL",
-                "ORL": "// ===== 奥兰多魔术 ORL",
-                "NOP": "// ===== 新奥尔良鹈鹕 NOP",
-                "LAC": "// ===== 洛杉矶快船 LAC",
-                "SAC": "// ===== 萨克拉门托国王 SAC",
-                "WAS": "// ===== 华盛顿奇才 WAS",
-                "MEM": "// ===== 孟菲斯灰熊 MEM",
-                "CHA": "// ===== 夏洛特黄蜂 CHA",
-                "BKN": "// ===== 布鲁克林篮网 BKN",
-            }
-            
-            team = data['team']
-            team_marker = team_markers.get(team)
-            if not team_marker:
-                return jsonify({'success': False, 'error': f'未知球队代码: {team}'})
-            
-            # 找到球队位置
-            start = content.find(team_marker)
-            if start == -1:
-                return jsonify({'success': False, 'error': f'找不到球队标记: {team}'})
-            
-            # 找下一个球队标记
-            next_team_pos = len(content)
-            for other_team, marker in team_markers.items():
-                if other_team != team:
-                    pos = content.find(marker, start + 1)
-                    if pos != -1 and pos < next_team_pos:
-                        next_team_pos = pos
-            
-            # 在该球队最后一个球员后插入
-            section = content[start:next_team_pos]
-            last_player_end = section.rfind('},')
-            if last_player_end != -1:
-                insert_pos = start + last_player_end + 2
-                content = content[:insert_pos] + '\n' + new_player + content[insert_pos:]
-                
-                # 写入文件
-                with open(players_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                return jsonify({'success': True, 'playerId': new_id, 'message': '球员添加成功'})
-            
-            return jsonify({'success': False, 'error': '找不到插入位置'})
+            new_id = player_store.add_player(player)
+            return jsonify({'success': True, 'playerId': new_id, 'message': '球员添加成功'})
             
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)})
 
 
-@app.route('/api/players/<int:player_id>', methods=['PUT', 'DELETE'])
+def _split_arg(name):
+    value = request.args.get(name, '')
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+@app.route('/api/players/query', methods=['GET'])
+def query_players():
+    """按索引查询球员
+    
+    过滤：team / cost / position（逗号分隔，多值为“或”），minChampionships / minAllStar / minMvp / minFmvp
+    排序：sort=-championships,cost（前缀 - 表示降序，默认 成本↓ 全明星↓ ID↑）
+    分页：offset / limit（默认 50，最大 500）；投影：fields=id,name,cost
+    """
+    try:
+        teams = _split_arg('team')
+        costs = [int(c) for c in _split_arg('cost')]
+        positions = [p.upper() for p in _split_arg('position')]
+        minimums = {}
+        for field in COUNT_FIELDS:
+            value = request.args.get('min' + field[0].upper() + field[1:])
+            if value not in (None, ''):
+                minimums[field] = int(value)
+        sort = []
+        for item in _split_arg('sort'):
+            field = item.lstrip('-')
+            if field not in PLAYER_FIELDS:
+                return jsonify({'success': False, 'error': f'不支持的排序字段: {field}'}), 400
+            sort.append((field, item.startswith('-')))
+        fields = _split_arg('fields')
+        unknown = [f for f in fields if f not in PLAYER_FIELDS]
+        if unknown:
+            return jsonify({'success': False, 'error': f'未知字段: {", ".join(unknown)}'}), 400
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(500, max(1, int(request.args.get('limit', 50))))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': f'参数格式错误: {e}'}), 400
+    
+    index = player_store.get()
+    key = ('query', tuple(teams), tuple(costs), tuple(positions), tuple(sorted(minimums.items())), tuple(sort), tuple(fields), offset, limit)
+    
+    def build():
+        matched = index.query(teams, costs, positions, minimums, sort)
+        page = matched[offset:offset + limit]
+        if fields:
+            page = [{f: p[f] for f in fields if f in p} for p in page]
+        return {'success': True, 'version': index.version, 'total': len(matched), 'offset': offset, 'limit': limit, 'players': page}
+    
+    return cached_json_response(*index.payload(key, build))
+
+
+@app.route('/api/players/import', methods=['POST'])
+def import_players():
+    """批量导入球员（CSV 或 JSONL），逐行校验，一次分配ID并只重写一次 players.js
+    
+    ?format=csv|jsonl 未指定时按 Content-Type 判断；?atomic=1 时有任何错误行则整批不导入
+    """
+    try:
+        fmt = request.args.get('format') or ('csv' if 'csv' in (request.mimetype or '') else 'jsonl')
+        if fmt not in ('csv', 'jsonl'):
+            return jsonify({'success': False, 'error': f'不支持的格式: {fmt}'})
+        atomic = request.args.get('atomic', '').lower() in ('1', 'true', 'yes')
+        
+        index = player_store.get()
+        team_ids = {t['id'] for t in index.teams}
+        seen = {player_key(p) for p in index.players}
+        players = []
+        rows = []
+        errors = []
+        
+        for row_no, data, error in iter_import_rows(request.stream, fmt):
+            if not error:
+                player, error = validate_player(data, team_ids)
+            if not error and player_key(player) in seen:
+                error = f'重复球员: {player["nameEn"]} ({player["team"]} {player["peakSeason"]})'
+            if error:
+                errors.append({'row': row_no, 'error': error})
+                continue
+            seen.add(player_key(player))
+            players.append(player)
+            rows.append(row_no)
+        
+        if atomic and errors:
+            return jsonify({'success': False, 'imported': 0, 'errors': errors, 'error': f'{len(errors)} 行校验失败，未导入任何球员'})
+        
+        new_ids = player_store.add_players(players)
+        print(f"[球员] 批量导入 {len(new_ids)} 名球员, {len(errors)} 行失败", flush=True)
+        return jsonify({
+            'success': True,
+            'imported': len(new_ids),
+            'players': [{'row': row, 'playerId': pid} for row, pid in zip(rows, new_ids)],
+            'errors': errors,
+            'message': f'成功导入 {len(new_ids)} 名球员'
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+
+@app.route('/api/players/<int:player_id>', methods=['GET', 'PUT', 'DELETE'])
 def update_player(player_id):
-    """修改或删除球员"""
-    # 文件路径
-    players_file = os.path.join(SCRIPT_DIR, 'players.js')
+    """获取、修改或删除球员"""
+    if request.method == 'GET':
+        index = player_store.get()
+        player = index.by_id.get(player_id)
+        if player is None:
+            return jsonify({'success': False, 'error': f'找不到ID为 {player_id} 的球员'}), 404
+        return cached_json_response(*index.payload(('id', player_id), lambda: {'success': True, 'version': index.version, 'player': player}))
     
-    if request.method == 'PUT':
-        # 修改球员信息
+    elif request.method == 'PUT':
+        # 修改球员信息（只更新传入的字段）
         try:
-            data = request.json
-            
-            # 读取现有文件
-            with open(players_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 找到该球员的数据
-            pattern = rf'\{{\s*id:\s*{player_id},\s*name:\s*"[^"]+",\s*nameEn:\s*"[^"]+",\s*cost:\s*\d+,\s*positions:\s*\[[^\]]*\],\s*team:\s*"[^"]+",\s*peakSeason:\s*"[^"]+",\s*championships:\s*\d+,\s*allStar:\s*\d+,\s*mvp:\s*\d+,\s*fmvp:\s*\d+\s*\}}'
-            match = re.search(pattern, content)
+            index = player_store.get()
+            fields, error = validate_player(request.json, {t['id'] for t in index.teams}, partial=True)
+            if error:
+                return jsonify({'success': False, 'error': error})
             
-            if not match:
+            if not player_store.update_player(player_id, fields):
                 return jsonify({'success': False, 'error': f'找不到ID为 {player_id} 的球员'})
             
-            old_player = match.group(0)
-            
-            # 构造新的球员数据（保留原有值或使用新值）
-            # 提取原有值
-            old_values = {}
-            for key in ['name', 'nameEn', 'cost', 'team', 'peakSeason', 'championships', 'allStar', 'mvp', 'fmvp']:
-                m = re.search(rf'{key}:\s*"?([^",\}}]+)"?', old_player)
-                if m:
-                    old_values[key] = m.group(1).strip('"')
-            
-            # positions 特殊处理
-            pos_match = re.search(r'positions:\s*(\[[^\]]*\])', old_player)
-            if pos_match:
-                old_values['positions'] = pos_match.group(1)
-            
-            # 合并新旧值
-            name = data.get('name', old_values.get('name'))
-            nameEn = data.get('nameEn', old_values.get('nameEn'))
-            cost = data.get('cost', old_values.get('cost'))
-            positions = json.dumps(data.get('positions')) if 'positions' in data else old_values.get('positions')
-            team = data.get('team', old_values.get('team'))
-            peakSeason = data.get('peakSeason', old_values.get('peakSeason'))
-            championships = data.get('championships', old_values.get('championships'))
-            allStar = data.get('allStar', old_values.get('allStar'))
-            mvp = data.get('mvp', old_values.get('mvp'))
-            fmvp = data.get('fmvp', old_values.get('fmvp'))
-            
-            # 构造新球员数据
-            new_player = f'{{ id: {player_id}, name: "{name}", nameEn: "{nameEn}", cost: {cost}, positions: {positions}, team: "{team}", peakSeason: "{peakSeason}", championships: {championships}, allStar: {allStar}, mvp: {mvp}, fmvp: {fmvp} }}'
-            
-            # 替换
-            content = content.replace(old_player, new_player)
-            
-            # 写入文件
-            with open(players_file, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
             return jsonify({'success': True, 'message': '球员更新成功'})
             
         except Exception as e:
@@ -570,17 +885,8 @@ def update_player(player_id):
     elif request.method == 'DELETE':
         # 删除球员
         try:
-            # 读取现有文件
-            with open(players_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 找到该球员的数据（包括前面的缩进和换行）
-            pattern = rf'\s*\{{\s*id:\s*{player_id},[^}}]+\}},?\n?'
-            content = re.sub(pattern, '', content)
-            
-            # 写入文件
-            with open(players_file, 'w', encoding='utf-8') as f:
-                f.write(content)
+            if not player_store.delete_player(player_id):
+                return jsonify({'success': False, 'error': f'找不到ID为 {player_id} 的球员'})
             
             return jsonify({'success': True, 'message': '球员删除成功'})
             
@@ -601,20 +907,24 @@ def handle_connect():
 def handle_disconnect():
     try:
         print(f"[WebSocket] 客户端断开连接: {request.sid}", flush=True)
-        # 查找并移除断开连接的玩家
-        for room_id, room in list(rooms.items()):
-            for player_num, player_info in room.players.items():
-                if player_info and player_info['sid'] == request.sid:
-                    # 通知房间内其他玩家
-                    socketio.emit('player_left', {
-                        'player_num': player_num,
-                        'message': f"{player_info['name']} 离开了房间"
-                    }, room=room_id)
-                    # 如果房间为空则删除
-                    if all(p is None or p['sid'] == request.sid for p in room.players.values()):
-                        del rooms[room_id]
-                        print(f"[房间] 房间 {room_id} 已删除", flush=True)
-                    break
+        # 按连接索引找到断开连接的玩家
+        entry = sid_index.pop(request.sid, None)
+        if entry is None or entry[0] not in rooms:
+            return
+        room_id, player_num = entry
+        room = rooms[room_id]
+        player_info = room.players.get(player_num)
+        if not player_info or player_info['sid'] != request.sid:
+            # 该位置已被重连的新连接接管
+            return
+        # 通知房间内其他玩家
+        socketio.emit('player_left', {
+            'player_num': player_num,
+            'message': f"{player_info['name']} 离开了房间"
+        }, room=room_id)
+        # 如果房间为空则删除
+        if all(p is None or p['sid'] == request.sid for p in room.players.values()):
+            _delete_room(room, '玩家断开连接')
     except Exception as e:
         import traceback
         print(f"[WebSocket] handle_disconnect 发生错误: {str(e)}", flush=True)
@@ -625,6 +935,9 @@ def handle_ping(data):
     """处理客户端心跳保活"""
     timestamp = data.get('timestamp', 0)
     print(f"[心跳] 收到客户端 ping, 时间戳: {timestamp}, SID: {request.sid}", flush=True)
+    entry = sid_index.get(request.sid)
+    if entry is not None and entry[0] in rooms:
+        rooms[entry[0]].touch()
     emit('pong', {'timestamp': timestamp, 'server_time': int(time.time() * 1000)})
 
 @socketio.on('create_room')
@@ -640,6 +953,7 @@ def handle_create_room(data):
     
     room = Room(room_id, request.sid, player_name)
     rooms[room_id] = room
+    _bind_sid(request.sid, room_id, '1')
     
     join_room(room_id)
     
@@ -673,16 +987,18 @@ def handle_join_room(data):
         return
     
     room.players['2'] = {'sid': request.sid, 'name': player_name, 'ready': False}
+    _bind_sid(request.sid, room_id, '2')
+    room.touch()
     join_room(room_id)
     
     print(f"[房间] 玩家 {player_name} (SID: {request.sid}) 成功加入房间 {room_id}", flush=True)
     
-    # 通知房间内所有玩家
+    # 通知房间内其他玩家（新玩家从 room_joined 拿到完整状态）
     socketio.emit('player_joined', {
         'player_num': '2',
         'player_name': player_name,
-        'room_state': room.to_dict()
-    }, room=room_id)
+        'room_patch': room.patch()
+    }, room=room_id, skip_sid=request.sid)
     
     # 给新加入的玩家发送房间状态
     emit('room_joined', {
@@ -722,6 +1038,10 @@ def handle_rejoin_room(data):
         # 更新玩家的 Socket ID（因为重连后 SID 会变化）
         old_sid = room.players[player_num]['sid']
         room.players[player_num]['sid'] = request.sid
+        if sid_index.get(old_sid) == (room_id, player_num):
+            del sid_index[old_sid]
+        _bind_sid(request.sid, room_id, player_num)
+        room.touch()
         print(f"[房间] 更新玩家 {player_num} 的 SID: {old_sid} -> {request.sid}", flush=True)
         
         # 重新加入房间（Socket.IO 房间）
@@ -736,6 +1056,9 @@ def handle_rejoin_room(data):
             'message': '成功恢复游戏状态'
         })
         
+        # 补发断线期间错过的对战流事件（不会重新发起模拟）
+        _replay_battle_stream(room, data.get('battle_id'), data.get('last_seq') or 0)
+        
         # 通知房间内其他玩家
         other_player = '2' if player_num == '1' else '1'
         if room.players[other_player]:
@@ -759,12 +1082,11 @@ def handle_rejoin_room(data):
 def handle_ready(data):
     """玩家准备"""
     room_id = data.get('room_id')
-    player_num = str(data.get('player_num'))  # 确保是字符串
     
-    if room_id not in rooms:
+    room, player_num = _room_member(room_id)
+    if room is None:
         return
     
-    room = rooms[room_id]
     room.players[player_num]['ready'] = True
     
     # 检查是否双方都准备好
@@ -776,7 +1098,7 @@ def handle_ready(data):
     
     socketio.emit('player_ready', {
         'player_num': player_num,
-        'room_state': room.to_dict()
+        'room_patch': room.patch()
     }, room=room_id)
 
 @socketio.on('select_team')
@@ -784,18 +1106,16 @@ def handle_select_team(data):
     """选择队伍"""
     try:
         room_id = data.get('room_id')
-        player_num = str(data.get('player_num'))  # 确保是字符串
         team_code = data.get('team_code')
         
+        room, player_num = _room_member(room_id)
         print(f"[房间] 收到 select_team 事件: room={room_id}, player={player_num}, team={team_code}", flush=True)
         
-        if room_id not in rooms:
-            print(f"[房间] 错误: 房间 {room_id} 不存在", flush=True)
-            emit('error', {'message': '房间不存在'})
+        if room is None:
+            print(f"[房间] 错误: {request.sid} 不在房间 {room_id} 中", flush=True)
+            emit('error', {'message': '房间不存在或您不在该房间中'})
             return
         
-        room = rooms[room_id]
-        
         if room.game_state['current_player'] != player_num:
             print(f"[房间] 错误: 当前玩家是 {room.game_state['current_player']}，不是 {player_num}", flush=True)
             emit('error', {'message': '还没轮到你操作'})
@@ -815,7 +1135,7 @@ def handle_select_team(data):
         socketio.emit('team_selected', {
             'player_num': player_num,
             'team_code': team_code,
-            'room_state': room.to_dict()
+            'room_patch': room.patch()
         }, room=room_id)
         print(f"[房间] team_selected 事件已广播", flush=True)
         
@@ -830,19 +1150,17 @@ def handle_select_player(data):
     """选择球员"""
     try:
         room_id = data.get('room_id')
-        player_num = str(data.get('player_num'))  # 确保是字符串
         player_data = data.get('player_data')
         position = data.get('position')
         
+        room, player_num = _room_member(room_id)
         print(f"[房间] 收到 select_player 事件: room={room_id}, player={player_num}, position={position}", flush=True)
         
-        if room_id not in rooms:
-            print(f"[房间] 错误: 房间 {room_id} 不存在", flush=True)
-            emit('error', {'message': '房间不存在'})
+        if room is None:
+            print(f"[房间] 错误: {request.sid} 不在房间 {room_id} 中", flush=True)
+            emit('error', {'message': '房间不存在或您不在该房间中'})
             return
         
-        room = rooms[room_id]
-        
         if room.game_state['current_player'] != player_num:
             print(f"[房间] 错误: 当前玩家是 {room.game_state['current_player']}，不是 {player_num}", flush=True)
             emit('error', {'message': '还没轮到你操作'})
@@ -864,6 +1182,8 @@ def handle_select_player(data):
             room.game_state['current_player'] = None
             room.game_state['selection_phase'] = 'draw'
             print(f"[房间] 双方选满，进入对战阶段", flush=True)
+            if SPECULATIVE_BATTLE:
+                _start_speculative_battle(room)
         else:
             # 切换到下一个玩家
             next_player = '2' if player_num == '1' else '1'
@@ -875,12 +1195,11 @@ def handle_select_player(data):
         
         print(f"[房间] 玩家 {player_num} 选择了球员 {player_data['name']} ({position})", flush=True)
         
-        # 构建响应数据
+        # 构建响应数据（球员数据已包含在增量中）
         response_data = {
             'player_num': player_num,
-            'player_data': player_data,
             'position': position,
-            'room_state': room.to_dict()
+            'room_patch': room.patch()
         }
         
         print(f"[房间] 准备广播 player_selected 事件到房间 {room_id}", flush=True)
@@ -897,13 +1216,11 @@ def handle_select_player(data):
 def handle_skip_turn(data):
     """跳过回合"""
     room_id = data.get('room_id')
-    player_num = str(data.get('player_num'))  # 确保是字符串
     
-    if room_id not in rooms:
+    room, player_num = _room_member(room_id)
+    if room is None:
         return
     
-    room = rooms[room_id]
-    
     if room.game_state['current_player'] != player_num:
         emit('error', {'message': '还没轮到你操作'})
         return
@@ -918,7 +1235,7 @@ def handle_skip_turn(data):
     
     socketio.emit('turn_skipped', {
         'player_num': player_num,
-        'room_state': room.to_dict()
+        'room_patch': room.patch()
     }, room=room_id)
 
 @socketio.on('request_battle')
@@ -926,11 +1243,10 @@ def handle_request_battle(data):
     """请求开始对战"""
     room_id = data.get('room_id')
     
-    if room_id not in rooms:
+    room, _ = _room_member(room_id)
+    if room is None:
         return
     
-    room = rooms[room_id]
-    
     # 通知房间内所有玩家开始对战
     socketio.emit('battle_ready', {
         'teams': room.game_state['teams'],
@@ -953,16 +1269,9 @@ def handle_restart_game(data):
         emit('error', {'message': '房间不存在'})
         return
     
-    room = rooms[room_id]
-    
     # 验证请求者是否在房间中
-    requesting_player_num = None
-    for player_num, player_info in room.players.items():
-        if player_info and player_info['sid'] == requesting_sid:
-            requesting_player_num = player_num
-            break
-    
-    if not requesting_player_num:
+    room, requesting_player_num = _room_member(room_id)
+    if room is None:
         print(f"[重新开始] 错误: 玩家 {requesting_sid} 不在房间 {room_id} 中", flush=True)
         emit('error', {'message': '您不在该房间中'})
         return
@@ -974,7 +1283,7 @@ def handle_restart_game(data):
     # 广播给房间内所有玩家
     socketio.emit('game_restarted', {
         'message': '游戏已重新开始',
-        'room_state': room.to_dict(),
+        'room_patch': room.patch(),
         'restarted_by': room.players[requesting_player_num]['name']
     }, room=room_id)
     
@@ -988,183 +1297,187 @@ def handle_leave_room(data):
     
     print(f"[房间] 玩家主动离开: room={room_id}, sid={leaving_sid}", flush=True)
     
-    if room_id not in rooms:
+    # 找到离开者的玩家信息
+    room, leaving_player_num = _room_member(room_id)
+    if room is None:
         return
     
-    room = rooms[room_id]
+    # 通知房间内其他玩家
+    socketio.emit('player_left', {
+        'player_num': leaving_player_num,
+        'message': f"{room.players[leaving_player_num]['name']} 离开了房间"
+    }, room=room_id)
     
-    # 找到离开者的玩家信息
-    leaving_player_num = None
-    leaving_player_name = None
-    for player_num, player_info in room.players.items():
-        if player_info and player_info['sid'] == leaving_sid:
-            leaving_player_num = player_num
-            leaving_player_name = player_info['name']
-            break
+    # 删除房间（进行中的模拟没有人接收了，一并取消）
+    _delete_room(room, '玩家主动离开')
+
+@socketio.on('sync_room')
+def handle_sync_room(data):
+    """客户端发现状态版本缺口时请求完整的房间状态"""
+    room_id = data.get('room_id')
     
-    if leaving_player_num:
-        # 通知房间内其他玩家
-        socketio.emit('player_left', {
-            'player_num': leaving_player_num,
-            'message': f"{leaving_player_name} 离开了房间"
-        }, room=room_id)
-        
-        # 删除房间
-        del rooms[room_id]
-        print(f"[房间] 房间 {room_id} 已删除（玩家主动离开）", flush=True)
+    room, _ = _room_member(room_id)
+    if room is None:
+        emit('error', {'message': '房间不存在或您不在该房间中'})
+        return
+    
+    print(f"[房间] 房间 {room_id} 的客户端请求完整状态（版本 {room.version}）", flush=True)
+    emit('room_snapshot', {'room_state': room.to_dict()})
+
+@socketio.on('set_quick_mode')
+def handle_set_quick_mode(data):
+    """切换房间的快速模式（任一玩家都可以切换，对之后开始的对战生效）"""
+    room_id = data.get('room_id')
+    
+    room, _ = _room_member(room_id)
+    if room is None:
+        emit('error', {'message': '房间不存在或您不在该房间中'})
+        return
+    
+    room.quick_mode = bool(data.get('enabled'))
+    print(f"[房间] 房间 {room_id} {'开启' if room.quick_mode else '关闭'}快速模式", flush=True)
+    socketio.emit('quick_mode_changed', {'quick_mode': room.quick_mode, 'room_patch': room.patch()}, room=room_id)
 
 @socketio.on('start_battle')
 def handle_start_battle(data):
     """开始对战模拟（广播给房间内所有玩家）"""
     room_id = data.get('room_id')
-    team1 = data.get('team1', {})
-    team2 = data.get('team2', {})
     player_names = data.get('playerNames', {'1': 'A组', '2': 'B组'})
+    mode = data.get('mode', 'ai')
     
-    if room_id not in rooms:
+    room, _ = _room_member(room_id)
+    if room is None:
         return
+    team1, error = validate_team(data.get('team1', {}))
+    if error is None:
+        team2, error = validate_team(data.get('team2', {}))
+    if error:
+        print(f"[对战] 房间 {room_id} 的阵容数据无效: {error}", flush=True)
+        emit('error', {'message': f'阵容数据无效: {error}'})
+        return
+    key = _battle_key(team1, team2, player_names, mode, room.quick_mode)
     
-    print(f"[对战] 房间 {room_id} 开始对战模拟", flush=True)
+    if room.battle_speculative:
+        if room.battle_key == key:
+            _attach_speculative_battle(room, team1, team2)
+            return
+        print(f"[对战] 房间 {room_id} 的阵容与预先模拟不一致，放弃预先模拟 {room.battle_id}", flush=True)
+        room.discard_battle('阵容与预先模拟不一致')
+    elif room.battle_running:
+        # 对战已在进行（例如网络抖动后客户端重复发送），不重复调用模拟，只给请求方补发
+        print(f"[对战] 房间 {room_id} 的对战已在进行中，忽略重复的 start_battle", flush=True)
+        _replay_battle_stream(room, None, 0)
+        return
+    
+    battle_id = room.begin_battle(key)
+    print(f"[对战] 房间 {room_id} 开始对战模拟 {battle_id} (模式: {mode}{'，快速模式' if room.quick_mode else ''})", flush=True)
     
     # 通知所有玩家对战开始
     socketio.emit('battle_started', {
-        'message': '对战模拟开始'
+        'message': '对战模拟开始',
+        'battle_id': battle_id
     }, room=room_id)
     
     # 在单独的 greenlet 中运行模拟，避免阻塞 WebSocket
-    eventlet.spawn(_run_battle_simulation, room_id, team1, team2, player_names)
-
-def _run_battle_simulation(room_id, team1, team2, player_names):
+    eventlet.spawn(_run_battle_simulation, room, battle_id, team1, team2, player_names, mode, room.quick_mode)
+
+def _battle_key(team1, team2, player_names, mode, quick=False):
+    """对战指纹：双方阵容 + 玩家名字 + 模式 + 快速模式，判断 start_battle 能否接上预先模拟"""
+    return (matchup_key(team1 or {}, team2 or {}, simulator.template_hash),
+            (player_names or {}).get('1'), (player_names or {}).get('2'), mode, quick)
+
+def _start_speculative_battle(room):
+    """双方选满后立即在后台开始模拟，事件先放进房间缓冲"""
+    team1, error = validate_team(room.game_state['teams']['1'])
+    if error is None:
+        team2, error = validate_team(room.game_state['teams']['2'])
+    if error:
+        # 阵容数据有问题时不预先模拟，等 start_battle 时再把错误返回给玩家
+        print(f"[对战] 房间 {room.room_id} 的阵容数据无效，不预先模拟: {error}", flush=True)
+        return
+    player_names = {num: (info or {}).get('name') for num, info in room.players.items()}
+    battle_id = room.begin_battle(_battle_key(team1, team2, player_names, 'ai', room.quick_mode), speculative=True)
+    print(f"[对战] 房间 {room.room_id} 双方选满，预先开始模拟 {battle_id}", flush=True)
+    # 以最低优先级排队，不占用真实对战的名额；start_battle 接上时再提升为在线优先级
+    eventlet.spawn(_run_battle_simulation, room, battle_id, team1, team2, player_names, 'ai', room.quick_mode,
+                   PRIORITY_SPECULATIVE)
+
+def _attach_speculative_battle(room, team1, team2):
+    """start_battle 与预先模拟一致：通知开始，补发已缓冲的事件后转为实时推送"""
+    room_id = room.room_id
+    # 还在排队时提升为在线优先级
+    simulator.promote(team1, team2, PRIORITY_LIVE)
+    print(f"[对战] 房间 {room_id} 接上预先模拟 {room.battle_id}（已缓冲 {room.stream_seq} 条事件）", flush=True)
+    socketio.emit('battle_started', {
+        'message': '对战模拟开始',
+        'battle_id': room.battle_id
+    }, room=room_id)
+    # 推送时可能让出控制权，期间后台模拟会继续缓冲新事件；循环到没有新事件后再切换为实时推送，保证顺序
+    sent = 0
+    while True:
+        events, _ = room.stream_events_since(sent)
+        if not events:
+            break
+        for event in events:
+            socketio.emit('battle_stream', event, room=room_id)
+        sent = events[-1]['seq']
+    room.battle_speculative = False
+
+def _replay_battle_stream(room, battle_id, last_seq):
+    """给当前客户端补发序号大于 last_seq 的对战流事件"""
+    if room.battle_id is None or room.battle_speculative:
+        return
+    if battle_id != room.battle_id:
+        # 客户端没有这场对战的任何内容，先让它重置界面再从头补发
+        last_seq = 0
+        emit('battle_started', {'message': '恢复对战模拟', 'battle_id': room.battle_id, 'replay': True})
+    events, missed = room.stream_events_since(last_seq)
+    if missed:
+        emit('battle_stream', {'type': 'gap', 'missed': missed, 'battleId': room.battle_id})
+    for event in events:
+        emit('battle_stream', event)
+    print(f"[对战] 房间 {room.room_id} 补发 {len(events)} 条对战流事件（{missed} 条已过期）", flush=True)
+
+def _run_battle_simulation(room, battle_id, team1, team2, player_names, mode='ai', quick=False, priority=PRIORITY_LIVE):
     """在后台执行对战模拟"""
-    # 构建提示词
-    prompt = build_simple_series_prompt(team1, team2, player_names)
-    
-    # 系统提示词
-    system_prompt = """你是一位顶级NBA战术分析师和数据专家，拥有深厚的篮球战术理解和历史知识。你需要模拟NBA总决赛BO7系列赛。
-
-【⚠️ 核心规则 - 严格按赛季状态模拟】
-球员名称格式为"XX赛季的XX球员"，必须严格按照该赛季该球队的真实状态模拟！
-
-🔴 **同一球员不同赛季差异巨大，必须区分：**
-- 火箭大梦(1994) vs 猛龙大梦(2001)：巅峰统治力 vs 职业末期角色球员
-- 热火詹姆斯(2013) vs 湖人詹姆斯(2023)：巅峰身体素质 vs 老年智慧型打法
-- 公牛乔丹(1996) vs 奇才乔丹(2002)：历史最佳 vs 退役复出
-- 湖人科比(2006) vs 湖人科比(2015)：得分王 vs 跟腱断裂后
-- 马刺邓肯(2003) vs 马刺邓肯(2015)：攻防一体 vs 防守蓝领
-
-📊 **模拟时必须考虑该赛季的：**
-- 球员年龄和身体状态（爆发力、速度、耐久性）
-- 在球队的角色定位（核心/二当家/角色球员）
-- 该赛季的真实数据表现（得分、效率、出场时间）
-- 伤病影响（大伤后的球员能力会明显下降）
-- 球队体系中的战术地位
-
-【🏀 球队战术体系分析维度】
-你必须从以下维度深入分析双方球队，并据此模拟比赛：
-
-1. **空间与投射**
-   - 场上球员的三分/中投威胁如何？能否拉开空间？
-   - 是否有多个投射点？还是空间拥挤？
-   - 内线球员是否有投射能力？会不会堵塞禁区？
-
-2. **组织与传球**
-   - 谁是主要组织者？组织能力如何？
-   - 传球视野和失误控制
-   - 是否有多个持球点？还是过度依赖单一组织者？
-
-3. **进攻火力**
-   - 得分手段是否多样？（突破、中投、三分、背身）
-   - 进攻效率和终结能力
-   - 关键时刻的得分能力（clutch能力）
-
-4. **防守体系**
-   - 个人防守能力：护框、外线防守、协防意识
-   - 是否有防守漏洞？错位会被针对吗？
-   - 篮板球控制能力
-
-5. **球权分配与化学反应**
-   - 核心球员是谁？球权如何分配？
-   - 多个球星是否能共存？会不会球权冲突？
-   - 球员打法是否兼容？是否互补？
-
-6. **球星成色与赛季状态**
-   - 该赛季球员处于什么阶段？（巅峰/上升期/下滑期/末期）
-   - 球员的历史地位和荣誉
-   - 季后赛/总决赛大赛经验
-   - 领袖气质和关键球能力
-   - ⚠️ 注意：同一球员不同赛季实力可能天差地别！
-
-【🎯 模拟原则】
-1. 阵容搭配合理的球队有优势（空间+组织+防守平衡）
-2. 球星扎堆但不兼容的阵容会有问题（球权冲突、空间拥挤）
-3. 有明显防守漏洞的球队会被针对
-4. 系列赛要有起伏，体现真实的竞技对抗
-5. 考虑主场优势（1、2、5、7场为team1主场）
-
-【🏆 FMVP评选标准】
-- 必须来自冠军球队
-- 综合考虑：场均数据、关键比赛表现、对胜利的贡献度
-- 不一定是数据最好的球员，而是对夺冠贡献最大的球员
-
-【重要】你必须严格按照JSON格式返回结果。"""
-    
+    room_id = room.room_id
+    if room.battle_id != battle_id:
+        # 启动前对战已被放弃（房间删除 / 重新开始）
+        return
+
+    def publish(event):
+        # 编号后放入房间缓冲（供断线重连补发）；预先模拟在接上之前只缓冲不推送
+        event = room.buffer_stream_event(event)
+        if not room.battle_speculative:
+            socketio.emit('battle_stream', event, room=room_id)
+
     try:
         print(f"[对战] 开始调用 DeepSeek API", flush=True)
         
-        # 调用 DeepSeek API
-        response = client.chat.completions.create(
-            model="deepseek-reasoner",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            stream=True
-        )
-        
-        reasoning_content = ""
-        final_content = ""
-        
-        for chunk in response:
-            delta = chunk.choices[0].delta
-            if delta.reasoning_content:
-                reasoning_content += delta.reasoning_content
-                # 广播思考过程
-                socketio.emit('battle_stream', {
-                    'type': 'reasoning',
-                    'content': delta.reasoning_content
-                }, room=room_id)
-                # 让出控制权，避免阻塞
-                eventlet.sleep(0)
-            elif delta.content:
-                final_content += delta.content
-                # 广播生成内容
-                socketio.emit('battle_stream', {
-                    'type': 'content',
-                    'content': delta.content
-                }, room=room_id)
-                # 让出控制权，避免阻塞
-                eventlet.sleep(0)
-        
-        # 解析结果
-        result = extract_json(final_content)
-        
-        # 广播最终结果
-        socketio.emit('battle_stream', {
-            'type': 'result',
-            'data': result
-        }, room=room_id)
+        for event in simulator.stream(team1, team2, player_names, mode=mode, priority=priority, owner=f'room:{room_id}',
+                                      delivery=SOCKET_DELIVERY, quick=quick):
+            if room.battle_id != battle_id:
+                print(f"[对战] 房间 {room_id} 的对战 {battle_id} 已被放弃，停止推送", flush=True)
+                return
+            # 广播思考过程 / 生成内容 / 最终结果
+            publish(event)
+            # 让出控制权，避免阻塞
+            eventlet.sleep(0)
         
         print(f"[对战] 房间 {room_id} 对战模拟完成", flush=True)
         
     except Exception as e:
+        if room.battle_id != battle_id:
+            print(f"[对战] 房间 {room_id} 的对战 {battle_id} 已被放弃: {e}", flush=True)
+            return
         import traceback
         traceback.print_exc()
         # 广播错误
-        socketio.emit('battle_stream', {
-            'type': 'error',
-            'error': str(e)
-        }, room=room_id)
+        publish({'type': 'error', 'error': str(e)})
         print(f"[对战] 房间 {room_id} 对战模拟失败: {str(e)}", flush=True)
+    finally:
+        if room.battle_id == battle_id:
+            room.battle_running = False
 
 
 if __name__ == '__main__':
@@ -1179,6 +1492,13 @@ if __name__ == '__main__':
     print("=" * 50, flush=True)
     
     try:
+        # 监听开始后再标记就绪；WARMUP_LLM_CLIENT=0 时完全按需创建 OpenAI 客户端
+        eventlet.spawn(mark_ready)
+        if os.environ.get('WARMUP_LLM_CLIENT', '1') != '0':
+            eventlet.spawn_after(1.0, _warm_up)
+        if ROOM_SWEEP_INTERVAL > 0:
+            eventlet.spawn(_room_sweeper)
+        
         # Hugging Face Space 生产环境配置
         # 使用 eventlet 异步模式以支持 WebSocket
         socketio.run(
@@ -1188,7 +1508,7 @@ if __name__ == '__main__':
             debug=False, 
             allow_unsafe_werkzeug=True,
             use_reloader=False,
-            log_output=True  # 启用日志输出
+            log_output=SOCKETIO_DEBUG_LOG  # 访问日志同样受 SOCKETIO_DEBUG_LOG 控制
         )
     except Exception as e:
         import traceback
@@ -0,0 +1,315 @@
+# ========================================
+# 模拟结果归档 - 只追加的 SQLite 历史库
+# ========================================
+# 每次完成的模拟（AI / 本地引擎）都记录一条：双方阵容的球员ID和名字、
+# 房间 / 来源、耗时和 token、解析后的结果，以及 AI 的思考文本（gzip 压缩后存储）。
+# 写入由后台线程批量完成，不占用模拟和推送的时间；查询支持按球员、球队、房间、日期分页。
+
+import json
+import gzip
+import time
+import sqlite3
+from datetime import datetime
+
+try:
+    # 在 eventlet 环境下使用原生线程和队列，SQLite 写入不会阻塞事件循环
+    from eventlet.patcher import original
+    _threading = original('threading')
+    _queue = original('queue')
+except ImportError:
+    import threading as _threading
+    import queue as _queue
+
+POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS simulations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    matchup_key TEXT,
+    engine TEXT NOT NULL,
+    model TEXT,
+    fallback INTEGER NOT NULL DEFAULT 0,
+    team1_name TEXT,
+    team2_name TEXT,
+    champion INTEGER,
+    team1_wins INTEGER,
+    team2_wins INTEGER,
+    fmvp_name TEXT,
+    duration_seconds REAL,
+    first_reasoning_seconds REAL,
+    first_content_seconds REAL,
+    usage TEXT,
+    result_gz BLOB,
+    reasoning_gz BLOB
+);
+CREATE INDEX IF NOT EXISTS idx_simulations_created ON simulations(created_at);
+
+CREATE TABLE IF NOT EXISTS simulation_players (
+    sim_id INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    position TEXT NOT NULL,
+    player_id INTEGER,
+    name TEXT,
+    name_en TEXT,
+    team TEXT,
+    peak_season TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_sim_players_player ON simulation_players(player_id);
+CREATE INDEX IF NOT EXISTS idx_sim_players_team ON simulation_players(team);
+CREATE INDEX IF NOT EXISTS idx_sim_players_sim ON simulation_players(sim_id);
+
+CREATE TABLE IF NOT EXISTS simulation_owners (
+    sim_id INTEGER NOT NULL,
+    owner TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sim_owners_owner ON simulation_owners(owner);
+"""
+
+# 列表查询返回的列 -> JSON 字段
+_SUMMARY_FIELDS = {
+    'id': 'id', 'created_at': 'createdAt', 'engine': 'engine', 'model': 'model', 'fallback': 'fallback',
+    'team1_name': 'team1Name', 'team2_name': 'team2Name', 'champion': 'champion',
+    'team1_wins': 'team1Wins', 'team2_wins': 'team2Wins', 'fmvp_name': 'fmvp',
+    'duration_seconds': 'durationSeconds', 'first_reasoning_seconds': 'firstReasoningSeconds',
+    'first_content_seconds': 'firstContentSeconds', 'usage': 'usage'
+}
+
+
+def _compress(value):
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False)
+    return gzip.compress(value.encode('utf-8'))
+
+
+def _decompress(blob):
+    return gzip.decompress(blob).decode('utf-8') if blob is not None else None
+
+
+def _parse_date(value, end=False):
+    """YYYY-MM-DD（或时间戳）转为时间戳；end=True 时取当天结束"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    stamp = datetime.strptime(value, '%Y-%m-%d').timestamp()
+    return stamp + 86400 if end else stamp
+
+
+class SimulationArchive:
+    def __init__(self, db_path, batch_size=100):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0  # 数据异常、写入时被跳过的记录
+        self._queue = _queue.Queue(maxsize=10000)
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        conn.close()
+        self._writer = _threading.Thread(target=self._write_loop, name='sim-archive', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # ---------- 写入 ----------
+
+    def record(self, stats, team1, team2, player_names, result, reasoning=None):
+        """登记一次完成的模拟（只入队，由后台线程写入）"""
+        item = {
+            'stats': dict(stats),
+            'lineups': {'1': team1 or {}, '2': team2 or {}},
+            'names': dict(player_names or {}),
+            'result': result,
+            'reasoning': reasoning or None
+        }
+        try:
+            self._queue.put_nowait(item)
+        except _queue.Full:
+            self.dropped += 1
+            print("[归档] 写入队列已满，丢弃一条模拟记录", flush=True)
+
+    def close(self, timeout=5.0):
+        """写完队列中剩余的记录后退出后台线程"""
+        self._queue.put(None)
+        self._writer.join(timeout)
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    more = self._queue.get_nowait()
+                except _queue.Empty:
+                    break
+                if more is None:
+                    stop = True
+                    break
+                batch.append(more)
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                # 任何异常都不能让写入线程退出，否则之后的记录都会在队列里堆满后被丢弃
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                self.failed += len(batch)
+                print(f"[归档] 写入失败，丢弃 {len(batch)} 条记录: {e}", flush=True)
+            if stop:
+                break
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        """一个事务写入一批记录；单条记录数据异常时只跳过这一条"""
+        written = 0
+        conn.execute('BEGIN')
+        for entry in batch:
+            conn.execute('SAVEPOINT entry')
+            try:
+                self._insert(conn, entry)
+            except Exception as e:
+                conn.execute('ROLLBACK TO entry')
+                self.failed += 1
+                print(f"[归档] 跳过一条无法写入的模拟记录（{(entry['stats'].get('key') or '')[:12]}）: {e}", flush=True)
+            else:
+                written += 1
+            conn.execute('RELEASE entry')
+        conn.execute('COMMIT')
+        self.written += written
+
+    def _insert(self, conn, entry):
+        stats = entry['stats']
+        result = entry['result'] or {}
+        score = result.get('finalScore') or {}
+        cur = conn.execute(
+            'INSERT INTO simulations (created_at, matchup_key, engine, model, fallback, team1_name, team2_name, '
+            'champion, team1_wins, team2_wins, fmvp_name, duration_seconds, first_reasoning_seconds, '
+            'first_content_seconds, usage, result_gz, reasoning_gz) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                stats.get('finishedAt') or time.time(), stats.get('key'), stats.get('engine'), stats.get('model'),
+                1 if stats.get('fallback') else 0,
+                entry['names'].get('1'), entry['names'].get('2'),
+                result.get('champion'), score.get('team1Wins'), score.get('team2Wins'),
+                (result.get('fmvp') or {}).get('name'),
+                stats.get('durationSeconds'), stats.get('firstReasoningSeconds'), stats.get('firstContentSeconds'),
+                json.dumps(stats['usage']) if stats.get('usage') else None,
+                _compress(result), _compress(entry['reasoning'])
+            )
+        )
+        sim_id = cur.lastrowid
+        rows = []
+        for side, lineup in entry['lineups'].items():
+            for position in POSITIONS:
+                player = lineup.get(position)
+                if player:
+                    rows.append((sim_id, int(side), position, player.get('id'), player.get('name'),
+                                 player.get('nameEn'), player.get('team'), player.get('peakSeason')))
+        conn.executemany('INSERT INTO simulation_players VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.executemany('INSERT INTO simulation_owners VALUES (?, ?)',
+                         [(sim_id, owner) for owner in stats.get('owners') or []])
+
+    # ---------- 查询 ----------
+
+    def _summary(self, row, players):
+        item = {field: row[column] for column, field in _SUMMARY_FIELDS.items()}
+        item['usage'] = json.loads(item['usage']) if item['usage'] else None
+        item['fallback'] = bool(item['fallback'])
+        item['lineups'] = {'1': {}, '2': {}}
+        for p in players:
+            item['lineups'][str(p['side'])][p['position']] = {
+                'id': p['player_id'], 'name': p['name'], 'nameEn': p['name_en'],
+                'team': p['team'], 'peakSeason': p['peak_season']
+            }
+        return item
+
+    def query(self, player_id=None, team=None, owner=None, since=None, until=None, offset=0, limit=20):
+        """分页查询，返回 (总数, 记录列表)；记录按时间倒序，不含结果全文和思考文本"""
+        where, params = [], []
+        if player_id is not None:
+            where.append('id IN (SELECT sim_id FROM simulation_players WHERE player_id = ?)')
+            params.append(player_id)
+        if team:
+            where.append('id IN (SELECT sim_id FROM simulation_players WHERE team = ?)')
+            params.append(team)
+        if owner:
+            where.append('id IN (SELECT sim_id FROM simulation_owners WHERE owner = ?)')
+            params.append(owner)
+        since, until = _parse_date(since), _parse_date(until, end=True)
+        if since is not None:
+            where.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('created_at < ?')
+            params.append(until)
+        clause = ('WHERE ' + ' AND '.join(where)) if where else ''
+        conn = self._connect()
+        try:
+            total = conn.execute(f'SELECT COUNT(*) FROM simulations {clause}', params).fetchone()[0]
+            rows = conn.execute(
+                f'SELECT {", ".join(_SUMMARY_FIELDS)} FROM simulations {clause} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?',
+                params + [limit, offset]
+            ).fetchall()
+            players = {}
+            if rows:
+                ids = [r['id'] for r in rows]
+                marks = ','.join('?' * len(ids))
+                for p in conn.execute(f'SELECT * FROM simulation_players WHERE sim_id IN ({marks})', ids):
+                    players.setdefault(p['sim_id'], []).append(p)
+            return total, [self._summary(r, players.get(r['id'], [])) for r in rows]
+        finally:
+            conn.close()
+
+    def get(self, sim_id, include_reasoning=False):
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT * FROM simulations WHERE id = ?', (sim_id,)).fetchone()
+            if row is None:
+                return None
+            players = conn.execute('SELECT * FROM simulation_players WHERE sim_id = ?', (sim_id,)).fetchall()
+            owners = [r['owner'] for r in conn.execute('SELECT owner FROM simulation_owners WHERE sim_id = ?', (sim_id,))]
+        finally:
+            conn.close()
+        item = self._summary(row, players)
+        item['owners'] = owners
+        item['matchupKey'] = row['matchup_key']
+        item['result'] = json.loads(_decompress(row['result_gz'])) if row['result_gz'] is not None else None
+        if include_reasoning:
+            item['reasoning'] = _decompress(row['reasoning_gz'])
+        return item
+
+    def leaderboard(self, limit=20):
+        """球员排行：出场系列赛数、夺冠次数、FMVP 次数"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT p.player_id, MAX(p.name) AS name, MAX(p.team) AS team, COUNT(*) AS series, '
+                'SUM(CASE WHEN s.champion = p.side THEN 1 ELSE 0 END) AS titles, '
+                'SUM(CASE WHEN s.champion = p.side AND s.fmvp_name = p.name THEN 1 ELSE 0 END) AS fmvps '
+                'FROM simulation_players p JOIN simulations s ON s.id = p.sim_id '
+                'WHERE p.player_id IS NOT NULL '
+                'GROUP BY p.player_id ORDER BY titles DESC, fmvps DESC, series DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{
+            'playerId': r['player_id'], 'name': r['name'], 'team': r['team'], 'series': r['series'],
+            'titles': r['titles'], 'fmvps': r['fmvps'],
+            'titleRate': round(r['titles'] / r['series'], 4) if r['series'] else None
+        } for r in rows]
+
+    def stats(self):
+        return {'written': self.written, 'pending': self._queue.qsize(), 'dropped': self.dropped, 'failed': self.failed}
@@ -0,0 +1,105 @@
+# ========================================
+# 对阵结果缓存 - LRU + TTL，可选磁盘持久化
+# ========================================
+# 相同的十名球员-赛季组合（加上相同的提示词模板）会得到同一个缓存键，
+# 缓存内容包括录制的思考/输出流和解析后的结果，命中时直接回放，不再调用 API。
+# 设置 directory 后条目同时写入磁盘（gzip JSON），进程重启后依然有效。
+
+import os
+import json
+import gzip
+import time
+import threading
+from collections import OrderedDict
+
+
+class MatchupCache:
+    def __init__(self, max_entries=256, ttl=86400.0, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json.gz')
+
+    def _expired(self, entry):
+        return self.ttl > 0 and time.time() - entry.get('created_at', 0) > self.ttl
+
+    def _load_from_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"[缓存] 读取缓存文件失败 {path}: {e}", flush=True)
+            return None
+        if self._expired(entry):
+            self._remove_from_disk(key)
+            return None
+        return entry
+
+    def _remove_from_disk(self, key):
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load_from_disk(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, entry)
+            return entry
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key, entry):
+        entry.setdefault('created_at', time.time())
+        with self._lock:
+            self._store(key, entry)
+        if self.directory:
+            tmp_path = self._path(key) + '.tmp'
+            try:
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    json.dump(entry, f, ensure_ascii=False)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                print(f"[缓存] 写入缓存文件失败: {e}", flush=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'persistent': bool(self.directory)
+            }
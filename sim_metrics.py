@@ -0,0 +1,116 @@
+# ========================================
+# 模拟耗费统计 - token 用量与延迟
+# ========================================
+# 每次模拟（上游调用、缓存回放、本地引擎）记录一条：
+#   - token：提示词、命中上下文缓存的提示词、思考、输出
+#   - 延迟：排队时间、首个思考 token、首个输出 token、总耗时
+# 记录按来源（房间 / HTTP 客户端 / 赛事）查询，也可以汇总全部记录。
+
+import time
+import threading
+from collections import deque
+
+USAGE_FIELDS = ('promptTokens', 'cacheHitTokens', 'cacheMissTokens', 'reasoningTokens', 'completionTokens')
+LATENCY_FIELDS = ('queueSeconds', 'firstReasoningSeconds', 'firstContentSeconds', 'durationSeconds')
+
+
+def _get(obj, name):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_dict(usage):
+    """把上游返回的 usage（OpenAI SDK 对象或字典）转成统一字段"""
+    if usage is None:
+        return None
+    details = _get(usage, 'completion_tokens_details')
+    prompt = _get(usage, 'prompt_tokens') or 0
+    hit = _get(usage, 'prompt_cache_hit_tokens')
+    if hit is None:
+        # OpenAI 风格的字段名
+        hit = _get(_get(usage, 'prompt_tokens_details'), 'cached_tokens') or 0
+    miss = _get(usage, 'prompt_cache_miss_tokens')
+    return {
+        'promptTokens': prompt,
+        'cacheHitTokens': hit,
+        'cacheMissTokens': miss if miss is not None else prompt - hit,
+        'reasoningTokens': _get(details, 'reasoning_tokens') or 0,
+        'completionTokens': _get(usage, 'completion_tokens') or 0,
+    }
+
+
+_HEDGE_OUTCOME = {True: '对冲请求胜出', False: '原请求胜出', None: '均未产出 token'}
+
+
+def _seconds(value):
+    return '-' if value is None else f'{value}s'
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(p / 100.0 * (len(values) - 1)))))
+    return round(values[idx], 3)
+
+
+class SimulationMetrics:
+    def __init__(self, max_records=1000):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        entry.setdefault('finishedAt', time.time())
+        with self._lock:
+            self._records.append(entry)
+        if entry.get('engine') != 'ai':
+            return
+        if entry.get('cancelled'):
+            print(f"[统计] ai 模拟 {entry.get('key', '')[:12]} 已取消（{entry['cancelled']}），"
+                  f"耗时 {entry.get('durationSeconds')}s", flush=True)
+            return
+        usage = entry.get('usage') or {}
+        print(f"[统计] {entry.get('engine')} 模拟 {entry.get('key', '')[:12]}"
+              + (f"（{entry['model']}）" if entry.get('tier') not in (None, 'reasoner') else '') + ": "
+              f"耗时 {_seconds(entry.get('durationSeconds'))}, 首个思考 {_seconds(entry.get('firstReasoningSeconds'))}, "
+              f"首个输出 {_seconds(entry.get('firstContentSeconds'))}, 提示词 {usage.get('promptTokens', 0)} "
+              f"(缓存命中 {usage.get('cacheHitTokens', 0)}), 思考 {usage.get('reasoningTokens', 0)}, "
+              f"输出 {usage.get('completionTokens', 0)}"
+              + (f", 对冲 {entry['hedges']} 次（{_HEDGE_OUTCOME[entry.get('hedgeWon')]}）" if entry.get('hedges') else ''),
+              flush=True)
+
+    def records(self, owner=None, limit=50):
+        with self._lock:
+            rows = [r for r in self._records if owner is None or owner in r.get('owners', ())]
+        return rows[-limit:][::-1] if limit else rows[::-1]
+
+    def summary(self, owner=None):
+        rows = self.records(owner, limit=0)
+        upstream = [r for r in rows if r.get('engine') == 'ai']
+        totals = {field: sum((r.get('usage') or {}).get(field, 0) for r in upstream) for field in USAGE_FIELDS}
+        latency = {}
+        for field in LATENCY_FIELDS:
+            values = [r[field] for r in upstream if r.get(field) is not None]
+            latency[field] = {
+                'avg': round(sum(values) / len(values), 3) if values else None,
+                'p50': _percentile(values, 50),
+                'p95': _percentile(values, 95)
+            }
+        return {
+            'simulations': len(rows),
+            'upstream': len(upstream),
+            'cached': sum(1 for r in rows if r.get('engine') == 'cache'),
+            'local': sum(1 for r in rows if r.get('engine') == 'local'),
+            'fallbacks': sum(1 for r in rows if r.get('fallback')),
+            'cancelled': sum(1 for r in rows if r.get('cancelled')),
+            'tiers': {tier: sum(1 for r in rows if r.get('tier') == tier) for tier in ('reasoner', 'fast', 'local')},
+            'hedged': sum(1 for r in upstream if r.get('hedges')),
+            'hedgeWins': sum(1 for r in upstream if r.get('hedgeWon')),
+            'tokens': totals,
+            'avgTokensPerSeries': {f: round(v / len(upstream), 1) for f, v in totals.items()} if upstream else None,
+            'promptCacheHitRate': round(totals['cacheHitTokens'] / totals['promptTokens'], 4) if totals['promptTokens'] else None,
+            'latency': latency
+        }
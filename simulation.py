@@ -0,0 +1,795 @@
+# ========================================
+# 系列赛模拟 - 提示词、结果解析与模拟流
+# ========================================
+# /api/simulate-series（SSE）和 start_battle（WebSocket）共用这里的模拟逻辑：
+# Simulator.stream() 产出统一的事件字典（reasoning / content / result），
+# 由调用方决定通过 SSE 还是 socket 发送。相同对阵同时发起的多个请求
+# 共享一个上游流（SimulationRun），事件扇出给每个订阅者。
+
+import re
+import json
+import time
+import hashlib
+import threading
+
+from scheduler import PRIORITY_LIVE
+from stream_json import IncrementalResultParser
+from hedged_stream import HedgedStream
+from tiering import TIER_REASONER, TIER_FAST, TIER_LOCAL
+from sim_metrics import usage_dict
+
+POSITIONS = ['PG', 'SG', 'SF', 'PF', 'C']
+
+# 比赛规则和输出格式：完整提示词（推理模型）和快速提示词（非推理模型）共用，结果结构一致
+SERIES_RULES = """【比赛规则】
+- 10名球员全部打满48分钟，无换人
+- 第1、2、5、7场为team1主场，第3、4、6场为team2主场
+- 系列赛先赢4场者夺冠
+
+"""
+
+OUTPUT_FORMAT = """【输出格式 - 严格按JSON返回】
+{
+    "teamAnalysis": {
+        "team1": {
+            "spacing": "空间评价(优秀/良好/一般/较差)",
+            "playmaking": "组织评价",
+            "offense": "进攻评价",
+            "defense": "防守评价",
+            "chemistry": "化学反应评价",
+            "starPower": "球星成色评价",
+            "strengths": "主要优势",
+            "weaknesses": "主要弱点"
+        },
+        "team2": {同上},
+        "keyMatchups": "关键对位分析",
+        "prediction": "赛前预测和理由"
+    },
+    "champion": 1或2,
+    "finalScore": {"team1Wins": 胜场数, "team2Wins": 胜场数},
+    "games": [
+        {
+            "gameNumber": 场次,
+            "winner": 1或2,
+            "score": {"team1": 得分, "team2": 得分},
+            "keyFactor": "本场胜负关键因素"
+        }
+    ],
+    "fmvp": {
+        "name": "总决赛MVP球员名",
+        "team": 1或2,
+        "avgStats": {"points": 场均得分, "rebounds": 场均篮板, "assists": 场均助攻},
+        "reason": "获选理由(50字内)"
+    },
+    "summary": "系列赛总结(100字左右)"
+}
+
+【重要】你必须严格按照JSON格式返回结果。"""
+
+# 系统提示词：分析维度、比赛规则和输出格式都与具体阵容无关，所有请求逐字节相同，
+# 作为共享前缀可以命中上游的上下文缓存（DeepSeek 按前缀计费减免）
+SYSTEM_PROMPT = """你是一位顶级NBA战术分析师和数据专家，拥有深厚的篮球战术理解和历史知识。你需要模拟NBA总决赛BO7系列赛。
+
+【⚠️ 核心规则 - 严格按赛季状态模拟】
+球员名称格式为"XX赛季的XX球员"，必须严格按照该赛季该球队的真实状态模拟！
+
+🔴 **同一球员不同赛季差异巨大，必须区分：**
+- 火箭大梦(1994) vs 猛龙大梦(2001)：巅峰统治力 vs 职业末期角色球员
+- 热火詹姆斯(2013) vs 湖人詹姆斯(2023)：巅峰身体素质 vs 老年智慧型打法
+- 公牛乔丹(1996) vs 奇才乔丹(2002)：历史最佳 vs 退役复出
+- 湖人科比(2006) vs 湖人科比(2015)：得分王 vs 跟腱断裂后
+- 马刺邓肯(2003) vs 马刺邓肯(2015)：攻防一体 vs 防守蓝领
+
+📊 **模拟时必须考虑该赛季的：**
+- 球员年龄和身体状态（爆发力、速度、耐久性）
+- 在球队的角色定位（核心/二当家/角色球员）
+- 该赛季的真实数据表现（得分、效率、出场时间）
+- 伤病影响（大伤后的球员能力会明显下降）
+- 球队体系中的战术地位
+
+【🏀 球队战术体系分析维度】
+你必须从以下维度深入分析双方球队，并据此模拟比赛：
+
+1. **空间与投射**
+   - 场上球员的三分/中投威胁如何？能否拉开空间？
+   - 是否有多个投射点？还是空间拥挤？
+   - 内线球员是否有投射能力？会不会堵塞禁区？
+
+2. **组织与传球**
+   - 谁是主要组织者？组织能力如何？
+   - 传球视野和失误控制
+   - 是否有多个持球点？还是过度依赖单一组织者？
+
+3. **进攻火力**
+   - 得分手段是否多样？（突破、中投、三分、背身）
+   - 进攻效率和终结能力
+   - 关键时刻的得分能力（clutch能力）
+
+4. **防守体系**
+   - 个人防守能力：护框、外线防守、协防意识
+   - 是否有防守漏洞？错位会被针对吗？
+   - 篮板球控制能力
+
+5. **球权分配与化学反应**
+   - 核心球员是谁？球权如何分配？
+   - 多个球星是否能共存？会不会球权冲突？
+   - 球员打法是否兼容？是否互补？
+
+6. **球星成色与赛季状态**
+   - 该赛季球员处于什么阶段？（巅峰/上升期/下滑期/末期）
+   - 球员的历史地位和荣誉
+   - 季后赛/总决赛大赛经验
+   - 领袖气质和关键球能力
+   - ⚠️ 注意：同一球员不同赛季实力可能天差地别！
+
+【🎯 模拟原则】
+1. 阵容搭配合理的球队有优势（空间+组织+防守平衡）
+2. 球星扎堆但不兼容的阵容会有问题（球权冲突、空间拥挤）
+3. 有明显防守漏洞的球队会被针对
+4. 系列赛要有起伏，体现真实的竞技对抗
+5. 考虑主场优势（1、2、5、7场为team1主场）
+
+【🏆 FMVP评选标准】
+- 必须来自冠军球队
+- 综合考虑：场均数据、关键比赛表现、对胜利的贡献度
+- 不一定是数据最好的球员，而是对夺冠贡献最大的球员
+
+""" + SERIES_RULES + OUTPUT_FORMAT
+
+# 快速提示词：高峰期 / 快速模式给非推理模型使用，省略分析维度说明，只保留要点
+FAST_SYSTEM_PROMPT = """你是NBA战术分析师，需要快速模拟NBA总决赛BO7系列赛。
+球员名称格式为"XX赛季的XX球员"，按该赛季的真实状态（年龄、角色、数据、伤病）模拟。
+综合空间与投射、组织、进攻、防守、化学反应、球星成色判断胜负，系列赛要有起伏；FMVP必须来自冠军球队。
+
+""" + SERIES_RULES + OUTPUT_FORMAT
+
+
+
+# 用户消息只包含与阵容有关的内容，规则和输出格式都在 SYSTEM_PROMPT 中
+SERIES_PROMPT_TEMPLATE = """请模拟以下两支球队的NBA总决赛BO7系列赛（team1 = {p1_name}，team2 = {p2_name}）：
+
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+【{p1_name}阵容】
+{team1_desc}
+
+【{p2_name}阵容】
+{team2_desc}
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+
+第1、2、5、7场为{p1_name}主场，第3、4、6场为{p2_name}主场。
+
+【{p1_name}球员】：{team1_players}
+【{p2_name}球员】：{team2_players}"""
+
+
+def build_simple_series_prompt(team1, team2, player_names):
+    """构建简化版系列赛的提示词 - 只要结果和统计"""
+    p1_name = player_names.get('1', 'A组')
+    p2_name = player_names.get('2', 'B组')
+    return SERIES_PROMPT_TEMPLATE.format(
+        p1_name=p1_name,
+        p2_name=p2_name,
+        team1_desc=format_team(team1, p1_name),
+        team2_desc=format_team(team2, p2_name),
+        team1_players=format_player_list(team1),
+        team2_players=format_player_list(team2)
+    )
+
+
+def build_messages(team1, team2, player_names, fast=False):
+    """上游请求的消息列表：系统提示词逐字节固定在最前面，可以命中上游的前缀缓存；fast=True 时使用快速提示词"""
+    return [
+        {"role": "system", "content": FAST_SYSTEM_PROMPT if fast else SYSTEM_PROMPT},
+        {"role": "user", "content": build_simple_series_prompt(team1, team2, player_names)}
+    ]
+
+
+def format_team(team, team_name):
+    """格式化球队阵容描述 - 简洁格式，让AI客观判断球员实力"""
+    positions = {
+        'PG': '控球后卫',
+        'SG': '得分后卫', 
+        'SF': '小前锋',
+        'PF': '大前锋',
+        'C': '中锋'
+    }
+    
+    lines = []
+    
+    for pos, pos_name in positions.items():
+        player = team.get(pos)
+        if player:
+            peak_season = player.get('peakSeason', '未知')
+            # 只提供球员名字和赛季，让AI根据历史知识客观判断
+            lines.append(f"- {pos_name}: {peak_season}赛季的{player['name']} ({player['nameEn']})")
+    
+    return "\n".join(lines)
+
+
+def format_player_list(team):
+    """格式化球员列表 - 简洁格式"""
+    positions = ['PG', 'SG', 'SF', 'PF', 'C']
+    players = []
+    for pos in positions:
+        player = team.get(pos)
+        if player:
+            peak = player.get('peakSeason', '未知')
+            players.append(f"{peak}赛季的{player['name']}")
+    return "、".join(players)
+
+
+def try_extract_json(text):
+    """从文本中提取JSON，失败返回 None"""
+    # 尝试直接解析
+    try:
+        return json.loads(text)
+    except:
+        pass
+    
+    # 尝试提取JSON块
+    json_patterns = [
+        r'```json\s*([\s\S]*?)\s*```',
+        r'```\s*([\s\S]*?)\s*```',
+        r'\{[\s\S]*\}'
+    ]
+    
+    for pattern in json_patterns:
+        matches = re.findall(pattern, text)
+        for match in matches:
+            try:
+                return json.loads(match)
+            except:
+                continue
+    
+    return None
+
+
+def extract_json(text):
+    """从文本中提取JSON，失败时返回默认结果"""
+    result = try_extract_json(text)
+    if result is not None:
+        return result
+    
+    # 返回默认结果（系列赛格式）
+    print("[extract_json] WARNING: 使用默认结果", flush=True)
+    return {
+        "teamAnalysis": {
+            "team1": {"spacing": "未知", "playmaking": "未知", "offense": "未知", "defense": "未知", "chemistry": "未知", "starPower": "未知", "strengths": "未知", "weaknesses": "未知"},
+            "team2": {"spacing": "未知", "playmaking": "未知", "offense": "未知", "defense": "未知", "chemistry": "未知", "starPower": "未知", "strengths": "未知", "weaknesses": "未知"},
+            "keyMatchups": "未知",
+            "prediction": "未知"
+        },
+        "champion": 1,
+        "finalScore": {"team1Wins": 4, "team2Wins": 0},
+        "games": [],
+        "fmvp": {"name": "未知MVP", "team": 1, "avgStats": {"points": 0, "rebounds": 0, "assists": 0}, "reason": "AI未能生成详细结果"},
+        "summary": "AI未能生成详细结果，使用默认数据"
+    }
+
+
+def prompt_template_hash(fast=False):
+    """提示词模板的哈希，模板变化后旧的缓存结果自动失效"""
+    template = build_simple_series_prompt({}, {}, {'1': '{team1}', '2': '{team2}'})
+    system = FAST_SYSTEM_PROMPT if fast else SYSTEM_PROMPT
+    return hashlib.sha1((system + '\x00' + template).encode('utf-8')).hexdigest()[:12]
+
+
+def _lineup_signature(team):
+    signature = []
+    for pos in POSITIONS:
+        player = team.get(pos) or {}
+        signature.append([pos, player.get('id', player.get('nameEn')), player.get('peakSeason')])
+    return signature
+
+
+def matchup_key(team1, team2, template_hash=None):
+    """对阵指纹：双方每个位置的 球员ID + 赛季，加上提示词模板哈希"""
+    canonical = json.dumps({
+        'team1': _lineup_signature(team1),
+        'team2': _lineup_signature(team2),
+        'template': template_hash or prompt_template_hash()
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+TEXT_EVENTS = ('reasoning', 'content')
+
+
+def _record(events, event, max_chunk=2048):
+    """录制流式事件，相邻同类文本片段合并，减少缓存体积和回放帧数
+
+    片段先追加到列表里，录制结束后由 _recorded_events 一次性拼接，避免反复 += 字符串。
+    """
+    if event['type'] not in TEXT_EVENTS:
+        events.append(event)
+        return
+    last = events[-1] if events else None
+    if last is not None and last['type'] == event['type'] and 'parts' in last and last['size'] < max_chunk:
+        last['parts'].append(event['content'])
+        last['size'] += len(event['content'])
+    else:
+        events.append({'type': event['type'], 'parts': [event['content']], 'size': len(event['content'])})
+
+
+def _recorded_events(events):
+    return [{'type': e['type'], 'content': ''.join(e['parts'])} if 'parts' in e else e for e in events]
+
+
+class StreamCoalescer:
+    """把逐 token 的 reasoning / content 事件合并后再投递
+
+    缓冲区累计超过 max_chars 个字符，或者距第一个缓冲片段超过 max_delay 秒时输出一帧；
+    事件类型切换或遇到其他事件（queue / result ...）时先输出缓冲内容，保证顺序不变。
+    max_chars 或 max_delay 为 0 时不合并。
+    """
+
+    def __init__(self, max_chars=2048, max_delay=0.05):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._type = None
+        self._parts = []
+        self._size = 0
+        self._since = None
+
+    @property
+    def enabled(self):
+        return self.max_chars > 0 and self.max_delay > 0
+
+    def flush(self):
+        if not self._parts:
+            return []
+        event = {'type': self._type, 'content': ''.join(self._parts)}
+        self._type, self._parts, self._size, self._since = None, [], 0, None
+        return [event]
+
+    def feed(self, event):
+        """输入一个事件，返回此刻需要投递的事件列表"""
+        if event['type'] not in TEXT_EVENTS or len(event) != 2:
+            return self.flush() + [event]
+        out = self.flush() if event['type'] != self._type else []
+        if not self._parts:
+            self._type = event['type']
+            self._since = time.monotonic()
+        self._parts.append(event['content'])
+        self._size += len(event['content'])
+        if self._size >= self.max_chars:
+            out += self.flush()
+        else:
+            out += self.tick()
+        return out
+
+    def tick(self):
+        """时间窗口到期时输出缓冲内容"""
+        if self._parts and time.monotonic() - self._since >= self.max_delay:
+            return self.flush()
+        return []
+
+    def wrap(self, events):
+        """包装事件迭代器；迭代器产出 None 表示没有新事件，只用于检查时间窗口"""
+        if not self.enabled:
+            yield from (event for event in events if event is not None)
+            return
+        try:
+            for event in events:
+                yield from (self.tick() if event is None else self.feed(event))
+        except Exception:
+            # 出错前先把已缓冲的内容投递出去
+            yield from self.flush()
+            raise
+        yield from self.flush()
+
+
+class SimulationError(Exception):
+    """上游模拟失败，所有订阅者都会收到同一个错误"""
+
+
+class SimulationCancelled(Exception):
+    """模拟已取消（没有订阅者或结果被取代）"""
+
+
+class SimulationRun:
+    """一次上游模拟流，可以有多个订阅者
+
+    生产者线程把事件追加到 events，订阅者按自己的进度读取；
+    中途加入的订阅者会先收到之前错过的全部事件，再继续实时接收。
+    """
+
+    def __init__(self, key, matchup=None, tier=TIER_REASONER, tier_reason=None, scheduler=None):
+        self.key = key
+        self.matchup = matchup or key  # 与档位无关的对阵指纹（推理模型提示词下的 key）
+        self.tier = tier
+        self.tier_reason = tier_reason
+        self.scheduler = scheduler  # 该档位的调度器
+        self.owners = set()  # 订阅过这次模拟的来源（房间 / HTTP 客户端 / 赛事），用于按来源统计
+        self.listeners = {}  # 仍在接收的来源 -> 订阅数，全部离开后取消上游流
+        self.ticket = None  # 排队中的调度器名额，用于合并时提升优先级
+        self.response = None  # 上游 HTTP 流，取消时从外部关闭
+        self.cancelled = None  # 取消原因
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self._cond = threading.Condition()
+
+    def publish(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def subscribe(self, tick=None):
+        """按顺序产出事件；设置 tick 时，每等待 tick 秒仍没有新事件就产出一个 None"""
+        with self._cond:
+            self.subscribers += 1
+        try:
+            pos = 0
+            while True:
+                with self._cond:
+                    while pos >= len(self.events) and not self.done:
+                        if not self._cond.wait(tick) and tick is not None:
+                            break
+                    batch = self.events[pos:]
+                    pos = len(self.events)
+                    finished = self.done
+                    error = self.error
+                if not batch and not finished:
+                    yield None
+                    continue
+                for event in batch:
+                    yield dict(event)
+                if finished and pos >= len(self.events):
+                    if error is not None:
+                        raise SimulationError(error)
+                    return
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+
+class Simulator:
+    """调用 LLM 模拟系列赛
+
+    - 命中结果缓存时直接回放录制的思考/输出流
+    - 相同对阵同时只有一个上游请求，其余请求订阅同一个 SimulationRun
+    - 设置 scheduler 后上游请求需要先排队申请名额，排队期间产出 queue 事件
+    - 设置 tier_policy 后在线请求按负载选择档位：推理模型 / 快速模型（fast_model，名额由 fast_scheduler 控制）/ 本地引擎
+    """
+
+    def __init__(self, client_factory, cache=None, model='deepseek-reasoner', local_engine=None, scheduler=None, metrics=None, archive=None,
+                 hedge_after=None, max_hedges=1, stall_timeout=None, fast_model=None, fast_scheduler=None, tier_policy=None):
+        self.client_factory = client_factory
+        self.fast_model = fast_model
+        self.fast_scheduler = fast_scheduler or scheduler
+        self.tier_policy = tier_policy
+        self.hedge_after = hedge_after  # 首 token 超过该秒数发起对冲请求，None / 0 关闭
+        self.max_hedges = max_hedges
+        self.stall_timeout = stall_timeout  # 输出中途 chunk 间隔超过该秒数视为停滞
+        self.metrics = metrics
+        self.archive = archive
+        self.cache = cache
+        self.model = model
+        self.local_engine = local_engine
+        self.scheduler = scheduler
+        self.template_hash = prompt_template_hash()
+        self.fast_template_hash = prompt_template_hash(fast=True)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def stream(self, team1, team2, player_names, mode='ai', priority=PRIORITY_LIVE, owner=None, timeout=None, delivery=None, quick=False):
+        """逐个产出事件：{'type': 'reasoning'|'content', 'content': ...}，最后是 {'type': 'result', 'data': ...}
+
+        mode='local' 时不调用 LLM，直接返回本地蒙特卡洛引擎的结果。
+        quick=True（房间快速模式）时不使用推理模型；降级到快速模型 / 本地引擎时先产出
+        {'type': 'tier', 'tier': 档位, 'model': 模型, 'reason': 原因}，结果中的 tier 字段记录实际使用的档位。
+        priority / owner 用于调度器排队（在线房间优先，同优先级按来源轮转），
+        timeout 为从现在起的排队截止秒数，排队超时后改用本地引擎兜底；开始上游流后不再受它限制，
+        输出停滞由看门狗（stall_timeout）处理，避免用户看了几分钟思考后结果被截断。
+        排队期间会产出 {'type': 'queue', 'position': 排位, 'estimatedWait': 预计等待秒数}。
+        delivery=(最大字符数, 最长延迟秒数) 时按大小/时间窗口合并 reasoning / content 片段后再产出。
+        """
+        coalescer = StreamCoalescer(*delivery) if delivery else None
+        if coalescer is None or not coalescer.enabled:
+            return self._events(team1, team2, player_names, mode, priority, owner, timeout, quick=quick)
+        return coalescer.wrap(self._events(team1, team2, player_names, mode, priority, owner, timeout, tick=coalescer.max_delay, quick=quick))
+
+    def choose_tier(self, priority=PRIORITY_LIVE, quick=False):
+        """按负载为新请求选择档位，返回 (档位, 原因)；批量赛事不降级"""
+        if self.tier_policy is None or (priority != PRIORITY_LIVE and not quick):
+            return TIER_REASONER, None
+        reasoner_wait = self.scheduler.expected_wait(priority) if self.scheduler is not None else 0
+        fast_wait = None
+        if self.fast_model:
+            fast_wait = self.fast_scheduler.expected_wait(priority) if self.fast_scheduler is not None else 0
+        latency = self.scheduler.avg_duration if self.scheduler is not None and self.scheduler.admitted else None
+        tier, reason = self.tier_policy.choose(reasoner_wait, fast_wait, latency, quick)
+        if tier == TIER_LOCAL and self.local_engine is None:
+            tier = TIER_FAST if self.fast_model else TIER_REASONER
+        return tier, reason
+
+    def _events(self, team1, team2, player_names, mode, priority, owner, timeout, tick=None, quick=False):
+        key = matchup_key(team1, team2, self.template_hash)
+        started = time.time()
+        if mode == 'local' and self.local_engine is not None:
+            result = self.local_engine.simulate(team1, team2)
+            result['tier'] = TIER_LOCAL
+            yield {'type': 'result', 'data': result, 'engine': 'local', 'tier': TIER_LOCAL}
+            self._finish({'key': key, 'owners': [owner] if owner else [], 'engine': 'local', 'tier': TIER_LOCAL, 'startedAt': started,
+                          'durationSeconds': round(time.time() - started, 3)}, team1, team2, player_names, result)
+            return
+
+        tier, reason = self.choose_tier(priority, quick)
+        fast_key = matchup_key(team1, team2, self.fast_template_hash) if self.fast_model else None
+        # 推理模型的缓存结果总是最好的；降级时快速模型的缓存结果也可以直接用
+        for cache_key in ([key] if tier == TIER_REASONER or fast_key is None else [key, fast_key]):
+            cached = self.cache.get(cache_key) if self.cache is not None else None
+            if cached is None:
+                continue
+            print(f"[模拟] 命中结果缓存 {cache_key[:12]}，回放录制的模拟过程", flush=True)
+            for event in cached['events']:
+                yield dict(event)
+            yield {'type': 'result', 'data': cached['result'], 'cached': True, 'tier': cached['result'].get('tier', TIER_REASONER)}
+            self._finish({'key': cache_key, 'owners': [owner] if owner else [], 'engine': 'cache', 'startedAt': started,
+                          'durationSeconds': round(time.time() - started, 3)}, team1, team2, player_names, cached['result'])
+            return
+
+        if tier != TIER_REASONER:
+            print(f"[模拟] 对阵 {key[:12]} 降级到 {tier} 档位: {reason}", flush=True)
+            yield {'type': 'tier', 'tier': tier, 'model': self.fast_model if tier == TIER_FAST else None, 'reason': reason}
+        if tier == TIER_LOCAL:
+            result = self.local_engine.simulate(team1, team2)
+            result['tier'] = TIER_LOCAL
+            result['tierReason'] = reason
+            yield {'type': 'result', 'data': result, 'engine': 'local', 'tier': TIER_LOCAL, 'tierReason': reason}
+            self._finish({'key': key, 'owners': [owner] if owner else [], 'engine': 'local', 'tier': TIER_LOCAL,
+                          'tierReason': reason, 'startedAt': started, 'durationSeconds': round(time.time() - started, 3)},
+                         team1, team2, player_names, result)
+            return
+
+        matchup = key
+        scheduler = self.scheduler
+        if tier == TIER_FAST:
+            key = fast_key
+            scheduler = self.fast_scheduler
+        with self._lock:
+            run = self._inflight.get(key)
+            if run is None:
+                run = SimulationRun(key, matchup, tier, reason, scheduler)
+                run.owners.add(owner)
+                run.listeners[owner] = 1
+                self._inflight[key] = run
+                if timeout is None and scheduler is not None:
+                    timeout = scheduler.default_deadline
+                deadline = time.time() + timeout if timeout else None
+                threading.Thread(target=self._produce, args=(run, team1, team2, player_names, priority, owner, deadline), daemon=True).start()
+            else:
+                self.coalesced += 1
+                print(f"[模拟] 对阵 {key[:12]} 已在模拟中，合并到同一个上游请求", flush=True)
+                run.owners.add(owner)
+                run.listeners[owner] = run.listeners.get(owner, 0) + 1
+                if run.ticket is not None and run.scheduler is not None:
+                    run.scheduler.promote(run.ticket, priority)
+
+        try:
+            yield from run.subscribe(tick)
+        finally:
+            # 订阅者提前离开（客户端断开、对战被放弃）；没有人再接收时关闭上游流
+            self._leave(run, owner)
+
+    def _leave(self, run, owner):
+        with self._lock:
+            count = run.listeners.get(owner, 0) - 1
+            if count > 0:
+                run.listeners[owner] = count
+            else:
+                run.listeners.pop(owner, None)
+            if not run.listeners and not run.done:
+                self._cancel_run(run, '没有订阅者')
+
+    def cancel(self, owner, reason, key=None):
+        """来源不再需要结果（房间删除 / 重新开始 / 结果被取代）：
+        撤销它对进行中模拟的订阅，没有其他来源时取消上游流。返回取消的模拟数"""
+        count = 0
+        with self._lock:
+            for run in list(self._inflight.values()):
+                if owner not in run.listeners or (key is not None and run.matchup != key):
+                    continue
+                del run.listeners[owner]
+                if not run.listeners and not run.done:
+                    self._cancel_run(run, reason)
+                    count += 1
+        return count
+
+    def _cancel_run(self, run, reason):
+        """调用方需持有 self._lock"""
+        if run.cancelled is not None:
+            return
+        run.cancelled = reason
+        self.cancelled += 1
+        print(f"[模拟] 取消对阵 {run.key[:12]} 的上游模拟: {reason}", flush=True)
+        if self._inflight.get(run.key) is run:
+            # 新的同对阵请求不再合并到将被取消的模拟
+            del self._inflight[run.key]
+        if run.ticket is not None and run.scheduler is not None:
+            run.scheduler.cancel(run.ticket)
+        if run.response is not None:
+            try:
+                run.response.close()
+            except Exception:
+                pass
+
+    def _produce(self, run, team1, team2, player_names, priority=PRIORITY_LIVE, owner=None, deadline=None):
+        """在后台线程中消费上游流，并把事件分发给所有订阅者"""
+        ticket = None
+        fast = run.tier == TIER_FAST
+        model = self.fast_model if fast else self.model
+        stats = {'key': run.key, 'engine': 'ai', 'model': model, 'tier': run.tier, 'tierReason': run.tier_reason, 'startedAt': time.time(),
+                 'queueSeconds': None, 'firstReasoningSeconds': None, 'firstContentSeconds': None,
+                 'durationSeconds': None, 'usage': None, 'fallback': False}
+        try:
+            if run.scheduler is not None:
+                ticket = run.scheduler.acquire(
+                    priority, owner, deadline,
+                    on_position=lambda position, wait: run.publish({'type': 'queue', 'position': position, 'estimatedWait': wait}),
+                    on_enqueue=lambda t: setattr(run, 'ticket', t)
+                )
+                run.ticket = None
+            if run.cancelled is not None:
+                raise SimulationCancelled(run.cancelled)
+            begun = time.time()
+            stats['queueSeconds'] = round(begun - stats['startedAt'], 3)
+            client = self.client_factory()
+            messages = build_messages(team1, team2, player_names, fast=fast)
+
+            def on_hedge(count, waited):
+                print(f"[模拟] 对阵 {run.key[:12]} 等待 {waited:.1f} 秒仍无首个 token，发起第 {count} 个对冲请求", flush=True)
+
+            # 首 token 超时自动对冲，先出 token 的流胜出；输出中途停滞超过阈值时放弃
+            response = HedgedStream(
+                lambda: client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={'include_usage': True}
+                ),
+                hedge_after=self.hedge_after, max_hedges=self.max_hedges, stall_timeout=self.stall_timeout,
+                is_cancelled=lambda: run.cancelled is not None, on_hedge=on_hedge
+            )
+            run.response = response
+
+            recorded = []
+            final_parts = []  # 只在增量解析失败时用于整体解析
+            parser = IncrementalResultParser()
+            for chunk in response:
+                if run.cancelled is not None:
+                    raise SimulationCancelled(run.cancelled)
+                if getattr(chunk, 'usage', None) is not None:
+                    stats['usage'] = usage_dict(chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                reasoning = getattr(delta, 'reasoning_content', None)
+                if reasoning:
+                    if stats['firstReasoningSeconds'] is None:
+                        stats['firstReasoningSeconds'] = round(time.time() - begun, 3)
+                    event = {'type': 'reasoning', 'content': reasoning}
+                    _record(recorded, event)
+                    run.publish(event)
+                elif delta.content:
+                    if stats['firstContentSeconds'] is None:
+                        stats['firstContentSeconds'] = round(time.time() - begun, 3)
+                    final_parts.append(delta.content)
+                    event = {'type': 'content', 'content': delta.content}
+                    _record(recorded, event)
+                    run.publish(event)
+                    # 每个子对象（赛前分析 / 单场比赛 / FMVP / 总结）一完整就推送
+                    for event in parser.feed(delta.content):
+                        _record(recorded, event)
+                        run.publish(event)
+            if run.cancelled is not None:
+                raise SimulationCancelled(run.cancelled)
+
+            result = parser.final_result()
+            if result is None:
+                result = try_extract_json(''.join(final_parts))
+            if result is None:
+                print(f"[模拟] 对阵 {run.key[:12]} 的 AI 输出无法解析为 JSON", flush=True)
+                stats['fallback'] = True
+                self._publish_fallback(run, team1, team2)
+                return
+            if self.local_engine is not None:
+                # 本地模型的胜率统计作为先验参考附在 AI 结果旁边；只是参考，算不出来也不影响 AI 结果
+                try:
+                    result['localPrior'] = self.local_engine.prior(team1, team2)
+                except Exception as e:
+                    print(f"[模拟] 对阵 {run.key[:12]} 的本地先验计算失败: {e}", flush=True)
+            result['tier'] = run.tier
+            if run.tier_reason:
+                result['tierReason'] = run.tier_reason
+            if self.cache is not None:
+                # 只缓存成功解析的结果，兜底结果不缓存
+                self.cache.put(run.key, {'events': _recorded_events(recorded), 'result': result, 'created_at': time.time()})
+            run.publish({'type': 'result', 'data': result, 'tier': run.tier})
+            run.finish()
+        except Exception as e:
+            if run.cancelled is not None:
+                # 已取消：上游流已关闭，没有订阅者需要兜底结果
+                stats['cancelled'] = run.cancelled
+                run.finish(error=f'模拟已取消: {run.cancelled}')
+                return
+            import traceback
+            traceback.print_exc()
+            stats['error'] = str(e)
+            if self.local_engine is not None:
+                print(f"[模拟] 上游调用失败，改用本地引擎结果: {e}", flush=True)
+                stats['fallback'] = True
+                self._publish_fallback(run, team1, team2, str(e))
+            else:
+                run.finish(error=str(e))
+        finally:
+            if not run.done:
+                # 兜底过程本身出错时也要结束，否则合并到这次模拟的订阅者会一直等待
+                run.finish(error=stats.get('error') or '模拟异常结束')
+            if ticket is not None:
+                run.scheduler.release(ticket)
+            if isinstance(run.response, HedgedStream) and run.response.hedges:
+                stats['hedges'] = run.response.hedges
+                # None 表示所有请求都没有产出 token
+                stats['hedgeWon'] = None if run.response.winner is None else run.response.winner.index > 0
+            stats['durationSeconds'] = round(time.time() - stats['startedAt'], 3)
+            with self._lock:
+                if self._inflight.get(run.key) is run:
+                    del self._inflight[run.key]
+                stats['owners'] = sorted(o for o in run.owners if o is not None)
+            result_event = next((e for e in reversed(run.events) if e['type'] == 'result'), None)
+            reasoning = ''.join(e['content'] for e in run.events if e['type'] == 'reasoning')
+            self._finish(stats, team1, team2, player_names, result_event and result_event['data'], reasoning)
+
+    def _finish(self, stats, team1, team2, player_names, result, reasoning=None):
+        """记录耗费统计，并把完成的模拟写入归档
+
+        缓存回放不是新的模拟，只计入统计不归档；合并到同一上游流的多个订阅者由 _produce 统一归档一次。
+        """
+        if self.metrics is not None:
+            self.metrics.record(stats)
+        if self.archive is not None and result is not None and stats.get('engine') != 'cache':
+            self.archive.record(stats, team1, team2, player_names, result, reasoning)
+
+    def _publish_fallback(self, run, team1, team2, error=None):
+        """发布兜底结果并结束模拟；兜底结果也生成失败（例如阵容数据异常）时以错误结束"""
+        try:
+            event = self._fallback_event(team1, team2, error)
+        except Exception as e:
+            print(f"[模拟] 对阵 {run.key[:12]} 的兜底结果生成失败: {e}", flush=True)
+            run.finish(error=error or f'兜底结果生成失败: {e}')
+            return
+        run.publish(event)
+        run.finish()
+
+    def _fallback_event(self, team1, team2, error=None):
+        """AI 不可用时的结果：优先使用本地引擎，没有本地引擎时才使用默认结果"""
+        if self.local_engine is None:
+            return {'type': 'result', 'data': extract_json('')}
+        event = {'type': 'result', 'data': self.local_engine.simulate(team1, team2), 'engine': 'local', 'fallback': True}
+        if error:
+            event['upstreamError'] = error
+        return event
+
+    def promote(self, team1, team2, priority=PRIORITY_LIVE):
+        """提高同一对阵排队中请求的优先级（例如预先模拟的房间按下了开始）"""
+        matchup = matchup_key(team1, team2, self.template_hash)
+        with self._lock:
+            runs = [run for run in self._inflight.values() if run.matchup == matchup]
+        for run in runs:
+            if run.ticket is not None and run.scheduler is not None:
+                run.scheduler.promote(run.ticket, priority)
+
+    def inflight_count(self):
+        with self._lock:
+            return len(self._inflight)
@@ -0,0 +1,108 @@
+# ========================================
+# 静态资源 - 预压缩 + 内容指纹
+# ========================================
+# 启动时把前端资源读入内存，预先生成 gzip（以及安装了 brotli 时的 br）版本，
+# 并按内容哈希生成带指纹的 URL（assets/script.<hash>.js）。index.html 中的
+# 引用会被改写为指纹 URL，指纹资源可以设置 immutable 长缓存。
+# 源文件 mtime 变化（例如 players.js 被重写）时自动重建对应资源和 index.html。
+
+import os
+import re
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli 是可选依赖
+    brotli = None
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+}
+
+# 只有这些文件可以通过 HTTP 访问，其他文件（server.py、.env 等）一律 404
+DEFAULT_ASSETS = ['index.html', 'script.js', 'styles.css', 'players.js']
+_FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[a-z]+)$')
+
+
+class Asset:
+    def __init__(self, name, body, stamp):
+        self.name = name
+        self.stamp = stamp
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+        self.hash = hashlib.sha1(body).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        self.fingerprinted = f'{stem}.{self.hash}{ext}'
+        self.variants = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(body, quality=11)
+
+
+class StaticAssets:
+    def __init__(self, root, names=None, entry='index.html'):
+        self.root = root
+        self.names = list(names or DEFAULT_ASSETS)
+        self.entry = entry
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, name):
+        st = os.stat(os.path.join(self.root, name))
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read(self, name):
+        with open(os.path.join(self.root, name), 'rb') as f:
+            return f.read()
+
+    def _build_entry(self, stamp):
+        """index.html 中的本地资源引用改写为指纹 URL"""
+        html = self._read(self.entry).decode('utf-8')
+        for name in self.names:
+            if name == self.entry:
+                continue
+            asset = self._assets[name]
+            html = re.sub(rf'(\b(?:src|href)=["\']){re.escape(name)}(["\'])',
+                          rf'\g<1>assets/{asset.fingerprinted}\g<2>', html)
+        return Asset(self.entry, html.encode('utf-8'), stamp)
+
+    def refresh(self):
+        """重建 mtime 发生变化的资源；任一被引用的资源变化时 index.html 也会重建"""
+        stamps = {name: self._stamp(name) for name in self.names}
+        if all(name in self._assets and self._assets[name].stamp == stamp for name, stamp in stamps.items()):
+            return False
+        with self._lock:
+            changed = []
+            for name in self.names:
+                if name == self.entry:
+                    continue
+                current = self._assets.get(name)
+                if current is None or current.stamp != stamps[name]:
+                    self._assets[name] = Asset(name, self._read(name), stamps[name])
+                    changed.append(name)
+            entry = self._assets.get(self.entry)
+            if changed or entry is None or entry.stamp != stamps[self.entry]:
+                self._assets[self.entry] = self._build_entry(stamps[self.entry])
+                changed.append(self.entry)
+            if changed:
+                print(f"[静态资源] 已重建: {', '.join(changed)}", flush=True)
+            return bool(changed)
+
+    def get(self, name):
+        """按原文件名取资源，不在白名单内返回 None"""
+        if name not in self.names:
+            return None
+        self.refresh()
+        return self._assets.get(name)
+
+    def get_fingerprinted(self, filename):
+        """按指纹文件名取资源，返回 (asset, 指纹是否为最新)"""
+        m = _FINGERPRINT_RE.match(filename)
+        if not m:
+            return None, False
+        asset = self.get(m.group('stem') + m.group('ext'))
+        if asset is None:
+            return None, False
+        return asset, asset.hash == m.group('hash')
@@ -0,0 +1,163 @@
+# ========================================
+# 增量 JSON 解析 - 边接收边解析系列赛结果
+# ========================================
+# 模型输出的 content 是一个 JSON 对象（可能包在 ```json 代码块里），字段顺序为
+# teamAnalysis → champion → finalScore → games → fmvp → summary。
+# 这里逐字符扫描输出流，顶层字段（以及 games 数组中的每一场）一旦完整就单独解析，
+# 立即产出 analysis / game / fmvp / summary 事件；最终结果由这些已解析的片段拼装，
+# 不需要在流结束后再整体解析一遍。
+
+import json
+
+# 顶层字段完成时产出的事件类型
+FIELD_EVENTS = {'teamAnalysis': 'analysis', 'fmvp': 'fmvp', 'summary': 'summary'}
+REQUIRED_KEYS = ('champion', 'finalScore', 'games')
+
+
+class IncrementalResultParser:
+    def __init__(self):
+        self.result = {}
+        self.done = False
+        self.failed = False
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._key_parts = None
+        self._key = None
+        self._capture = None      # 正在捕获的值（顶层字段或 games 中的一场）
+        self._capture_depth = 0
+        self._in_games = False
+
+    def feed(self, text):
+        """输入一段输出文本，返回新完成的结构化事件列表"""
+        events = []
+        if self.done or self.failed:
+            return events
+        for ch in text:
+            try:
+                event = self._step(ch)
+            except ValueError as e:
+                print(f"[增量解析] 解析失败，改为流结束后整体解析: {e}", flush=True)
+                self.failed = True
+                break
+            if event is not None:
+                events.append(event)
+            if self.done:
+                break
+        return events
+
+    def final_result(self):
+        """根对象已完整且包含必要字段时返回结果，否则返回 None"""
+        if self.done and not self.failed and all(k in self.result for k in REQUIRED_KEYS):
+            return self.result
+        return None
+
+    # ---------- 状态机 ----------
+
+    def _step(self, ch):
+        if not self._started:
+            if ch == '{':
+                self._started = True
+                self._depth = 1
+                self._expect_key = True
+            return None
+
+        if self._capture is not None:
+            self._capture.append(ch)
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == '\\':
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._key_parts is not None:
+                    self._key = json.loads('"' + ''.join(self._key_parts) + '"')
+                    self._key_parts = None
+                    return None
+                if self._capture is not None and self._depth == self._capture_depth:
+                    return self._complete()
+            if self._key_parts is not None:
+                self._key_parts.append(ch)
+            return None
+
+        if ch in ' \t\r\n':
+            return None
+
+        depth = self._depth
+        if ch == '"':
+            self._in_string = True
+            if depth == 1 and self._expect_key:
+                self._key_parts = []
+                self._expect_key = False
+                return None
+            return self._begin_value(ch)
+
+        if ch == ':':
+            return None
+
+        if ch == ',':
+            event = None
+            if self._capture is not None and depth == self._capture_depth:
+                # 数字 / true / false / null 以逗号结束
+                self._capture.pop()
+                event = self._complete()
+            if self._depth == 1:
+                self._expect_key = True
+            return event
+
+        if ch in '{[':
+            if self._capture is None:
+                if depth == 1 and self._key == 'games' and ch == '[':
+                    self._in_games = True
+                    self.result['games'] = []
+                    self._depth += 1
+                    return None
+                self._begin_value(ch)
+            self._depth += 1
+            return None
+
+        if ch in '}]':
+            event = None
+            if self._capture is not None and depth == self._capture_depth:
+                self._capture.pop()
+                event = self._complete()
+            self._depth -= 1
+            if self._in_games and self._depth == 1:
+                self._in_games = False
+                self._key = None
+            if self._depth == 0:
+                self.done = True
+            elif self._capture is not None and self._depth == self._capture_depth:
+                event = self._complete()
+            return event
+
+        # 数字 / true / false / null 的开头或中间字符
+        if self._capture is None:
+            self._begin_value(ch)
+        return None
+
+    def _begin_value(self, ch):
+        if self._capture is None and (self._depth == 1 or (self._in_games and self._depth == 2)):
+            self._capture = [ch]
+            self._capture_depth = self._depth
+        return None
+
+    def _complete(self):
+        """当前捕获的值已完整：解析并写入结果"""
+        value = json.loads(''.join(self._capture))
+        self._capture = None
+        if self._in_games:
+            value_index = len(self.result['games'])
+            self.result['games'].append(value)
+            return {'type': 'game', 'index': value_index, 'data': value}
+        key, self._key = self._key, None
+        if key is None:
+            return None
+        self.result[key] = value
+        if key in FIELD_EVENTS:
+            return {'type': FIELD_EVENTS[key], 'data': value}
+        return None
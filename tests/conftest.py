@@ -0,0 +1,8 @@
+# 测试直接导入仓库根目录下的模块
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入 server 时不创建模拟归档数据库
+os.environ.setdefault('SIM_ARCHIVE', '0')
@@ -0,0 +1,58 @@
+import numpy as np
+
+from local_engine import LocalEngine, player_rating, simulate_series_batch
+
+STRONG = {
+    'PG': {'id': 1, 'name': '魔术师', 'nameEn': 'Magic Johnson', 'cost': 5, 'positions': ['PG'], 'mvp': 3, 'allStar': 12},
+    'SG': {'id': 2, 'name': '乔丹', 'nameEn': 'Michael Jordan', 'cost': 6, 'positions': ['SG', 'SF'], 'mvp': 5, 'fmvp': 6},
+    'SF': {'id': 3, 'name': '詹姆斯', 'nameEn': 'LeBron James', 'cost': 6, 'positions': ['SF', 'PF'], 'mvp': 4, 'fmvp': 4},
+    'PF': {'id': 4, 'name': '邓肯', 'nameEn': 'Tim Duncan', 'cost': 5, 'positions': ['PF', 'C'], 'mvp': 2, 'fmvp': 3},
+    'C': {'id': 5, 'name': '奥尼尔', 'nameEn': "Shaquille O'Neal", 'cost': 5, 'positions': ['C'], 'mvp': 1, 'fmvp': 3},
+}
+WEAK = {
+    pos: {'id': 10 + i, 'name': f'替补{i}', 'nameEn': f'Bench {i}', 'cost': 1, 'positions': [pos]}
+    for i, pos in enumerate(['PG', 'SG', 'SF', 'PF', 'C'])
+}
+
+
+def test_same_seed_same_series():
+    engine = LocalEngine(simulations=2000)
+    assert engine.simulate(STRONG, WEAK, seed=7) == engine.simulate(STRONG, WEAK, seed=7)
+
+
+def test_series_result_is_a_valid_bo7():
+    engine = LocalEngine(simulations=500)
+    for seed in range(50):
+        result = engine.simulate(WEAK, WEAK, seed=seed)
+        score = result['finalScore']
+        wins = sorted([score['team1Wins'], score['team2Wins']])
+        assert wins[1] == 4 and 0 <= wins[0] <= 3
+        assert len(result['games']) == 4 + wins[0]
+        assert result['champion'] == (1 if score['team1Wins'] == 4 else 2)
+        for game in result['games']:
+            team1, team2 = game['score']['team1'], game['score']['team2']
+            assert team1 != team2
+            assert game['winner'] == (1 if team1 > team2 else 2)
+        # 夺冠一方在最后一场拿到第 4 胜
+        assert result['games'][-1]['winner'] == result['champion']
+        assert abs(sum(result['monteCarlo']['seriesDistribution'].values()) - 1) < 1e-3
+
+
+def test_batch_series_stop_at_four_wins():
+    wins1, games_played, champion1 = simulate_series_batch(90.0, 88.0, 5000, np.random.default_rng(1))
+    assert games_played.min() >= 4 and games_played.max() <= 7
+    for row, played, champ in zip(wins1, games_played, champion1):
+        team1_wins = int(row[:played].sum())
+        assert (team1_wins == 4) == bool(champ)
+        assert max(team1_wins, played - team1_wins) == 4
+
+
+def test_stronger_team_is_favoured():
+    prior = LocalEngine(simulations=4000).prior(STRONG, WEAK, seed=3)
+    assert prior['team1WinProbability'] > 0.9
+
+
+def test_unparseable_numbers_fall_back_to_defaults():
+    assert player_rating({'cost': 'abc', 'mvp': None, 'allStar': '3x'}) == player_rating({})
+    team = dict(STRONG, PG=dict(STRONG['PG'], cost='abc', positions='PG'))
+    LocalEngine(simulations=100).simulate(team, WEAK, seed=0)
@@ -0,0 +1,76 @@
+import os
+import shutil
+
+import pytest
+
+from player_store import PlayerStore, PlayersDocument, _SECTION_RE, validate_team
+
+PLAYERS_JS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'players.js')
+
+
+@pytest.fixture
+def content():
+    with open(PLAYERS_JS, encoding='utf-8') as f:
+        return f.read()
+
+
+def _section_of(doc, player_id):
+    section = None
+    for entry in doc.entries:
+        if isinstance(entry, dict):
+            if entry['id'] == player_id:
+                return section
+        else:
+            m = _SECTION_RE.match(entry)
+            if m:
+                section = m.group(1)
+    return None
+
+
+def test_render_is_byte_identical(content):
+    assert PlayersDocument(content).render() == content
+
+
+def test_add_then_delete_restores_file(content):
+    doc = PlayersDocument(content)
+    player = {k: v for k, v in doc.players[0].items() if k != 'id'}
+    doc.apply_all([{'op': 'add', 'id': 100000, 'player': dict(player, nameEn='Test Player')}])
+    assert _section_of(doc, 100000) == player['team']
+    doc.apply({'op': 'delete', 'id': 100000})
+    assert doc.render() == content
+
+
+def test_team_change_moves_entry_and_replay_is_idempotent(content):
+    doc = PlayersDocument(content)
+    op = {'op': 'update', 'id': 1, 'fields': {'team': 'WAS'}}
+    doc.apply(op)
+    moved = doc.render()
+    assert _section_of(doc, 1) == 'WAS'
+    doc.apply(op)
+    assert doc.render() == moved
+    assert PlayersDocument(moved).render() == moved
+
+
+def test_store_flush_matches_document(tmp_path, content):
+    path = str(tmp_path / 'players.js')
+    shutil.copy(PLAYERS_JS, path)
+    store = PlayerStore(path, flush_delay=100)
+    store.load()
+    store.update_player(1, {'cost': 5})
+    store.flush()
+    doc = PlayersDocument(content)
+    doc.apply({'op': 'update', 'id': 1, 'fields': {'cost': 5}})
+    with open(path, encoding='utf-8') as f:
+        assert f.read() == doc.render()
+
+
+def test_validate_team():
+    player = {'id': 1, 'name': '乔丹', 'nameEn': 'Michael Jordan', 'cost': '6', 'positions': ['SG']}
+    team, error = validate_team({'SG': player, 'PG': None})
+    assert error is None and team == {'SG': dict(player, cost=6)}
+    assert validate_team({'QB': player})[1]
+    assert validate_team({'SG': 'Michael Jordan'})[1]
+    assert validate_team({'SG': dict(player, cost='abc')})[1]
+    assert validate_team({'SG': dict(player, positions=['QB'])})[1]
+    assert validate_team({'SG': {'name': '乔丹'}})[1]
+    assert validate_team([player])[1]
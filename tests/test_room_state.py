@@ -0,0 +1,92 @@
+import copy
+
+import pytest
+
+import server
+from server import Room, _diff_state
+
+
+def apply_patch(state, ops):
+    """与前端 applyRoomPatch 相同的应用规则"""
+    for op in ops:
+        target = state
+        for key in op['path'][:-1]:
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            target = target[key]
+        if op.get('delete'):
+            del target[op['path'][-1]]
+        else:
+            target[op['path'][-1]] = op['value']
+    return state
+
+
+def test_diff_applies_back_to_new_state():
+    old = {'players': {'1': {'name': 'A', 'ready': False}, '2': None},
+           'game_state': {'phase': 'waiting', 'teams': {'1': {}, '2': {}}, 'used_teams': {'1': []}, 'drawn_team': None}}
+    new = copy.deepcopy(old)
+    new['players']['1']['ready'] = True
+    new['players']['2'] = {'name': 'B', 'ready': False}
+    new['game_state']['phase'] = 'selection'
+    new['game_state']['teams']['1']['PG'] = {'id': 1, 'name': '魔术师'}
+    new['game_state']['used_teams']['1'].append('LAL')
+    del new['game_state']['drawn_team']
+    ops = _diff_state(old, new)
+    assert apply_patch(copy.deepcopy(old), ops) == new
+    # 列表整体替换，None -> 对象整体替换
+    assert {'path': ['game_state', 'used_teams', '1'], 'value': ['LAL']} in ops
+    assert {'path': ['players', '2'], 'value': {'name': 'B', 'ready': False}} in ops
+    assert _diff_state(new, copy.deepcopy(new)) == []
+
+
+def test_room_patches_replay_to_snapshot():
+    room = Room('r1', 'sid-1', 'A组')
+    client = copy.deepcopy(room.to_dict())
+    steps = [
+        lambda: room.players.__setitem__('2', {'sid': 'sid-2', 'name': 'B组', 'ready': False}),
+        lambda: room.game_state.update(phase='selection', current_player='1'),
+        lambda: room.game_state['teams']['1'].__setitem__('C', {'id': 5, 'name': '奥尼尔'}),
+        lambda: None,
+        lambda: setattr(room, 'quick_mode', True),
+    ]
+    for step in steps:
+        step()
+        patch = room.patch()
+        assert patch['base'] == client['version']
+        apply_patch(client, patch['ops'])
+        client['version'] = patch['version']
+    assert client == room.to_dict()
+    # 没有变化的那一步不增加版本
+    assert room.version == 4
+
+
+@pytest.fixture
+def small_buffer(monkeypatch):
+    monkeypatch.setattr(server, 'STREAM_BUFFER_SIZE', 5)
+
+
+def test_stream_buffer_reports_missed_events(small_buffer):
+    room = Room('r2', 'sid-1', 'A组')
+    battle_id = room.begin_battle()
+    for i in range(8):
+        event = room.buffer_stream_event({'type': 'content', 'content': str(i)})
+        assert event['seq'] == i + 1 and event['battleId'] == battle_id
+
+    events, missed = room.stream_events_since(0)
+    assert [e['seq'] for e in events] == [4, 5, 6, 7, 8] and missed == 3
+    events, missed = room.stream_events_since(2)
+    assert [e['seq'] for e in events] == [4, 5, 6, 7, 8] and missed == 1
+    events, missed = room.stream_events_since(5)
+    assert [e['seq'] for e in events] == [6, 7, 8] and missed == 0
+    assert room.stream_events_since(8) == ([], 0)
+
+
+def test_speculative_buffer_keeps_every_event(small_buffer):
+    room = Room('r3', 'sid-1', 'A组')
+    room.begin_battle(speculative=True)
+    for i in range(8):
+        room.buffer_stream_event({'type': 'content', 'content': str(i)})
+    events, missed = room.stream_events_since(0)
+    assert len(events) == 8 and missed == 0
+    room.discard_battle()
+    assert room.stream_events_since(0) == ([], 0)
@@ -0,0 +1,97 @@
+import time
+import threading
+
+import pytest
+
+from scheduler import SimulationScheduler, QueueCancelled, QueueTimeout, PRIORITY_LIVE, PRIORITY_BATCH, PRIORITY_SPECULATIVE
+
+
+def _enqueue(scheduler, admitted, priority, owner):
+    """在后台线程排队，被放行后记录来源并立即释放；返回时请求已经进入队列"""
+    waiting = len(scheduler._waiting)
+
+    def run():
+        ticket = scheduler.acquire(priority, owner)
+        admitted.append(owner)
+        scheduler.release(ticket)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while len(scheduler._waiting) == waiting:
+        time.sleep(0.001)
+    return thread
+
+
+def _drain(scheduler, busy, threads):
+    scheduler.release(busy)
+    for thread in threads:
+        thread.join(5)
+    assert scheduler.running == 0 and not scheduler._waiting
+
+
+def test_owners_take_turns_within_a_priority():
+    scheduler = SimulationScheduler(max_concurrent=1)
+    busy = scheduler.acquire(PRIORITY_BATCH, 'busy')
+    admitted = []
+    threads = [_enqueue(scheduler, admitted, PRIORITY_BATCH, 'tournament') for _ in range(3)]
+    threads.append(_enqueue(scheduler, admitted, PRIORITY_BATCH, 'other'))
+    _drain(scheduler, busy, threads)
+    # 后到的来源不需要等大赛事的所有对阵跑完
+    assert admitted == ['tournament', 'other', 'tournament', 'tournament']
+
+
+def test_priorities_are_served_in_order():
+    scheduler = SimulationScheduler(max_concurrent=1)
+    busy = scheduler.acquire(PRIORITY_LIVE, 'busy')
+    admitted = []
+    threads = [_enqueue(scheduler, admitted, priority, owner) for priority, owner in
+               ((PRIORITY_SPECULATIVE, 'speculative'), (PRIORITY_BATCH, 'batch'), (PRIORITY_LIVE, 'live'))]
+    _drain(scheduler, busy, threads)
+    assert admitted == ['live', 'batch', 'speculative']
+
+
+def test_promote_moves_a_waiting_request_ahead():
+    scheduler = SimulationScheduler(max_concurrent=1)
+    busy = scheduler.acquire(PRIORITY_LIVE, 'busy')
+    admitted = []
+    threads = [_enqueue(scheduler, admitted, PRIORITY_BATCH, 'batch'),
+               _enqueue(scheduler, admitted, PRIORITY_SPECULATIVE, 'speculative')]
+    scheduler.promote(scheduler._waiting[-1], PRIORITY_LIVE)
+    _drain(scheduler, busy, threads)
+    assert admitted == ['speculative', 'batch']
+
+
+def test_cancel_removes_waiting_request():
+    scheduler = SimulationScheduler(max_concurrent=1)
+    busy = scheduler.acquire(PRIORITY_LIVE, 'busy')
+    tickets, errors = [], []
+
+    def run():
+        try:
+            scheduler.acquire(PRIORITY_LIVE, 'room:1', on_enqueue=tickets.append)
+        except QueueCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    while not tickets:
+        time.sleep(0.001)
+    scheduler.cancel(tickets[0])
+    thread.join(5)
+    assert len(errors) == 1
+    assert scheduler.stats()['queued'] == 0
+    scheduler.release(busy)
+    # 已放行的请求不能再被取消
+    ticket = scheduler.acquire(PRIORITY_LIVE, 'room:2')
+    scheduler.cancel(ticket)
+    assert scheduler.running == 1
+    scheduler.release(ticket)
+
+
+def test_deadline_bounds_queue_wait():
+    scheduler = SimulationScheduler(max_concurrent=1)
+    busy = scheduler.acquire(PRIORITY_LIVE, 'busy')
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire(PRIORITY_LIVE, 'room:1', deadline=time.time() + 0.05)
+    assert scheduler.timeouts == 1 and not scheduler._waiting
+    scheduler.release(busy)
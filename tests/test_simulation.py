@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from local_engine import LocalEngine
+from simulation import Simulator, SimulationError
+
+TEAM1 = {pos: {'id': i, 'name': f'甲{i}', 'nameEn': f'A{i}', 'cost': 3, 'peakSeason': '1995-96'}
+         for i, pos in enumerate(['PG', 'SG', 'SF', 'PF', 'C'])}
+TEAM2 = {pos: {'id': 10 + i, 'name': f'乙{i}', 'nameEn': f'B{i}', 'cost': 'abc', 'peakSeason': '2012-13'}
+         for i, pos in enumerate(['PG', 'SG', 'SF', 'PF', 'C'])}
+NAMES = {'1': 'A组', '2': 'B组'}
+
+
+def _unavailable():
+    raise RuntimeError('上游不可用')
+
+
+class BrokenEngine(LocalEngine):
+    def simulate(self, team1, team2, seed=None):
+        raise ValueError('本地引擎出错')
+
+
+def _collect(simulator, results, owner):
+    try:
+        results[owner] = list(simulator.stream(TEAM1, TEAM2, NAMES, owner=owner))
+    except SimulationError as e:
+        results[owner] = e
+
+
+def _run_coalesced(simulator, owners=('room:1', 'room:2')):
+    results = {}
+    threads = [threading.Thread(target=_collect, args=(simulator, results, owner), daemon=True) for owner in owners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert not any(thread.is_alive() for thread in threads), '订阅者一直在等待没有结束的模拟'
+    return results
+
+
+def test_upstream_failure_falls_back_to_local_engine():
+    simulator = Simulator(_unavailable, local_engine=LocalEngine(simulations=200))
+    results = _run_coalesced(simulator)
+    for events in results.values():
+        assert events[-1]['type'] == 'result' and events[-1]['engine'] == 'local'
+    assert simulator.inflight_count() == 0
+
+
+def test_failing_fallback_still_finishes_every_subscriber():
+    simulator = Simulator(_unavailable, local_engine=BrokenEngine(simulations=200))
+    results = _run_coalesced(simulator)
+    for error in results.values():
+        assert isinstance(error, SimulationError)
+    assert simulator.inflight_count() == 0
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+from stream_json import IncrementalResultParser
+
+RESULT = {
+    'teamAnalysis': {'team1': {'offense': '内外结合 {挡拆}'}, 'team2': {'offense': '依赖 "球星" 单打'}, 'prediction': '4-2'},
+    'champion': 1,
+    'finalScore': {'team1Wins': 4, 'team2Wins': 2},
+    'games': [
+        {'gameNumber': i, 'winner': 1 if i != 3 and i != 5 else 2, 'score': {'team1': 100 + i, 'team2': 98}, 'keyFactor': f'第{i}场\\关键]'}
+        for i in range(1, 7)
+    ],
+    'fmvp': {'name': '迈克尔·乔丹', 'team': 1, 'avgStats': {'points': 33.5, 'rebounds': 6.1, 'assists': 5.9}},
+    'summary': '以 4-2 夺冠, 不是 "轻松" 的系列赛',
+}
+
+
+def _feed(text, size):
+    parser = IncrementalResultParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 100000])
+def test_chunked_input_yields_same_result(size):
+    text = '```json\n' + json.dumps(RESULT, ensure_ascii=False, indent=2) + '\n```'
+    parser, events = _feed(text, size)
+    assert parser.final_result() == RESULT
+    assert [e['type'] for e in events] == ['analysis'] + ['game'] * 6 + ['fmvp', 'summary']
+    assert [e['index'] for e in events if e['type'] == 'game'] == list(range(6))
+    assert events[0]['data'] == RESULT['teamAnalysis']
+    assert events[-1]['data'] == RESULT['summary']
+
+
+def test_compact_json_with_trailing_text():
+    text = json.dumps(RESULT, ensure_ascii=False, separators=(',', ':')) + '\n以上是模拟结果。{'
+    parser, events = _feed(text, 5)
+    assert parser.final_result() == RESULT
+    assert len(events) == 9
+
+
+def test_incomplete_or_invalid_output_has_no_result():
+    text = json.dumps(RESULT, ensure_ascii=False)
+    parser, _ = _feed(text[:-20], 4)
+    assert parser.final_result() is None
+
+    parser, _ = _feed('{"champion": 1, "finalScore": {"team1Wins": 4,, }, "games": []}', 3)
+    assert parser.failed
+    assert parser.final_result() is None
@@ -0,0 +1,46 @@
+# ========================================
+# 模拟分级 - 按负载选择推理模型 / 快速模型 / 本地引擎
+# ========================================
+# 新的在线模拟按顺序尝试三个档位，选第一个"预计等待可以接受"的：
+#   - reasoner：推理模型 + 完整提示词（质量最好，耗时以分钟计）
+#   - fast：非推理模型 + 快速提示词（几十秒内出结果）
+#   - local：本地蒙特卡洛引擎（即时，总是可用）
+# 预计等待 = 该档位调度器的排队时间（排位 × 最近平均耗时）；推理模型最近平均耗时过长时同样降级。
+# 按负载降级默认关闭（max_wait / max_latency 为 0）；房间开启快速模式时总是跳过 reasoner。
+# 选中的档位和原因记录在结果里，前端在结果上方标明。
+
+TIER_REASONER = 'reasoner'
+TIER_FAST = 'fast'
+TIER_LOCAL = 'local'
+TIERS = (TIER_REASONER, TIER_FAST, TIER_LOCAL)
+
+
+class TierPolicy:
+    def __init__(self, max_wait=0.0, max_latency=0.0):
+        self.max_wait = max_wait  # 可以接受的预计排队秒数，0 表示不按排队降级
+        self.max_latency = max_latency  # 推理模型最近平均耗时超过该秒数时降级，0 表示不按耗时降级
+        self.chosen = {tier: 0 for tier in TIERS}
+
+    def choose(self, reasoner_wait, fast_wait=None, reasoner_latency=None, quick=False):
+        """返回 (档位, 原因)；fast_wait 为 None 表示没有配置快速模型"""
+        tier, reason = self._choose(reasoner_wait, fast_wait, reasoner_latency, quick)
+        self.chosen[tier] += 1
+        return tier, reason
+
+    def _choose(self, reasoner_wait, fast_wait, reasoner_latency, quick):
+        if quick:
+            reason = '快速模式'
+        elif self.max_wait and reasoner_wait >= self.max_wait:
+            reason = f'推理模型预计排队 {reasoner_wait:.0f} 秒'
+        elif self.max_latency and reasoner_latency is not None and reasoner_latency >= self.max_latency:
+            reason = f'推理模型最近平均耗时 {reasoner_latency:.0f} 秒'
+        else:
+            return TIER_REASONER, None
+        if fast_wait is not None and not (self.max_wait and fast_wait >= self.max_wait):
+            return TIER_FAST, reason
+        if fast_wait is not None:
+            reason += f'，快速模型预计排队 {fast_wait:.0f} 秒'
+        return TIER_LOCAL, reason
+
+    def stats(self):
+        return {'maxWait': self.max_wait, 'maxLatency': self.max_latency, 'chosen': dict(self.chosen)}
@@ -0,0 +1,255 @@
+# ========================================
+# 批量赛事模拟 - 循环赛 / 单败淘汰 / 多轮系列赛
+# ========================================
+# 一次提交 N 套阵容和赛制，所有对阵通过有上限的工作线程池调度，
+# 每场对阵仍然是一轮完整的 BO7（复用 Simulator，即同样的提示词、结果解析和缓存），
+# 进度以事件流的形式推送，结束后给出积分榜。
+
+import uuid
+import time
+import queue
+import threading
+
+from simulation import SimulationRun
+from scheduler import PRIORITY_BATCH
+from player_store import validate_team
+
+FORMATS = ('round-robin', 'single-elimination', 'best-of')
+MAX_LINEUPS = 64
+
+
+def validate_lineups(lineups):
+    """校验并规范化阵容列表，返回 (lineups, error)；每个位置的球员按 validate_team 的规则校验"""
+    if not isinstance(lineups, list) or len(lineups) < 2:
+        return None, '至少需要 2 套阵容'
+    if len(lineups) > MAX_LINEUPS:
+        return None, f'阵容数量不能超过 {MAX_LINEUPS}'
+    validated = []
+    for i, lineup in enumerate(lineups):
+        if not isinstance(lineup, dict) or not isinstance(lineup.get('team'), dict) or not lineup['team']:
+            return None, f'第 {i + 1} 套阵容缺少 team'
+        team, error = validate_team(lineup['team'])
+        if error:
+            return None, f'第 {i + 1} 套阵容: {error}'
+        if not team:
+            return None, f'第 {i + 1} 套阵容没有球员'
+        validated.append(dict(lineup, team=team))
+    return validated, None
+
+
+class Tournament:
+    def __init__(self, lineups, fmt, simulator, mode='ai', series=3, workers=4):
+        self.id = uuid.uuid4().hex[:8]
+        self.format = fmt
+        self.mode = mode
+        self.series = series
+        self.workers = max(1, workers)
+        self.simulator = simulator
+        self.lineups = [
+            {'index': i, 'name': lineup.get('name') or f'阵容{i + 1}', 'team': lineup['team']}
+            for i, lineup in enumerate(lineups)
+        ]
+        self.matches = []
+        self.standings = {
+            l['index']: {'index': l['index'], 'name': l['name'], 'played': 0, 'wins': 0, 'losses': 0,
+                         'gameWins': 0, 'gameLosses': 0, 'pointsFor': 0, 'pointsAgainst': 0, 'eliminatedIn': None}
+            for l in self.lineups
+        }
+        self.status = 'pending'
+        self.champion = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.progress = SimulationRun(self.id)
+        self._lock = threading.Lock()
+
+    # ---------- 对外接口 ----------
+
+    def start(self):
+        self.status = 'running'
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def events(self):
+        """订阅进度事件（中途订阅会先收到之前的全部事件）"""
+        return self.progress.subscribe()
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'id': self.id,
+                'format': self.format,
+                'mode': self.mode,
+                'status': self.status,
+                'lineups': [{'index': l['index'], 'name': l['name']} for l in self.lineups],
+                'matches': [self._match_summary(m) for m in self.matches],
+                'standings': self._sorted_standings(),
+                'champion': self.champion,
+                'createdAt': self.created_at,
+                'finishedAt': self.finished_at
+            }
+
+    # ---------- 调度 ----------
+
+    def _new_match(self, home, away, round_no):
+        match = {'id': len(self.matches) + 1, 'round': round_no, 'home': home, 'away': away,
+                 'status': 'scheduled', 'winner': None, 'result': None, 'error': None}
+        self.matches.append(match)
+        return match
+
+    def _run_matches(self, matches):
+        """用有上限的工作线程并发跑一批对阵，全部结束后返回"""
+        pending = queue.Queue()
+        for match in matches:
+            pending.put(match)
+        self.progress.publish({'type': 'scheduled', 'matches': [self._match_summary(m) for m in matches]})
+
+        def worker():
+            while True:
+                try:
+                    match = pending.get_nowait()
+                except queue.Empty:
+                    return
+                self._play(match)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.workers, len(matches)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _play(self, match):
+        home = self.lineups[match['home']]
+        away = self.lineups[match['away']]
+        match['status'] = 'running'
+        self.progress.publish({'type': 'match_started', 'match': self._match_summary(match)})
+        try:
+            result = None
+            names = {'1': home['name'], '2': away['name']}
+            # 批量赛事优先级低于在线房间，同一赛事的对阵共用一个调度来源，与其他赛事公平轮转
+            for event in self.simulator.stream(home['team'], away['team'], names, mode=self.mode,
+                                               priority=PRIORITY_BATCH, owner=f'tournament:{self.id}'):
+                if event['type'] == 'result':
+                    result = event['data']
+            if result is None:
+                raise RuntimeError('模拟未返回结果')
+            match['result'] = result
+            match['winner'] = match['home'] if result.get('champion') == 1 else match['away']
+            match['status'] = 'finished'
+        except Exception as e:
+            # 模拟失败按主场（种子靠前）一方晋级，避免整个赛事卡住
+            match['error'] = str(e)
+            match['winner'] = match['home']
+            match['status'] = 'error'
+            print(f"[赛事] {self.id} 第 {match['id']} 场模拟失败: {e}", flush=True)
+        self._record(match)
+        self.progress.publish({'type': 'match_result', 'match': self._match_summary(match)})
+        self.progress.publish({'type': 'standings', 'standings': self.to_dict()['standings']})
+
+    def _record(self, match):
+        result = match['result'] or {}
+        score = result.get('finalScore') or {}
+        games = result.get('games') or []
+        home_games = score.get('team1Wins', 0) or 0
+        away_games = score.get('team2Wins', 0) or 0
+        home_points = sum((g.get('score') or {}).get('team1', 0) or 0 for g in games)
+        away_points = sum((g.get('score') or {}).get('team2', 0) or 0 for g in games)
+        with self._lock:
+            for idx, gw, gl, pf, pa in ((match['home'], home_games, away_games, home_points, away_points),
+                                        (match['away'], away_games, home_games, away_points, home_points)):
+                row = self.standings[idx]
+                row['played'] += 1
+                row['wins' if match['winner'] == idx else 'losses'] += 1
+                row['gameWins'] += gw
+                row['gameLosses'] += gl
+                row['pointsFor'] += pf
+                row['pointsAgainst'] += pa
+
+    def _run(self):
+        try:
+            if self.format == 'round-robin':
+                self._round_robin()
+            elif self.format == 'single-elimination':
+                self._single_elimination()
+            else:
+                self._best_of()
+            self.status = 'finished'
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            self.status = 'error'
+            self.progress.publish({'type': 'error', 'error': str(e)})
+        self.finished_at = time.time()
+        self.progress.publish({'type': 'tournament_result', 'tournament': self.to_dict()})
+        self.progress.finish()
+        print(f"[赛事] {self.id} 结束，状态 {self.status}，冠军 {self.champion}", flush=True)
+
+    def _round_robin(self):
+        n = len(self.lineups)
+        matches = []
+        for i in range(n):
+            for j in range(i + 1, n):
+                # 轮换主场，避免种子靠前的阵容总是拥有主场优势
+                home, away = (i, j) if (i + j) % 2 == 0 else (j, i)
+                matches.append(self._new_match(home, away, 1))
+        self._run_matches(matches)
+        self.champion = self._sorted_standings()[0]['name']
+
+    def _single_elimination(self):
+        alive = [l['index'] for l in self.lineups]
+        round_no = 1
+        while len(alive) > 1:
+            # 人数不是 2 的幂时，种子靠前的阵容首轮轮空
+            size = 1
+            while size < len(alive):
+                size *= 2
+            byes = size - len(alive) if round_no == 1 else 0
+            advancing = alive[:byes]
+            contenders = alive[byes:]
+            matches = [self._new_match(contenders[k], contenders[-1 - k], round_no) for k in range(len(contenders) // 2)]
+            self._run_matches(matches)
+            for match in matches:
+                loser = match['away'] if match['winner'] == match['home'] else match['home']
+                self.standings[loser]['eliminatedIn'] = round_no
+            advancing += [m['winner'] for m in matches]
+            alive = sorted(advancing)
+            round_no += 1
+        self.champion = self.lineups[alive[0]]['name']
+
+    def _best_of(self):
+        """两套阵容进行 N 轮系列赛，先赢过半者胜出，主场轮换"""
+        a, b = self.lineups[0]['index'], self.lineups[1]['index']
+        need = self.series // 2 + 1
+        for k in range(self.series):
+            home, away = (a, b) if k % 2 == 0 else (b, a)
+            self._run_matches([self._new_match(home, away, k + 1)])
+            if max(self.standings[a]['wins'], self.standings[b]['wins']) >= need:
+                break
+        winner = a if self.standings[a]['wins'] >= self.standings[b]['wins'] else b
+        self.champion = self.lineups[winner]['name']
+
+    # ---------- 辅助 ----------
+
+    def _match_summary(self, match):
+        result = match['result'] or {}
+        return {
+            'id': match['id'],
+            'round': match['round'],
+            'home': self.lineups[match['home']]['name'],
+            'away': self.lineups[match['away']]['name'],
+            'status': match['status'],
+            'winner': self.lineups[match['winner']]['name'] if match['winner'] is not None else None,
+            'finalScore': result.get('finalScore'),
+            'fmvp': (result.get('fmvp') or {}).get('name'),
+            'error': match['error']
+        }
+
+    def _sorted_standings(self):
+        rows = [dict(r) for r in self.standings.values()]
+        rows.sort(key=lambda r: (
+            -r['wins'],
+            -(r['eliminatedIn'] or 1_000),
+            -(r['gameWins'] - r['gameLosses']),
+            -(r['pointsFor'] - r['pointsAgainst']),
+            r['index']
+        ))
+        return rows